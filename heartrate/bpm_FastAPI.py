@@ -1,15 +1,61 @@
+import asyncio
 import time
-from collections import deque
-from typing import List, Optional
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional, Tuple
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import csv
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import os
-from datetime import datetime
 import sqlite3
-
-DB_FILE = "example_dogs.db"
+import numpy as np
+import fcntl
+import hashlib
+import itertools
+import json
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+
+from bpm_buffer import STATUS_NAMES
+from bpm_binary import KIND_BPM, KIND_EMG, NO_CONFIDENCE, BinaryIngestServer, Frame, frame_timestamps
+from bpm_blocks import create_block_table, seal as seal_blocks
+from bpm_csvlog import CsvSegmentLog
+from bpm_export import FORMATS as EXPORT_FORMATS, export_stream
+from bpm_filters import build_pipelines
+from bpm_history import query_history
+from bpm_latest import LatestIndex
+from bpm_live_stats import LiveStats
+from bpm_metrics import CONTENT_TYPE, MetricsRegistry
+from bpm_readpool import ReadPool
+from bpm_registry import DeviceRegistry, DogStateTable
+from bpm_report_cache import ReportCache
+from bpm_retention import RetentionPolicy, dry_run as retention_dry_run, finish_csv_segments, \
+    plan as retention_plan
+from bpm_stream import Broadcaster
+from bpm_rollup import create_rollup_tables, rebuild as rebuild_rollups, rollups_missing, storage_rollup_hook
+from bpm_schema import init_schema, upsert_dog
+from bpm_shm import SharedState
+from bpm_writer import StorageWriter
+import emg_fatigue
+import emg_spectral
+from emg_fatigue import FatigueEngine
+from emg_spectral import SpectralStage
+from emg_store import EmgStore, decimate as decimate_emg
+
+# ===== 로그 =====
+# BPM_LOG_LEVEL=DEBUG 일 때만 하트비트 디버그 로그를 남기고,
+# 그때도 BPM_DEBUG_SAMPLE개 중 1개만 기록 (운영 수집 경로는 레벨 확인 한 번뿐)
+logging.basicConfig(level=os.environ.get("BPM_LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s %(message)s")
+log = logging.getLogger("bpm")
+DEBUG_SAMPLE_EVERY = max(1, int(os.environ.get("BPM_DEBUG_SAMPLE", "100")))
+_debug_seq = itertools.count()
+
+def debug_sampled() -> bool:
+    return log.isEnabledFor(logging.DEBUG) and next(_debug_seq) % DEBUG_SAMPLE_EVERY == 0
+
+# 벤치마크/테스트에서 임시 파일로 바꿀 수 있도록 환경변수 우선
+DB_FILE = os.environ.get("BPM_DB_FILE", "example_dogs.db")
 
 DOG_HR_LIMITS = {
     "small": {"min": 70, "max": 120},
@@ -20,26 +66,32 @@ DOG_HR_LIMITS = {
 # ===== DB 초기화 =====
 def init_db():
     conn = sqlite3.connect(DB_FILE)
+    # 새 DB만 적용됨 (보존 기간 정리 뒤 incremental_vacuum으로 파일 크기 줄이기)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # 강아지 등록 / BPM 데이터 테이블 (이전 버전 DB면 마이그레이션)
+    init_schema(conn)
     c = conn.cursor()
-    # 강아지 등록 테이블
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS dogs (
-        dog_id TEXT PRIMARY KEY,
-        size TEXT
-    )
-    """)
-    # BPM 데이터 테이블
+    # 디바이스(하네스) → 강아지 매핑 테이블
     c.execute("""
-    CREATE TABLE IF NOT EXISTS bpm_data (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        dog_id TEXT,
-        bpm INTEGER,
-        status TEXT,
-        timestamp DATETIME
+    CREATE TABLE IF NOT EXISTS devices (
+        device_id TEXT PRIMARY KEY,
+        dog_id TEXT
     )
     """)
+    # 분/시/일 롤업 테이블
+    create_rollup_tables(conn)
+    # 지난 시간대 압축 블록 (BPM_STORAGE=blocks일 때 채워짐)
+    create_block_table(conn)
+    # EMG 피로도 계산 결과
+    emg_fatigue.create_tables(conn)
+    emg_spectral.create_tables(conn)
     conn.commit()
+    # v1 DB를 마이그레이션하면 원본만 있고 롤업은 비어 있음 → 리포트용으로 한 번 채움
+    missing = rollups_missing(conn)
     conn.close()
+    if missing:
+        log.info("rollups are empty, rebuilding from raw data")
+        rebuild_rollups(DB_FILE)
 
 init_db()
 
@@ -47,18 +99,226 @@ init_db()
 active_dog_id: Optional[str] = None
 
 # ===== 메모리 저장 =====
-dog_sizes = {}
+BUFFER_SIZE = 10_000  # 강아지별 기본 버퍼 용량
+
+# uvicorn --workers N 으로 띄울 때는 BPM_SHARED_STATE=/dev/shm/bpm_state 처럼
+# 공유 파일을 지정해 최신값/버퍼/크기/디바이스/활성 강아지를 워커끼리 공유
+SHARED_STATE_FILE = os.environ.get("BPM_SHARED_STATE")
+shared_state = SharedState(SHARED_STATE_FILE, slots=int(os.environ.get("BPM_SHARED_SLOTS", "256")),
+                           capacity=BUFFER_SIZE) if SHARED_STATE_FILE else None
+
+dog_states = DogStateTable(DOG_HR_LIMITS, shards=16, default_capacity=BUFFER_SIZE, shared=shared_state)
+device_registry = DeviceRegistry(DB_FILE, shared=shared_state)
+
+def get_active_dog_id() -> Optional[str]:
+    return shared_state.active_dog() if shared_state is not None else active_dog_id
+
 def load_dog_sizes():
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
     c.execute("SELECT dog_id, size FROM dogs")
     for dog_id, size in c.fetchall():
-        dog_sizes[dog_id] = size
+        dog_states.set_size(dog_id, size if size in DOG_HR_LIMITS else "medium")
     conn.close()
 load_dog_sizes()
+device_registry.load()
+
+# ===== 리포트 캐시 (지난 날짜는 고정, 공유 모드에서는 워커 간 무효화가 없어 오늘처럼 매번 읽음) =====
+report_cache = ReportCache(max_entries=50_000, shared=shared_state is not None)
+
+# ===== 실시간 스트림 (SSE fan-out) =====
+broadcaster = Broadcaster(max_queue=64, keepalive=15.0)
+
+# ===== 실시간 통계 (/stats, 수집 시 갱신) =====
+live_stats = LiveStats()
+
+# ===== 전체 최신값 (/latest_all, 수집 시 갱신) =====
+latest_index = LatestIndex()
+
+# ===== 계측 (/metrics) =====
+metrics = MetricsRegistry()
+INGEST_STAGE = metrics.histogram("bpm_ingest_stage_seconds",
+                                 "Heartbeat ingest time by route and stage", ["route", "stage"])
+REPORT_QUERY = metrics.histogram("bpm_report_query_seconds", "Report query time", ["report"])
+DB_COMMIT = metrics.histogram("bpm_db_commit_seconds", "bpm_data group commit time")
+SAMPLES = metrics.counter("bpm_samples_total", "Accepted heartbeat samples", ["dog_id"])
+DB_READ = metrics.histogram("bpm_db_read_seconds", "Read pool time by stage", ["stage"])
+
+# ===== 저장기 (bpm_data write-behind) =====
+storage_writer = StorageWriter(DB_FILE, batch_size=200, flush_interval=0.25,
+                               hooks=[storage_rollup_hook],
+                               after_commit=[report_cache.invalidate_rows],
+                               observe=lambda seconds, rows: DB_COMMIT.observe(seconds))
+
+# ===== 읽기 풀 (리포트/기간 조회, 쓰기와 별도 연결과 스레드) =====
+def _observe_read(wait: float, query: float):
+    DB_READ.observe(wait, "wait")
+    DB_READ.observe(query, "query")
+
+read_pool = ReadPool(DB_FILE, size=int(os.environ.get("BPM_READ_POOL", "2")), observe=_observe_read)
+
+# ===== EMG 피로도 엔진 =====
+fatigue_engine = FatigueEngine()
+spectral_stage = SpectralStage(window_s=1.0, hop_s=0.5, f_lo=20.0, f_hi=450.0)
+FATIGUE_TICK_S = 1.0
+
+# 원본 EMG 파형을 세션별 고정 폭 파일로 보관 (BPM_EMG_DIR="" 이면 저장하지 않음)
+EMG_DIR = os.environ.get("BPM_EMG_DIR", "emg_sessions")
+emg_store = EmgStore(EMG_DIR) if EMG_DIR else None
+EMG_MAX_POINTS = 20_000
+
+async def fatigue_loop():
+    # 1초마다 모든 세션의 대기 샘플을 한 번에 계산하고 결과 저장
+    while True:
+        await asyncio.sleep(FATIGUE_TICK_S)
+        try:
+            ticks = fatigue_engine.step()
+            if ticks:
+                await asyncio.to_thread(emg_fatigue.save_ticks, DB_FILE, ticks)
+            windows = spectral_stage.step()
+            if windows:
+                await asyncio.to_thread(emg_spectral.save_windows, DB_FILE, windows)
+        except Exception:
+            log.exception("fatigue step failed")
+
+# BPM_STORAGE=blocks 이면 지난 시간대 bpm_data를 강아지별 1시간 압축 블록으로 옮김
+# (plain이면 원본 테이블만 사용, 조회는 두 경우 모두 블록 + 원본을 함께 읽음)
+STORAGE_MODE = os.environ.get("BPM_STORAGE", "plain")
+SEAL_INTERVAL_S = 60.0
+SEAL_MAX_BLOCKS = 20
+seal_totals = {"runs": 0, "blocks": 0, "rows": 0}
+
+async def seal_loop():
+    while True:
+        await asyncio.sleep(SEAL_INTERVAL_S)
+        try:
+            # 저장기 스레드에서 작은 트랜잭션으로 나눠 실행 (수집 커밋 사이에 끼어 들어감)
+            while True:
+                done = await storage_writer.execute(seal_blocks, None, SEAL_MAX_BLOCKS)
+                seal_totals["blocks"] += done["blocks"]
+                seal_totals["rows"] += done["rows"]
+                if done["blocks"] < SEAL_MAX_BLOCKS:
+                    break
+            seal_totals["runs"] += 1
+        except Exception:
+            log.exception("block seal failed")
+
+# ===== 보존 기간 정리 (BPM_RETENTION=1 일 때 주기적으로) =====
+def _env_days(name: str, default: Optional[float]) -> Optional[float]:
+    # "none"이면 무기한
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return None if value.lower() in ("", "none") else float(value)
+
+RETENTION_ENABLED = os.environ.get("BPM_RETENTION", "0") == "1"
+retention_policy = RetentionPolicy(
+    raw_days=_env_days("BPM_RAW_DAYS", 14),
+    minute_days=_env_days("BPM_MINUTE_DAYS", 365),
+    hour_days=_env_days("BPM_HOUR_DAYS", None),
+    day_days=_env_days("BPM_DAY_DAYS", None),
+    csv_days=_env_days("BPM_CSV_DAYS", 90),
+    csv_rotate_mb=float(os.environ.get("BPM_CSV_ROTATE_MB", "64")),
+    csv_rotate_s=float(os.environ.get("BPM_CSV_ROTATE_S", "3600")),
+)
+COMPACT_INTERVAL_S = float(os.environ.get("BPM_COMPACT_INTERVAL", "3600"))
+COMPACT_BATCH = 5000
+compaction_state = {"runs": 0, "skipped": 0, "last_run": None, "last": None}
+
+async def run_compaction() -> Optional[dict]:
+    """정책 적용 (삭제는 저장기 스레드에서 배치 단위 트랜잭션으로 수집 커밋 사이에 끼워 넣음)"""
+    # 여러 워커 중 하나만 실행
+    lock = open(DB_FILE + ".compact.lock", "w")
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            compaction_state["skipped"] += 1
+            return None
+        t0 = time.time()
+        totals = {}
+        steps = await storage_writer.execute(retention_plan, retention_policy, None, COMPACT_BATCH)
+        for name, step in steps:
+            while True:
+                n = await storage_writer.execute(step)
+                if not n:
+                    break
+                totals[name] = totals.get(name, 0) + n
+        # 세그먼트 교체는 csv_log가 하고 여기서는 떼어낸 세그먼트 압축/삭제만
+        totals.update(await asyncio.to_thread(finish_csv_segments, CSV_FILE, retention_policy.csv_days))
+        totals["seconds"] = round(time.time() - t0, 3)
+        compaction_state["runs"] += 1
+        compaction_state["last_run"] = t0
+        compaction_state["last"] = totals
+        log.info("compaction %s", json.dumps(totals))
+        return totals
+    finally:
+        lock.close()
+
+async def compaction_loop():
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL_S)
+        try:
+            await run_compaction()
+        except Exception:
+            log.exception("compaction failed")
+
+SHARED_FOLLOW_S = 0.05
+
+async def shared_follow_loop():
+    # 공유 상태 모드: 어느 워커가 받은 샘플이든 이 워커의 실시간 통계와 SSE 구독자에게 전달
+    # 시작 시점에 이미 있던 샘플은 건너뛰고, 그 뒤에 생긴 강아지는 첫 샘플부터
+    seen = {}
+    shared_state.changes(seen)
+    for st in dog_states.states():
+        last = st.buffer.last()
+        if last is not None:
+            latest_index.update(st.dog_id, last["ts"], last["bpm"], last["status"])
+    while True:
+        await asyncio.sleep(SHARED_FOLLOW_S)
+        try:
+            for dog_id, ts, bpm, status in shared_state.changes(seen, baseline=False):
+                ts, bpm, status = ts.tolist(), bpm.tolist(), status.tolist()
+                live_stats.extend(dog_id, ts, bpm, status)
+                latest_index.update(dog_id, ts[-1], bpm[-1], STATUS_NAMES[status[-1]])
+                if not broadcaster.has_subscribers():
+                    continue
+                for t, b, s in zip(ts, bpm, status):
+                    broadcaster.publish(dog_id, {"ts": t, "bpm": b, "status": STATUS_NAMES[s], "dog_id": dog_id})
+        except Exception:
+            log.exception("shared state follow failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await storage_writer.start()
+    read_pool.start()
+    await asyncio.to_thread(csv_log.start)
+    fatigue_task = asyncio.create_task(fatigue_loop())
+    follow_task = asyncio.create_task(shared_follow_loop()) if shared_state is not None else None
+    seal_task = asyncio.create_task(seal_loop()) if STORAGE_MODE == "blocks" else None
+    compaction_task = asyncio.create_task(compaction_loop()) if RETENTION_ENABLED else None
+    if BINARY_PORT:
+        try:
+            await binary_server.start()
+        except OSError as e:
+            log.error("binary ingest listener not started: %s", e)
+    yield
+    await binary_server.stop()
+    fatigue_task.cancel()
+    if follow_task is not None:
+        follow_task.cancel()
+    if seal_task is not None:
+        seal_task.cancel()
+    if compaction_task is not None:
+        compaction_task.cancel()
+    await storage_writer.stop()
+    await asyncio.to_thread(csv_log.stop)
+    await asyncio.to_thread(read_pool.close)
+    if emg_store is not None:
+        emg_store.close()
 
 # ===== FastAPI 앱 생성 =====
-app = FastAPI(title="BPM Stream API")
+app = FastAPI(title="BPM Stream API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -69,20 +329,29 @@ app.add_middleware(
 )
 
 
-# ===== 데이터 버퍼 =====
-BUFFER_SIZE = 10_000
-data_buffer: deque = deque(maxlen=BUFFER_SIZE)
-
-CSV_FILE = "hr_data.csv"
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "dog_id",  "bpm", "status"])
+# CSV 감사 로그: 백그라운드 스레드가 묶어서 기록, 매시(BPM_CSV_ROTATE_S) 또는 BPM_CSV_ROTATE_MB마다 세그먼트 교체
+# 기본은 응답 전에 해당 행이 파일에 기록될 때까지 기다림 (같은 때 온 요청은 한 번에 flush)
+# BPM_CSV_SYNC=0 이면 큐에만 넣고 바로 응답 (프로세스가 죽으면 최대 BPM_CSV_FLUSH_S초 분량 유실)
+CSV_FILE = os.environ.get("BPM_CSV_FILE", "hr_data.csv")
+CSV_SYNC = os.environ.get("BPM_CSV_SYNC", "1") == "1"
+csv_log = CsvSegmentLog(CSV_FILE, rotate_s=retention_policy.csv_rotate_s,
+                        rotate_bytes=int(retention_policy.csv_rotate_mb * 1024 * 1024),
+                        flush_interval=float(os.environ.get("BPM_CSV_FLUSH_S", "1.0")))
 
 # ===== 모델 정의 =====
 class HeartbeatIn(BaseModel):
     device_id: Optional[str] = None
     bpm: float
+    confidence: Optional[float] = None  # 센서 신뢰도 (0~100, 선택)
+
+class HeartbeatSampleIn(BaseModel):
+    ts: float  # 디바이스 측정 시각 (epoch seconds)
+    bpm: float
+    confidence: Optional[float] = None
+
+class HeartbeatBatchIn(BaseModel):
+    device_id: Optional[str] = None
+    samples: List[HeartbeatSampleIn]
 
 class Sample(BaseModel):
     ts: float
@@ -95,7 +364,18 @@ class SamplesResponse(BaseModel):
 
 class DogRegister(BaseModel):
     dog_id: str
-    size: str  # small/medium/large
+    size: Literal["small", "medium", "large"]  # DOG_HR_LIMITS 키 (그 밖의 값은 422)
+
+class EmgBatchIn(BaseModel):
+    values: List[float]
+    ts_ms: Optional[List[float]] = None  # 샘플별 시각 (epoch ms)
+    start_ms: Optional[float] = None     # ts_ms 대신 시작 시각 + 샘플링 주파수
+    rate_hz: float = Field(200.0, gt=0)
+    channel: int = 0  # 피로도 계산은 0번 채널, 주파수 분석은 모든 채널
+
+class DeviceRegister(BaseModel):
+    device_id: str
+    dog_id: str
 
 # ===== 라우트 정의 =====
 @app.get("/")
@@ -106,173 +386,589 @@ def root():
 async def activate_dog(payload: DogRegister):
     global active_dog_id
     active_dog_id = payload.dog_id
-# dog_sizes 메모리 업데이트
-    dog_sizes[payload.dog_id] = payload.size
+    if shared_state is not None:
+        shared_state.set_active_dog(payload.dog_id)
+    # 강아지 상태 메모리 업데이트
+    dog_states.set_size(payload.dog_id, payload.size)
 
-    # DB에 등록 (없으면 새로, 있으면 업데이트)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "INSERT OR REPLACE INTO dogs (dog_id, size) VALUES (?, ?)",
-        (payload.dog_id, payload.size)
-    )
-    conn.commit()
-    conn.close()
+    # DB에 등록 (없으면 새로, 있으면 업데이트) - 저장기 스레드에서
+    await storage_writer.execute(upsert_dog, payload.dog_id, payload.size)
 
-    print("🚀 Received data:", {"dog_id": payload.dog_id, "size": payload.size})
-    print("💡 Debug Info:", {"dog_id": payload.dog_id, "size": payload.size, "limits": DOG_HR_LIMITS[payload.size]})
+    log.info("dog activated %s", json.dumps(
+        {"dog_id": payload.dog_id, "size": payload.size, "limits": DOG_HR_LIMITS[payload.size]}))
 
-    return {"ok": True, "active_dog": active_dog_id, "size": payload.size}
+    return {"ok": True, "active_dog": payload.dog_id, "size": payload.size}
 
 @app.post("/register_dog")
 async def register_dog(payload: DogRegister):
-    dog_sizes[payload.dog_id] = payload.size
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO dogs (dog_id, size) VALUES (?, ?)",
-              (payload.dog_id, payload.size))
-    conn.commit()
-    conn.close()
+    dog_states.set_size(payload.dog_id, payload.size)
+    await storage_writer.execute(upsert_dog, payload.dog_id, payload.size)
     return {"ok": True, "dog_id": payload.dog_id, "size": payload.size}
 
-@app.post("/heartbeat_raw")
-async def post_heartbeat_raw(payload: HeartbeatIn):
-    global active_dog_id
-    if not active_dog_id:
-        return {"ok": False, "error": "No active dog_id set"}
-    
-    dog_id = active_dog_id
-    bpm = int(round(payload.bpm))
-    ts = time.time()
-
-    # 이전 bpm 가져오기
-    previous_bpm = data_buffer[-1]["bpm"] if data_buffer else bpm
+@app.post("/register_device")
+async def register_device(payload: DeviceRegister):
+    """하네스 device_id를 강아지에 연결 (이후 해당 디바이스 심박은 이 강아지로 기록)"""
+    await asyncio.to_thread(device_registry.register, payload.device_id, payload.dog_id)
+    dog_states.state(payload.dog_id)
+    return {"ok": True, "device_id": payload.device_id, "dog_id": payload.dog_id}
 
-    # 범위 체크
-    if bpm < 30 or bpm > 220:
-        bpm = previous_bpm
-    if abs(bpm - previous_bpm) > 20:
-        bpm = previous_bpm
+@app.delete("/register_device/{device_id}")
+async def unregister_device(device_id: str):
+    removed = await asyncio.to_thread(device_registry.unregister, device_id)
+    return {"ok": removed, "device_id": device_id}
 
+@app.get("/devices")
+def get_devices():
+    return {"devices": device_registry.devices()}
 
-    size = dog_sizes.get(dog_id, "medium")
-    limits = DOG_HR_LIMITS[size]
+def resolve_dog_id(device_id: Optional[str]) -> Optional[str]:
+    # 등록된 디바이스면 매핑된 강아지, 아니면 활성화된 강아지 (기존 단일 하네스 방식)
+    return device_registry.resolve(device_id) or get_active_dog_id()
 
-    print("💡 Debug Info:", {
-        "dog_id": dog_id,
-        "size": size,
-        "limits": limits,
-        "bpm": bpm
-    })
+# ===== BPM 필터링 / 상태 분류 =====
+# 강아지 크기별 필터 파이프라인 (bpm_filters.FILTER_CONFIG)
+filter_pipelines = build_pipelines()
 
-    status = "low" if bpm < limits["min"] else "high" if bpm > limits["max"] else "normal"
+def filter_bpm(state, values, confidence=None) -> Tuple[np.ndarray, np.ndarray]:
+    """같은 강아지의 최근 확정값을 기준으로 원시 bpm 배열 필터링 → (bpm, 저장할 샘플 mask)"""
+    pipeline = filter_pipelines.get(state.size, filter_pipelines["medium"])
+    _, history, _ = state.buffer.tail(pipeline.history_size)
+    return pipeline.run(values, history, confidence, key=state.dog_id)
 
-    item = {"ts": ts, "bpm": bpm, "status": status, "dog_id": dog_id}
-    data_buffer.append(item)
+def classify_bpm(bpm: int, limits: dict) -> str:
+    return "low" if bpm < limits["min"] else "high" if bpm > limits["max"] else "normal"
 
-    # CSV 기록
-    with open(CSV_FILE, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
-                         dog_id, bpm, status])
+def classify_bpms(bpm: np.ndarray, limits: dict) -> List[str]:
+    return np.where(bpm < limits["min"], "low", np.where(bpm > limits["max"], "high", "normal")).tolist()
 
-    # DB 기록
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO bpm_data (dog_id, bpm, status, timestamp) VALUES (?, ?, ?, ?)",
-        (dog_id, bpm, status, datetime.fromtimestamp(ts))
-    )
-    conn.commit()
-    conn.close()
+@app.post("/heartbeat_raw")
+async def post_heartbeat_raw(payload: HeartbeatIn):
+    with INGEST_STAGE.time("raw", "validate"):
+        dog_id = resolve_dog_id(payload.device_id)
+        if not dog_id:
+            return {"ok": False, "error": "No active dog_id set"}
+        ts = time.time()
+        state = dog_states.state(dog_id)
+
+    # 같은 강아지의 이전 값 기준으로 필터링
+    with INGEST_STAGE.time("raw", "filter"):
+        bpms, keep = filter_bpm(state, [payload.bpm], [payload.confidence])
+    if not keep[0]:
+        # 직전 정상값 없이 거부된 샘플 (기준값이 되지 않도록 저장하지 않음)
+        return {"ok": False, "error": "Sample rejected by filter"}
+    bpm = int(bpms[0])
+
+    with INGEST_STAGE.time("raw", "classify"):
+        status = classify_bpm(bpm, state.limits)
+
+    if debug_sampled():
+        log.debug("heartbeat %s", json.dumps(
+            {"dog_id": dog_id, "size": state.size, "limits": state.limits,
+             "raw": payload.bpm, "bpm": bpm, "status": status}))
+
+    with INGEST_STAGE.time("raw", "buffer"):
+        item = {"ts": ts, "bpm": bpm, "status": status, "dog_id": dog_id}
+        state.buffer.append(ts, bpm, status)
+        if shared_state is None:  # 공유 모드에서는 shared_follow_loop가 전달
+            broadcaster.publish(dog_id, item)
+            latest_index.update(dog_id, ts, bpm, status)
+
+    with INGEST_STAGE.time("raw", "stats"):
+        if shared_state is None:
+            live_stats.add(dog_id, ts, bpm, status)
+
+    # CSV 기록 (큐에 넣기만, 동기 모드면 파일 기록까지 대기)
+    with INGEST_STAGE.time("raw", "csv"):
+        seq = csv_log.write([(ts, dog_id, bpm, status)])
+        if CSV_SYNC and not await csv_log.wait(seq):
+            log.warning("csv audit row for %s not written yet (kept for retry)", dog_id)
+
+    # DB 기록 (백그라운드에서 묶어서 커밋, 여기서는 큐 대기 시간만 잼)
+    with INGEST_STAGE.time("raw", "db"):
+        await storage_writer.put((dog_id, ts, bpm, status))
+    SAMPLES.inc(1, dog_id)
 
     return {"ok": True, "stored": item}
 
+async def ingest_samples(route: str, dog_id: str, ts, values, confidence=None) -> List[dict]:
+    """시간순 샘플 묶음을 필터링/분류해 버퍼, 스트림, CSV, DB에 반영 (batch/바이너리 공통)"""
+    with INGEST_STAGE.time(route, "validate"):
+        state = dog_states.state(dog_id)
+
+    with INGEST_STAGE.time(route, "filter"):
+        bpms, keep = filter_bpm(state, values, confidence)
+        if not keep.all():
+            # 직전 정상값 없이 거부된 샘플은 버림
+            bpms = bpms[keep]
+            ts = [t for t, k in zip(ts, keep.tolist()) if k]
+        if not len(bpms):
+            return []
+
+    with INGEST_STAGE.time(route, "classify"):
+        statuses = classify_bpms(bpms, state.limits)
+
+    if debug_sampled():
+        log.debug("heartbeat_%s %s", route, json.dumps(
+            {"dog_id": dog_id, "size": state.size, "count": len(bpms),
+             "last_bpm": int(bpms[-1]), "last_status": statuses[-1]}))
+
+    with INGEST_STAGE.time(route, "buffer"):
+        items = [{"ts": t, "bpm": b, "status": st, "dog_id": dog_id}
+                 for t, b, st in zip(ts, bpms.tolist(), statuses)]
+        state.buffer.extend([x["ts"] for x in items], [x["bpm"] for x in items], [x["status"] for x in items])
+        if shared_state is None:
+            for x in items:
+                broadcaster.publish(dog_id, x)
+            latest_index.update(dog_id, items[-1]["ts"], items[-1]["bpm"], items[-1]["status"])
+
+    with INGEST_STAGE.time(route, "stats"):
+        if shared_state is None:
+            for x in items:
+                live_stats.add(dog_id, x["ts"], x["bpm"], x["status"])
+
+    # CSV 기록 (한 번에)
+    with INGEST_STAGE.time(route, "csv"):
+        seq = csv_log.write([(x["ts"], dog_id, x["bpm"], x["status"]) for x in items])
+        if CSV_SYNC and not await csv_log.wait(seq):
+            log.warning("csv audit rows for %s not written yet (kept for retry)", dog_id)
+
+    # DB 기록 (저장기가 한 트랜잭션으로 커밋)
+    with INGEST_STAGE.time(route, "db"):
+        await storage_writer.put_many(
+            [(dog_id, x["ts"], x["bpm"], x["status"]) for x in items]
+        )
+    SAMPLES.inc(len(items), dog_id)
+    return items
+
+@app.post("/heartbeat_batch")
+async def post_heartbeat_batch(payload: HeartbeatBatchIn):
+    """디바이스가 모아 보낸 샘플 묶음을 한 번의 트랜잭션으로 저장"""
+    dog_id = resolve_dog_id(payload.device_id)
+    if not dog_id:
+        return {"ok": False, "error": "No active dog_id set"}
+    if not payload.samples:
+        return {"ok": True, "count": 0}
+
+    # 시간순으로 필터링해야 이전 bpm 기준이 맞음
+    samples = sorted(payload.samples, key=lambda s: s.ts)
+    items = await ingest_samples("batch", dog_id, [s.ts for s in samples],
+                                 [s.bpm for s in samples], [s.confidence for s in samples])
+    return {"ok": True, "count": len(items), "last": items[-1] if items else None}
+
+# ===== 바이너리 프레임 수집 (TCP/UDP, bpm_binary) =====
+async def handle_binary_frame(frame: Frame):
+    # 활성 강아지로 대신 받지 않음 (등록된 디바이스만, 미등록은 서버가 먼저 걸러 냄)
+    dog_id = device_registry.resolve(frame.device_id)
+    if not dog_id or not len(frame.values):
+        return
+    ts = frame_timestamps(frame)
+    if frame.kind == KIND_BPM:
+        confidence = None
+        if frame.confidence is not None:
+            confidence = np.where(frame.confidence == NO_CONFIDENCE, np.inf, frame.confidence)
+        await ingest_samples("binary", dog_id, ts.tolist(), frame.values / 10.0, confidence)
+    elif frame.kind == KIND_EMG:
+        ts_ms = ts * 1000
+        fs = 1e6 / frame.period_us
+        spectral_stage.ingest(dog_id, frame.channel, ts_ms, frame.values, fs)
+        if emg_store is not None:
+            emg_store.append(dog_id, frame.channel, ts_ms, frame.values, fs)
+        if frame.channel == 0:
+            fatigue_engine.ingest(dog_id, ts_ms, frame.values)
+
+# BPM_BINARY_PORT=0 이면 끔 (TCP/UDP 같은 포트 번호 사용)
+# 인증이 없으므로 기본은 로컬에서만 받음, 디바이스 망에 열려면 BPM_BINARY_HOST=0.0.0.0
+BINARY_PORT = int(os.environ.get("BPM_BINARY_PORT", "9000"))
+BINARY_HOST = os.environ.get("BPM_BINARY_HOST", "127.0.0.1")
+binary_server = BinaryIngestServer(handle_binary_frame, host=BINARY_HOST,
+                                   tcp_port=BINARY_PORT, udp_port=BINARY_PORT,
+                                   accept_device=lambda d: device_registry.resolve(d) is not None)
+
+@app.get("/ingest/binary/stats")
+def get_binary_stats():
+    return binary_server.stats()
+
 
 @app.get("/latest", response_model=Sample)
-def get_latest():
-    if not data_buffer:
+def get_latest(dog_id: Optional[str] = None):
+    # dog_id 미지정 시 활성화된 강아지
+    state = dog_states.get(dog_id or get_active_dog_id())
+    buf = state.buffer if state is not None else None
+    last = buf.last() if buf is not None else None
+    if last is None:
         return Sample(ts=0.0, bpm=0, status="none")
-    return Sample(**data_buffer[-1])
+    return last
+
+@app.get("/latest_all")
+async def get_latest_all(request: Request, since: Optional[int] = None, epoch: Optional[str] = None,
+                         max_age: Optional[float] = None):
+    """모든 강아지의 마지막 샘플 (한 번에), since=<version>이면 그 뒤에 바뀐 강아지만
+
+    응답의 epoch를 since와 함께 다시 보내면 재시작/다른 워커의 버전을 구분한다.
+    버전이 그대로면 If-None-Match에 304. max_age(초)를 주면 그보다 오래된 강아지는 뺀다.
+    """
+    body = None
+    if max_age is None:
+        etag = latest_index.etag(since)
+    else:
+        body = latest_index.snapshot(since, epoch, max_age, time.time())
+        etag = latest_index.etag(since, body["count"])
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        body = latest_index.snapshot(since, epoch)
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type="application/json",
+                    headers=headers)
 
 @app.get("/data", response_model=SamplesResponse)
-def get_data(n: int = 100):
-    items = list(data_buffer)[-n:]
-    return SamplesResponse(count=len(items), samples=[Sample(**x) for x in items])
+def get_data(n: int = 100, dog_id: Optional[str] = None):
+    state = dog_states.get(dog_id or get_active_dog_id())
+    buf = state.buffer if state is not None else None
+    items = buf.tail_dicts(n) if buf is not None else []
+    return {"count": len(items), "samples": items}
+
+@app.get("/stats/{dog_id}")
+async def get_live_stats(dog_id: str):
+    """최근 1분/1시간/24시간 통계 (메모리에서 바로, DB 조회 없음)"""
+    # 수집 핸들러와 같은 이벤트 루프에서 읽도록 async
+    summary = live_stats.summary(dog_id, time.time())
+    if summary is None:
+        return {"ok": False, "error": f"No samples for {dog_id} since startup"}
+    return {"ok": True, "dog_id": dog_id, **summary}
+
+HISTORY_MAX_POINTS = 10_000
+
+@app.get("/history")
+async def get_history(dog_id: Optional[str] = None, from_ts: Optional[float] = Query(None, alias="from"),
+                to_ts: Optional[float] = Query(None, alias="to"), max_points: int = 1000):
+    """기간 조회 (epoch seconds, 기본 최근 1시간), 점 개수는 max_points 이하로 다운샘플링"""
+    dog_id = dog_id or get_active_dog_id()
+    if not dog_id:
+        return {"ok": False, "error": "No active dog_id set"}
+    to_ts = to_ts if to_ts is not None else time.time()
+    from_ts = from_ts if from_ts is not None else to_ts - 3600
+    max_points = min(max(max_points, 2), HISTORY_MAX_POINTS)
+    with REPORT_QUERY.time("history"):
+        result = await read_pool.run(query_history, dog_id, from_ts, to_ts, max_points)
+    return result
+
+@app.get("/export")
+def export_data(dog_id: Optional[str] = None, from_ts: Optional[float] = Query(None, alias="from"),
+                to_ts: Optional[float] = Query(None, alias="to"), format: str = "csv"):
+    """bpm_data를 CSV / NDJSON / 열 단위 바이너리(bin)로 스트리밍 (dog_id 미지정 시 전체)"""
+    if format not in EXPORT_FORMATS:
+        return {"ok": False, "error": f"format must be one of {sorted(EXPORT_FORMATS)}"}
+    media_type, ext = EXPORT_FORMATS[format]
+
+    def body():
+        # 제너레이터는 스레드풀에서 조각마다 다른 스레드로 돌 수 있음
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        try:
+            yield from export_stream(conn, format, dog_id=dog_id, from_ts=from_ts, to_ts=to_ts)
+        finally:
+            conn.close()
+
+    filename = f"bpm_{dog_id or 'all'}.{ext}"
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/filters/stats")
+def get_filter_stats():
+    # 크기별 파이프라인 단계별 거부/보정 횟수
+    return {size: p.stats() for size, p in filter_pipelines.items()}
+
+@app.get("/stream")
+async def stream(dog_id: Optional[str] = None, all_dogs: bool = False):
+    """심박 실시간 스트림 (Server-Sent Events), dog_id 미지정 시 활성화된 강아지"""
+    target = None if all_dogs else (dog_id or get_active_dog_id())
+    if target is None and not all_dogs:
+        # 200 JSON이면 EventSource가 계속 재연결하므로 오류 상태로 닫히게 함 (클라이언트는 폴링으로 전환)
+        return JSONResponse({"ok": False, "error": "No active dog_id set"}, status_code=404)
+    sub = broadcaster.subscribe(target)
+    return StreamingResponse(
+        broadcaster.sse(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-from datetime import datetime, timedelta
+@app.get("/stream/stats")
+def get_stream_stats():
+    return broadcaster.stats()
+
+# ===== EMG 피로도 =====
+@app.post("/emg/{dog_id}/start")
+async def start_emg_session(dog_id: str):
+    """새 측정 세션 시작 (10초 휴식 캘리브레이션부터)"""
+    t0 = time.time() * 1000
+    fatigue_engine.start(dog_id, t0)
+    if emg_store is not None:
+        emg_store.start(dog_id, t0)
+    return {"ok": True, "dog_id": dog_id, "phase": "CALIB_REST"}
+
+@app.post("/emg/{dog_id}/samples")
+async def post_emg_samples(dog_id: str, payload: EmgBatchIn):
+    n = len(payload.values)
+    if payload.ts_ms is not None:
+        if len(payload.ts_ms) != n:
+            return {"ok": False, "error": "ts_ms and values length mismatch"}
+        ts_ms = payload.ts_ms
+    else:
+        step = 1000.0 / payload.rate_hz
+        # 시작 시각이 없으면 마지막 샘플을 지금으로 간주
+        start = payload.start_ms if payload.start_ms is not None else time.time() * 1000 - (n - 1) * step
+        ts_ms = [start + i * step for i in range(n)]
+    spectral_stage.ingest(dog_id, payload.channel, ts_ms, payload.values, payload.rate_hz)
+    if emg_store is not None:
+        emg_store.append(dog_id, payload.channel, ts_ms, payload.values, payload.rate_hz)
+    accepted = fatigue_engine.ingest(dog_id, ts_ms, payload.values) if payload.channel == 0 else n
+    return {"ok": True, "accepted": accepted}
+
+@app.get("/emg/{dog_id}")
+def get_emg(dog_id: str):
+    snap = fatigue_engine.snapshot(dog_id)
+    if snap is None:
+        return {"ok": False, "error": "No EMG session for dog_id"}
+    snap["spectral"] = spectral_stage.snapshot(dog_id)
+    return snap
+
+@app.delete("/emg/{dog_id}")
+async def stop_emg_session(dog_id: str):
+    spectral_stage.remove(dog_id)
+    if emg_store is not None:
+        emg_store.stop(dog_id)
+    return {"ok": fatigue_engine.stop(dog_id), "dog_id": dog_id}
+
+@app.get("/emg/{dog_id}/sessions")
+def get_emg_sessions(dog_id: str):
+    """저장된 원본 EMG 세션 목록 (채널별 샘플 수, 처음/마지막 시각)"""
+    if emg_store is None:
+        return {"ok": False, "error": "EMG session store disabled"}
+    return {"dog_id": dog_id, "sessions": emg_store.sessions(dog_id)}
+
+def _emg_slice(dog_id: str, session_ts: int, channel: int, from_ms, to_ms, max_points: int, mode: str):
+    reader = emg_store.reader(dog_id, session_ts, channel)
+    if reader is None:
+        return None
+    ts, values = reader.slice(from_ms, to_ms)
+    return {"dog_id": dog_id, "session_ts": session_ts, "channel": channel, "rate_hz": reader.rate_hz,
+            "samples": len(ts), **decimate_emg(ts, values, max_points, mode)}
+
+@app.get("/emg/{dog_id}/sessions/{session_ts}")
+async def get_emg_slice(dog_id: str, session_ts: int, channel: int = 0,
+                        from_ms: Optional[float] = Query(None, alias="from"),
+                        to_ms: Optional[float] = Query(None, alias="to"),
+                        max_points: int = 2000, mode: str = "minmax"):
+    """세션 원본 파형의 [from, to) 구간 (epoch ms), max_points 이하로 줄여서 반환
+
+    mode: minmax (구간별 최소/최대 포락선), mean, stride
+    """
+    if emg_store is None:
+        return {"ok": False, "error": "EMG session store disabled"}
+    if mode not in ("minmax", "mean", "stride"):
+        return {"ok": False, "error": f"Unknown mode: {mode}"}
+    max_points = min(max(max_points, 2), EMG_MAX_POINTS)
+    result = await asyncio.to_thread(_emg_slice, dog_id, session_ts, channel, from_ms, to_ms, max_points, mode)
+    if result is None:
+        return {"ok": False, "error": "No such EMG session"}
+    return result
+
+class EmgReplayIn(BaseModel):
+    params: dict = {}  # emg_fatigue.DEFAULT_PARAMS 중 바꿀 값
+    from_ms: Optional[float] = None
+    to_ms: Optional[float] = None
+    max_points: int = 2000
+
+def _emg_replay(dog_id: str, session_ts: int, payload: EmgReplayIn):
+    reader = emg_store.reader(dog_id, session_ts, 0)
+    if reader is None:
+        return None
+    i, j = reader.range(payload.from_ms, payload.to_ms)
+    t0 = time.perf_counter()
+    # 캘리브레이션은 세션 시작 기준 (구간 중간부터 재생하면 그 시점부터 다시 캘리브)
+    t_start = session_ts if payload.from_ms is None else None
+    ticks = emg_fatigue.replay(reader.iter_chunks(payload.from_ms, payload.to_ms), payload.params, t_start)
+    elapsed = time.perf_counter() - t0
+    step = max(1, -(-len(ticks) // payload.max_points))
+    return {
+        "dog_id": dog_id, "session_ts": session_ts,
+        "params": {**emg_fatigue.DEFAULT_PARAMS, **payload.params},
+        "samples": j - i,
+        "ticks": len(ticks), "elapsed_ms": round(elapsed * 1000, 1),
+        "final": dict(zip(["ts", "rms", "s_t", "fatigue", "phase"], ticks[-1])) if ticks else None,
+        "columns": ["ts", "rms", "s_t", "fatigue", "phase"],
+        "points": ticks[::step],
+    }
+
+@app.post("/emg/{dog_id}/sessions/{session_ts}/replay")
+async def replay_emg_session(dog_id: str, session_ts: int, payload: EmgReplayIn):
+    """저장된 0번 채널 파형을 다른 피로도 파라미터로 다시 계산 (저장된 결과는 건드리지 않음)"""
+    if emg_store is None:
+        return {"ok": False, "error": "EMG session store disabled"}
+    payload.max_points = min(max(payload.max_points, 2), EMG_MAX_POINTS)
+    try:
+        result = await asyncio.to_thread(_emg_replay, dog_id, session_ts, payload)
+    except (TypeError, ValueError) as e:
+        return {"ok": False, "error": str(e)}
+    if result is None:
+        return {"ok": False, "error": "No such EMG session"}
+    return result
+
+@app.get("/emg")
+def get_emg_all():
+    stats = fatigue_engine.stats()
+    return {"count": stats["sessions"], "pending_samples": stats["pending_samples"],
+            "sessions": [fatigue_engine.snapshot(d) for d in fatigue_engine.dog_ids()]}
+
+@app.get("/storage/stats")
+def get_storage_stats():
+    return {**storage_writer.stats(), "read_pool": read_pool.stats(),
+            "storage_mode": STORAGE_MODE, "sealed": dict(seal_totals),
+            "emg_store": emg_store.stats() if emg_store is not None else None,
+            "csv_log": csv_log.stats()}
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    inm = request.headers.get("if-none-match")
+    return inm is not None and (etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*")
+
+def _conditional_json(request: Request, body: dict, last_modified: float) -> Response:
+    """ETag / Last-Modified를 붙여 응답, 바뀐 게 없으면 304"""
+    payload = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode()
+    etag = '"' + hashlib.sha1(payload).hexdigest()[:16] + '"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(int(last_modified), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if request.headers.get("if-none-match") is not None:
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        ims = request.headers.get("if-modified-since")
+        if ims:
+            try:
+                if int(last_modified) <= parsedate_to_datetime(ims).timestamp():
+                    return Response(status_code=304, headers=headers)
+            except (TypeError, ValueError):
+                pass
+    return Response(content=payload, media_type="application/json", headers=headers)
 
 @app.get("/report/weekly")
-def get_weekly_report(dog_id: Optional[str] = None):
-    """최근 7일간 BPM 요약"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    query = """
-        SELECT 
-            strftime('%Y-%m-%d', timestamp) AS date,
-            AVG(bpm) AS avg_bpm,
-            MAX(bpm) AS max_bpm,
-            MIN(bpm) AS min_bpm,
-            SUM(CASE WHEN status='high' THEN 1 ELSE 0 END) AS high_count,
-            SUM(CASE WHEN status='low' THEN 1 ELSE 0 END) AS low_count,
-            SUM(CASE WHEN status='normal' THEN 1 ELSE 0 END) AS normal_count
-        FROM bpm_data
-        WHERE timestamp >= datetime('now', '-7 days')
-        {dog_filter}
-        GROUP BY date
-        ORDER BY date;
-    """.format(dog_filter=f"AND dog_id='{dog_id}'" if dog_id else "")
-
-    c.execute(query)
-    rows = c.fetchall()
-    conn.close()
-
-    report = []
-    for row in rows:
-        report.append({
-            "date": row[0],
-            "avg_bpm": row[1],
-            "max_bpm": row[2],
-            "min_bpm": row[3],
-            "high_count": row[4],
-            "low_count": row[5],
-            "normal_count": row[6]
-        })
+async def get_weekly_report(request: Request, dog_id: Optional[str] = None):
+    """오늘을 포함한 최근 7일간 BPM 요약 (일 롤업 + 캐시, 최대 7개)"""
+    with REPORT_QUERY.time("weekly"):
+        report = await read_pool.run(report_cache.daily, 7, dog_id)
 
-    return {"period": "weekly", "days": len(report), "report": report}
+    body = {"period": "weekly", "days": len(report), "report": report}
+    return _conditional_json(request, body, report_cache.last_modified(dog_id))
 
 
 @app.get("/report/monthly")
-def get_monthly_report(dog_id: Optional[str] = None):
-    """최근 30일간 BPM 요약"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    query = """
-        SELECT 
-            strftime('%Y-%m-%d', timestamp) AS date,
-            AVG(bpm) AS avg_bpm,
-            MAX(bpm) AS max_bpm,
-            MIN(bpm) AS min_bpm
-        FROM bpm_data
-        WHERE timestamp >= datetime('now', '-30 days')
-        {dog_filter}
-        GROUP BY date
-        ORDER BY date;
-    """.format(dog_filter=f"AND dog_id='{dog_id}'" if dog_id else "")
-
-    c.execute(query)
-    rows = c.fetchall()
-    conn.close()
-
-    report = []
-    for row in rows:
-        report.append({
-            "date": row[0],
-            "avg_bpm": row[1],
-            "max_bpm": row[2],
-            "min_bpm": row[3]
-        })
-
-    return {"period": "monthly", "days": len(report), "report": report}
+async def get_monthly_report(request: Request, dog_id: Optional[str] = None):
+    """오늘을 포함한 최근 30일간 BPM 요약 (일 롤업 + 캐시, 최대 30개)"""
+    with REPORT_QUERY.time("monthly"):
+        rows = await read_pool.run(report_cache.daily, 30, dog_id)
+
+    report = [{k: row[k] for k in ("date", "avg_bpm", "max_bpm", "min_bpm")} for row in rows]
+
+    body = {"period": "monthly", "days": len(report), "report": report}
+    return _conditional_json(request, body, report_cache.last_modified(dog_id))
+
+@app.get("/retention")
+async def get_retention():
+    """보존 정책, 마지막 정리 결과, 지금 정리하면 지워질 양과 돌려받을 공간 (dry-run)"""
+    preview = await read_pool.run(retention_dry_run, retention_policy, CSV_FILE)
+    return {"enabled": RETENTION_ENABLED, "interval_s": COMPACT_INTERVAL_S,
+            **compaction_state, "dry_run": preview}
+
+@app.post("/retention/run")
+async def post_retention_run():
+    if not RETENTION_ENABLED:
+        return {"ok": False, "error": "retention disabled (set BPM_RETENTION=1)"}
+    totals = await run_compaction()
+    if totals is None:
+        return {"ok": False, "error": "compaction already running"}
+    return {"ok": True, **totals}
+
+@app.get("/report/cache_stats")
+def get_report_cache_stats():
+    return report_cache.stats()
+
+
+# ===== Prometheus 메트릭 =====
+RATE_WINDOW_S = 60.0  # 강아지별 수집 속도 계산 구간
+
+def collect_metrics():
+    """스크레이프 시점에 읽는 값 (버퍼 크기, 수집 속도, 필터/저장기/스트림/캐시 통계)"""
+    now = time.time()
+    for st in dog_states.states():
+        n = len(st.buffer)
+        yield "bpm_buffer_samples", {"dog_id": st.dog_id}, n
+        ts, _, _ = st.buffer.tail(n)
+        recent = int(np.count_nonzero(ts >= now - RATE_WINDOW_S))
+        yield "bpm_sample_rate_hz", {"dog_id": st.dog_id}, recent / RATE_WINDOW_S
+    for size, p in filter_pipelines.items():
+        yield "bpm_filter_seen_total", {"size": size}, p.seen
+        yield "bpm_filter_held_total", {"size": size}, p.held
+        yield "bpm_filter_dropped_total", {"size": size}, p.dropped
+        for stage, count in p.rejected.items():
+            yield "bpm_filter_rejected_total", {"size": size, "stage": stage}, count
+    w = storage_writer.stats()
+    yield "bpm_writer_queue_depth", {}, w["queue_depth"]
+    yield "bpm_writer_committed_rows_total", {}, w["committed_rows"]
+    yield "bpm_writer_duplicate_rows_total", {}, w["duplicate_rows"]
+    yield "bpm_writer_callback_errors_total", {}, w["callback_errors"]
+    yield "bpm_writer_failed_commits_total", {}, w["failed_commits"]
+    yield "bpm_writer_dropped_rows_total", {}, w["dropped_rows"]
+    s = broadcaster.stats()
+    yield "bpm_stream_subscribers", {}, s["subscribers"]
+    yield "bpm_stream_dropped_total", {}, s["dropped"]
+    b = binary_server.stats()
+    yield "bpm_binary_frames_total", {}, b["frames"]
+    yield "bpm_binary_duplicates_total", {}, b["duplicates"]
+    yield "bpm_binary_lost_total", {}, b["lost"]
+    yield "bpm_binary_errors_total", {}, b["errors"]
+    yield "bpm_binary_rejected_total", {}, b["rejected"]
+    r = read_pool.stats()
+    yield "bpm_read_pool_queued", {}, r["queued"]
+    yield "bpm_read_pool_failed_total", {}, r["failed"]
+    a = csv_log.stats()
+    yield "bpm_csv_pending_rows", {}, a["pending_rows"]
+    yield "bpm_csv_errors_total", {}, a["errors"]
+    yield "bpm_csv_dropped_rows_total", {}, a["dropped_rows"]
+    c = report_cache.stats()
+    yield "bpm_report_cache_hits_total", {}, c["hits"]
+    yield "bpm_report_cache_misses_total", {}, c["misses"]
+
+metrics.collector(collect_metrics, {
+    "bpm_buffer_samples": ("gauge", "Samples held in the per-dog ring buffer"),
+    "bpm_sample_rate_hz": ("gauge", "Per-dog ingest rate over the last 60 s"),
+    "bpm_filter_seen_total": ("counter", "Samples seen by the filter pipeline"),
+    "bpm_filter_held_total": ("counter", "Rejected samples replaced by the previous value"),
+    "bpm_filter_dropped_total": ("counter", "Rejected samples dropped for lack of a previous value"),
+    "bpm_filter_rejected_total": ("counter", "Samples rejected or modified by filter stage"),
+    "bpm_writer_queue_depth": ("gauge", "Rows waiting for the storage writer"),
+    "bpm_writer_committed_rows_total": ("counter", "Rows committed to bpm_data"),
+    "bpm_writer_duplicate_rows_total": ("counter", "Rows ignored as already stored (same dog and ts)"),
+    "bpm_writer_failed_commits_total": ("counter", "Failed bpm_data commit attempts"),
+    "bpm_writer_dropped_rows_total": ("counter", "Rows dropped after all commit retries failed"),
+    "bpm_writer_callback_errors_total": ("counter", "Failed after_commit callbacks (commit kept)"),
+    "bpm_stream_subscribers": ("gauge", "Connected SSE subscribers"),
+    "bpm_stream_dropped_total": ("counter", "Events dropped for slow SSE subscribers"),
+    "bpm_binary_frames_total": ("counter", "Binary frames ingested"),
+    "bpm_binary_duplicates_total": ("counter", "Binary frames dropped as duplicate seq"),
+    "bpm_binary_lost_total": ("counter", "Binary frames missing from seq gaps"),
+    "bpm_binary_errors_total": ("counter", "Malformed or failed binary frames"),
+    "bpm_binary_rejected_total": ("counter", "Binary frames from unregistered devices"),
+    "bpm_read_pool_queued": ("gauge", "Read pool queries waiting for a connection"),
+    "bpm_read_pool_failed_total": ("counter", "Failed read pool queries"),
+    "bpm_csv_pending_rows": ("gauge", "CSV audit rows queued but not yet written"),
+    "bpm_csv_errors_total": ("counter", "CSV audit log write failures"),
+    "bpm_csv_dropped_rows_total": ("counter", "CSV audit rows dropped after the retry buffer filled"),
+    "bpm_report_cache_hits_total": ("counter", "Report cache hits"),
+    "bpm_report_cache_misses_total": ("counter", "Report cache misses"),
+})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,226 @@
+"""BPM API 부하/지연 벤치마크
+
+임시 DB/CSV로 앱을 같은 프로세스 안(uvicorn 스레드)에서 띄우고,
+N개의 가상 하네스가 /heartbeat_raw 를 주기적으로 보내는 동안
+M개의 대시보드가 /latest, /data, /report/weekly 를 폴링한다.
+엔드포인트별 처리량과 p50/p95/p99 지연을 JSON으로 남겨 커밋 간 비교에 쓴다.
+
+    python bpm_bench.py --harnesses 50 --rate 1 --dashboards 20 --duration 30 --out bench.json
+    python bpm_bench.py --seed-days 30 --seed-dogs 50 --seed-interval 10   # 긴 이력 위에서 측정
+
+필요 패키지: uvicorn, httpx
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+# ===== 이력 시딩 =====
+def seed_history(db_file: str, days: int, dogs: int, interval: float, chunk_size: int = 100_000):
+    """dogs마리 × days일 분량의 bpm_data와 롤업을 직접 채움"""
+    from bpm_buffer import STATUS_CODES
+    from bpm_rollup import apply_rollups
+    from bpm_schema import DogKeys, to_ms
+
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    keys = DogKeys()
+    rng = np.random.default_rng(0)
+    end = time.time()
+    start = end - days * 86400
+    n = int((end - start) / interval)
+    total = 0
+    for d in range(dogs):
+        dog_id = f"dog{d}"
+        with conn:
+            key = keys.key(conn, dog_id)
+        for lo in range(0, n, chunk_size):
+            hi = min(n, lo + chunk_size)
+            ts = start + np.arange(lo, hi) * interval
+            bpm = np.clip(85 + np.cumsum(rng.integers(-2, 3, hi - lo)) % 40 - 20, 40, 180).astype(int)
+            status = np.where(bpm < 60, "low", np.where(bpm > 100, "high", "normal"))
+            with conn:
+                conn.executemany(
+                    "INSERT INTO bpm_data (dog_key, ts, bpm, status) VALUES (?, ?, ?, ?)",
+                    [(key, to_ms(t), b, STATUS_CODES[s]) for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())]
+                )
+                apply_rollups(conn, zip([dog_id] * (hi - lo), bpm.tolist(), status.tolist(), ts.tolist()))
+            total += hi - lo
+        print(f"  seeded {dog_id}: {n} rows", flush=True)
+    conn.close()
+    return total
+
+
+# ===== 서버 =====
+class ServerThread(threading.Thread):
+    def __init__(self, app, port: int):
+        super().__init__(daemon=True)
+        import uvicorn
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+
+    def run(self):
+        self.server.run()
+
+    def wait_started(self, timeout: float = 15.0):
+        t0 = time.time()
+        while not self.server.started:
+            if time.time() - t0 > timeout:
+                raise RuntimeError("server did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(10)
+
+
+# ===== 부하 =====
+class Recorder:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, name: str, coro):
+        t0 = time.perf_counter()
+        try:
+            r = await coro
+            ok = r.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - t0) * 1000
+        if ok:
+            self.latency[name].append(elapsed)
+        else:
+            self.errors[name] += 1
+
+    def summary(self, duration: float) -> dict:
+        out = {}
+        for name in sorted(set(self.latency) | set(self.errors)):
+            lat = np.asarray(self.latency.get(name, []))
+            out[name] = {
+                "count": int(len(lat)),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(lat) / duration, 2),
+                "p50_ms": round(float(np.percentile(lat, 50)), 3) if len(lat) else None,
+                "p95_ms": round(float(np.percentile(lat, 95)), 3) if len(lat) else None,
+                "p99_ms": round(float(np.percentile(lat, 99)), 3) if len(lat) else None,
+                "max_ms": round(float(lat.max()), 3) if len(lat) else None,
+            }
+        return out
+
+
+async def harness(client, rec: Recorder, device_id: str, rate: float, stop_at: float):
+    interval = 1.0 / rate
+    bpm = random.uniform(70, 110)
+    nxt = time.perf_counter() + random.uniform(0, interval)
+    while nxt < stop_at:
+        await asyncio.sleep(max(0.0, nxt - time.perf_counter()))
+        bpm = min(200, max(40, bpm + random.uniform(-3, 3)))
+        await rec.call("POST /heartbeat_raw",
+                       client.post("/heartbeat_raw", json={"device_id": device_id, "bpm": bpm}))
+        nxt += interval
+
+
+async def dashboard(client, rec: Recorder, dog_id: str, interval: float, stop_at: float):
+    nxt = time.perf_counter() + random.uniform(0, interval)
+    while nxt < stop_at:
+        await asyncio.sleep(max(0.0, nxt - time.perf_counter()))
+        await rec.call("GET /latest", client.get("/latest", params={"dog_id": dog_id}))
+        await rec.call("GET /data", client.get("/data", params={"dog_id": dog_id, "n": 100}))
+        await rec.call("GET /report/weekly", client.get("/report/weekly", params={"dog_id": dog_id}))
+        nxt += interval
+
+
+async def run_load(base_url: str, args) -> dict:
+    import httpx
+
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.harnesses + args.dashboards + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        dogs = max(1, args.dogs)
+        for i in range(args.harnesses):
+            await client.post("/register_device", json={"device_id": f"h{i}", "dog_id": f"dog{i % dogs}"})
+
+        stop_at = time.perf_counter() + args.duration
+        t0 = time.perf_counter()
+        tasks = [harness(client, rec, f"h{i}", args.rate, stop_at) for i in range(args.harnesses)]
+        tasks += [dashboard(client, rec, f"dog{i % dogs}", args.poll_interval, stop_at)
+                  for i in range(args.dashboards)]
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - t0
+        storage = (await client.get("/storage/stats")).json()
+    return {"duration_s": round(duration, 3), "endpoints": rec.summary(duration), "storage": storage}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BPM API 부하/지연 벤치마크")
+    parser.add_argument("--harnesses", type=int, default=20, help="가상 하네스 수")
+    parser.add_argument("--rate", type=float, default=1.0, help="하네스당 전송 주기 (Hz)")
+    parser.add_argument("--dashboards", type=int, default=10, help="대시보드 클라이언트 수")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="대시보드 폴링 주기 (초)")
+    parser.add_argument("--dogs", type=int, default=20, help="하네스/대시보드가 나눠 쓰는 강아지 수")
+    parser.add_argument("--duration", type=float, default=20.0, help="측정 시간 (초)")
+    parser.add_argument("--seed-days", type=int, default=0, help="미리 채울 이력 일수")
+    parser.add_argument("--seed-dogs", type=int, default=50, help="미리 채울 강아지 수")
+    parser.add_argument("--seed-interval", type=float, default=10.0, help="이력 샘플 간격 (초, 실제 수집은 1)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", default=None, help="결과 JSON 파일")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bpm_bench_")
+    os.environ["BPM_DB_FILE"] = os.path.join(workdir, "bench.db")
+    os.environ["BPM_CSV_FILE"] = os.path.join(workdir, "bench.csv")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import bpm_FastAPI  # 환경변수 설정 후 import (임시 DB에 스키마 생성)
+
+    seeded = 0
+    if args.seed_days:
+        print(f"🌱 seeding {args.seed_days} days × {args.seed_dogs} dogs (every {args.seed_interval}s)")
+        t0 = time.time()
+        seeded = seed_history(bpm_FastAPI.DB_FILE, args.seed_days, args.seed_dogs, args.seed_interval)
+        print(f"🌱 seeded {seeded} rows in {time.time() - t0:.1f}s")
+
+    server = ServerThread(bpm_FastAPI.app, args.port)
+    server.start()
+    server.wait_started()
+    try:
+        result = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args))
+    finally:
+        server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "seeded_rows": seeded,
+        **result,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
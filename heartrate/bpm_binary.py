@@ -0,0 +1,392 @@
+"""센서 디바이스용 고정 레이아웃 바이너리 수집 (TCP / UDP)
+
+HTTP + JSON 대신 32바이트 헤더 + 값 배열로 된 프레임을 받는다.
+값 배열은 memoryview 위에서 np.frombuffer로 바로 읽으므로 복사가 없다.
+
+프레임 (little-endian):
+    magic      2s   b"HB"
+    version    u8   1
+    kind       u8   1=BPM, 2=EMG
+    device_id  8s   ASCII, 남는 자리는 NUL
+    seq        u32  디바이스별 증가 번호 (중복/유실 판단)
+    ts_ms      u64  첫 샘플 시각 (epoch ms), 0이면 마지막 샘플 = 수신 시각
+    period_us  u32  샘플 간격 (µs), BPM 1Hz = 1_000_000, EMG 200Hz = 5_000
+    count      u16  샘플 수
+    channel    u8   EMG 채널 (BPM은 0)
+    flags      u8   bit0: BPM confidence 배열 포함, bit1: EMG 값이 float32
+
+    BPM 값: count × u16 (0.1 bpm 단위), flags bit0이면 이어서 count × u8 confidence (255=없음)
+    EMG 값: count × i16 (ADC 원시값), flags bit1이면 count × f32
+
+TCP는 프레임을 이어 보내고, UDP는 데이터그램 하나에 프레임 하나 이상을 담는다.
+
+    python bpm_binary.py send --device h1 --bpm 82 85 88          # 참조 클라이언트
+    python bpm_binary.py send --device h1 --emg-file emg.txt --tcp
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import struct
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"HB"
+VERSION = 1
+KIND_BPM = 1
+KIND_EMG = 2
+FLAG_CONFIDENCE = 0x01
+FLAG_FLOAT32 = 0x02
+NO_CONFIDENCE = 255
+
+HEADER = struct.Struct("<2sBB8sIQIHBB")  # 32 bytes
+
+# 중복 판단: 최근 REPLAY_BITS개 seq는 비트마스크로 기억 (UDP 순서 뒤바뀜 허용),
+# 그보다 SEQ_WINDOW 이내로 오래된 seq는 버림, 더 멀리 뛰거나 seq 0이면 디바이스 재시작
+REPLAY_BITS = 64
+SEQ_WINDOW = 1024
+
+log = logging.getLogger("bpm.binary")
+
+
+class Frame(NamedTuple):
+    kind: int
+    device_id: str
+    seq: int
+    ts_ms: int
+    period_us: int
+    channel: int
+    values: np.ndarray                  # BPM: u16 (0.1 단위), EMG: i16 또는 f32
+    confidence: Optional[np.ndarray]    # BPM confidence (u8) 또는 None
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _payload_size(kind: int, count: int, flags: int) -> int:
+    if kind == KIND_BPM:
+        return count * (3 if flags & FLAG_CONFIDENCE else 2)
+    if kind == KIND_EMG:
+        return count * (4 if flags & FLAG_FLOAT32 else 2)
+    raise FrameError(f"unknown frame kind {kind}")
+
+
+def decode_frames(buf) -> Tuple[List[Frame], int]:
+    """buf(bytes/memoryview)에서 완성된 프레임을 모두 읽음, (프레임 목록, 사용한 바이트 수)
+
+    반환된 값 배열은 buf를 그대로 가리키므로 buf는 수정되지 않는 bytes여야 한다.
+    """
+    mv = memoryview(buf)
+    frames = []
+    pos = 0
+    end = len(mv)
+    while end - pos >= HEADER.size:
+        magic, version, kind, dev, seq, ts_ms, period_us, count, channel, flags = \
+            HEADER.unpack_from(mv, pos)
+        if magic != MAGIC or version != VERSION:
+            raise FrameError("bad frame header")
+        if period_us == 0:
+            raise FrameError("frame period_us must be positive")
+        size = _payload_size(kind, count, flags)
+        start = pos + HEADER.size
+        if end - start < size:
+            break
+        confidence = None
+        if kind == KIND_BPM:
+            values = np.frombuffer(mv, dtype="<u2", count=count, offset=start)
+            if flags & FLAG_CONFIDENCE:
+                confidence = np.frombuffer(mv, dtype=np.uint8, count=count, offset=start + 2 * count)
+        else:
+            dtype = "<f4" if flags & FLAG_FLOAT32 else "<i2"
+            values = np.frombuffer(mv, dtype=dtype, count=count, offset=start)
+        device_id = dev.rstrip(b"\0").decode("ascii", "replace")
+        frames.append(Frame(kind, device_id, seq, ts_ms, period_us, channel, values, confidence))
+        pos = start + size
+    return frames, pos
+
+
+def frame_timestamps(frame: Frame, now: Optional[float] = None) -> np.ndarray:
+    """샘플별 시각 (epoch seconds)"""
+    n = len(frame.values)
+    period = frame.period_us / 1e6
+    if frame.ts_ms:
+        return frame.ts_ms / 1000.0 + np.arange(n) * period
+    now = time.time() if now is None else now
+    return now - (n - 1 - np.arange(n)) * period
+
+
+# ===== 인코딩 (참조 클라이언트 / 테스트용) =====
+def _device_bytes(device_id: str) -> bytes:
+    raw = device_id.encode("ascii")
+    if len(raw) > 8:
+        raise ValueError("device_id must be at most 8 ASCII bytes")
+    return raw
+
+
+def encode_bpm_frame(device_id: str, seq: int, bpm, confidence=None,
+                     ts_ms: int = 0, period_s: float = 1.0) -> bytes:
+    values = np.rint(np.asarray(bpm, dtype=np.float64) * 10).astype("<u2")
+    flags = 0
+    payload = values.tobytes()
+    if confidence is not None:
+        conf = np.array([NO_CONFIDENCE if c is None else c for c in confidence], dtype=np.float64)
+        payload += np.clip(np.rint(conf), 0, NO_CONFIDENCE).astype(np.uint8).tobytes()
+        flags |= FLAG_CONFIDENCE
+    header = HEADER.pack(MAGIC, VERSION, KIND_BPM, _device_bytes(device_id), seq & 0xFFFFFFFF,
+                         int(ts_ms), int(round(period_s * 1e6)), len(values), 0, flags)
+    return header + payload
+
+
+def encode_emg_frame(device_id: str, seq: int, values, channel: int = 0,
+                     ts_ms: int = 0, rate_hz: float = 200.0, float32: bool = False) -> bytes:
+    arr = np.asarray(values, dtype="<f4" if float32 else "<i2")
+    header = HEADER.pack(MAGIC, VERSION, KIND_EMG, _device_bytes(device_id), seq & 0xFFFFFFFF,
+                         int(ts_ms), int(round(1e6 / rate_hz)), len(arr), channel,
+                         FLAG_FLOAT32 if float32 else 0)
+    return header + arr.tobytes()
+
+
+# ===== 서버 =====
+class _TcpProtocol(asyncio.Protocol):
+    def __init__(self, server: "BinaryIngestServer"):
+        self.server = server
+        self.transport = None
+        self._pending = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def connection_lost(self, exc):
+        self.server.connections -= 1
+
+    def data_received(self, data: bytes):
+        # 대부분은 프레임 경계에 맞춰 들어오므로 data를 그대로 디코드 (복사 없음)
+        buf = self._pending + data if self._pending else data
+        try:
+            frames, used = decode_frames(buf)
+        except FrameError as e:
+            # 스트림에서 위치를 잃었으므로 연결을 끊음
+            self.server.errors += 1
+            log.warning("closing binary TCP connection: %s", e)
+            self.transport.close()
+            return
+        self._pending = buf[used:]
+        self.server.bytes += len(data)
+        self.server.submit(frames)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: "BinaryIngestServer"):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr):
+        self.server.bytes += len(data)
+        try:
+            frames, used = decode_frames(data)
+        except FrameError:
+            self.server.errors += 1
+            return
+        if used != len(data):
+            self.server.errors += 1  # 잘린 데이터그램 (완성된 앞부분만 사용)
+        self.server.submit(frames)
+
+
+class BinaryIngestServer:
+    """TCP/UDP 바이너리 프레임 수신기
+
+    디코드한 프레임은 큐에 넣고, 태스크 하나가 순서대로 on_frame(frame)을 await한다.
+    큐가 가득 차면 새 프레임은 버리고 dropped로 센다.
+    accept_device가 있으면 False를 돌려준 device_id의 프레임은 seq 추적 전에 버리고 rejected로 센다.
+    인증이 없으므로 기본은 127.0.0.1에만 바인딩한다.
+    """
+
+    def __init__(self, on_frame: Callable[[Frame], Awaitable[None]], host: str = "127.0.0.1",
+                 tcp_port: Optional[int] = 9000, udp_port: Optional[int] = 9000,
+                 max_queue: int = 10_000, accept_device: Optional[Callable[[str], bool]] = None):
+        self.on_frame = on_frame
+        self.accept_device = accept_device
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.max_queue = max_queue
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._tcp = None
+        self._udp = None
+        self._seq: Dict[str, list] = {}  # device_id → [최대 seq, 최근 수신 비트마스크, 유실로 센 비트마스크]
+
+        # 통계
+        self.connections = 0
+        self.bytes = 0
+        self.frames = 0
+        self.samples = 0
+        self.duplicates = 0
+        self.lost = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        if self.tcp_port:
+            self._tcp = await loop.create_server(lambda: _TcpProtocol(self), self.host, self.tcp_port)
+        if self.udp_port:
+            self._udp, _ = await loop.create_datagram_endpoint(
+                lambda: _UdpProtocol(self), local_addr=(self.host, self.udp_port))
+
+    async def stop(self):
+        if self._tcp is not None:
+            self._tcp.close()
+            await self._tcp.wait_closed()
+            self._tcp = None
+        if self._udp is not None:
+            self._udp.close()
+            self._udp = None
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+    def _accept_seq(self, frame: Frame) -> bool:
+        seq = frame.seq
+        st = self._seq.get(frame.device_id)
+        if st is None:
+            self._seq[frame.device_id] = [seq, 1, 0]
+            return True
+        last, mask, missing = st
+        back = (last - seq) & 0xFFFFFFFF
+        gap = (seq - last) & 0xFFFFFFFF
+        if seq == 0 and back != 0 and gap != 1:
+            st[:] = [seq, 1, 0]  # 디바이스 재시작 (0xFFFFFFFF 다음의 0은 정상 순서)
+            return True
+        if back < REPLAY_BITS:
+            bit = 1 << back
+            if mask & bit:
+                self.duplicates += 1
+                return False
+            # 늦게 도착한 프레임, 유실로 셌던 seq일 때만 되돌림
+            st[1] = mask | bit
+            if missing & bit:
+                st[2] = missing & ~bit
+                self.lost -= 1
+            return True
+        if back < SEQ_WINDOW:
+            self.duplicates += 1
+            return False
+        if gap < SEQ_WINDOW:
+            self.lost += gap - 1
+            full = (1 << REPLAY_BITS) - 1
+            skipped = ((1 << (gap - 1)) - 1) << 1  # 새 last 기준 1..gap-1
+            st[:] = [seq, ((mask << gap) | 1) & full, ((missing << gap) | skipped) & full]
+        else:
+            st[:] = [seq, 1, 0]  # 디바이스 재시작
+        return True
+
+    def submit(self, frames: List[Frame]):
+        for frame in frames:
+            if self.accept_device is not None and not self.accept_device(frame.device_id):
+                self.rejected += 1
+                continue
+            if not self._accept_seq(frame):
+                continue
+            try:
+                self._queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _run(self):
+        while True:
+            frame = await self._queue.get()
+            if frame is None:
+                break
+            try:
+                await self.on_frame(frame)
+            except Exception:
+                self.errors += 1
+                log.exception("binary frame handling failed")
+                continue
+            self.frames += 1
+            self.samples += len(frame.values)
+
+    def stats(self) -> dict:
+        return {
+            "tcp_port": self.tcp_port,
+            "udp_port": self.udp_port,
+            "connections": self.connections,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "bytes": self.bytes,
+            "frames": self.frames,
+            "samples": self.samples,
+            "duplicates": self.duplicates,
+            "lost": self.lost,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+# ===== 참조 클라이언트 =====
+class BinaryClient:
+    """프레임 송신기 (테스트/시뮬레이터용), seq는 자동 증가"""
+
+    def __init__(self, host: str, port: int, device_id: str, tcp: bool = False):
+        _device_bytes(device_id)
+        self.device_id = device_id
+        self.seq = 0
+        self.tcp = tcp
+        if tcp:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect((host, port))
+
+    def _send(self, frame: bytes):
+        if self.tcp:
+            self.sock.sendall(frame)
+        else:
+            self.sock.send(frame)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+
+    def send_bpm(self, bpm, confidence=None, ts_ms: int = 0, period_s: float = 1.0):
+        self._send(encode_bpm_frame(self.device_id, self.seq, bpm, confidence, ts_ms, period_s))
+
+    def send_emg(self, values, channel: int = 0, ts_ms: int = 0, rate_hz: float = 200.0,
+                 float32: bool = False):
+        self._send(encode_emg_frame(self.device_id, self.seq, values, channel, ts_ms, rate_hz, float32))
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="바이너리 프레임 참조 클라이언트")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("send", help="BPM 또는 EMG 프레임 한 개 전송")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--device", required=True, help="device_id (최대 8자)")
+    p.add_argument("--tcp", action="store_true", help="UDP 대신 TCP")
+    p.add_argument("--bpm", type=float, nargs="+", help="BPM 값 (1초 간격)")
+    p.add_argument("--emg-file", help="EMG 값 파일 (한 줄에 하나)")
+    p.add_argument("--rate", type=float, default=200.0, help="EMG 샘플링 주파수")
+    p.add_argument("--channel", type=int, default=0)
+    args = parser.parse_args()
+
+    client = BinaryClient(args.host, args.port, args.device, tcp=args.tcp)
+    if args.bpm:
+        client.send_bpm(args.bpm)
+    if args.emg_file:
+        client.send_emg(np.loadtxt(args.emg_file), args.channel, rate_hz=args.rate)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
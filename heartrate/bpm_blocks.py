@@ -0,0 +1,342 @@
+"""bpm_data 압축 블록 저장 (강아지별 1시간 블록)
+
+수집은 그대로 bpm_data(hot 테이블)에 쌓고, 끝난 시간대는 seal()이
+강아지 × 시간 하나를 BLOB 하나로 묶어 bpm_blocks로 옮긴 뒤 원본 행을 지운다.
+이미 블록이 있는 시간대에 늦게 들어온 행은 다음 seal()에서 블록과 합쳐진다
+(블록에 이미 있는 ts는 StorageWriter가 sealed_ts()로 걸러 내므로 롤업에 두 번 들어가지 않음,
+그래도 겹치면 원본 행 우선). 조회는 read_range()/iter_range()가 겹치는 블록만
+풀어서 남은 원본 행과 합쳐 돌려준다.
+
+블록 형식 (little-endian):
+    version u8, n u32, 첫 ts i64 (epoch ms), ts 길이 u32, bpm 길이 u32, run 수 u32
+    ts      : 간격의 차분(delta-of-delta), zigzag varint (n-1개)
+    bpm     : 이전 값과의 차이, zigzag varint (n개, 첫 값은 0 기준)
+    status  : run-length - 코드 u8[run 수] + 길이 varint[run 수]
+
+    python bpm_blocks.py seal --db example_dogs.db [--vacuum]
+    python bpm_blocks.py stats --db example_dogs.db
+"""
+import argparse
+import sqlite3
+import struct
+import time
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+BLOCK_MS = 3600 * 1000
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BIqIII")
+_U7 = np.uint64(7)
+
+Samples = Tuple[np.ndarray, np.ndarray, np.ndarray]  # ts ms i64, bpm i16, status u8
+
+
+def create_block_table(conn: sqlite3.Connection):
+    # BLOB이 커서 WITHOUT ROWID 대신 rowid 테이블 + 고유 인덱스
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS bpm_blocks (
+        dog_key INTEGER NOT NULL REFERENCES dogs(id),
+        block_ts INTEGER NOT NULL,   -- 블록 시작 (epoch ms, BLOCK_MS 배수)
+        count INTEGER NOT NULL,
+        min_bpm INTEGER,
+        max_bpm INTEGER,
+        data BLOB NOT NULL,
+        UNIQUE (dog_key, block_ts)
+    )
+    """)
+
+
+# ===== 인코딩 =====
+def zigzag(v: np.ndarray) -> np.ndarray:
+    v = v.astype(np.int64)
+    return ((v << 1) ^ (v >> 63)).view(np.uint64)
+
+
+def unzigzag(u: np.ndarray) -> np.ndarray:
+    return (u >> np.uint64(1)).view(np.int64) ^ -(u & np.uint64(1)).view(np.int64)
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """uint64 배열 → LEB128 바이트 (바이트 자리별로 한 번에 채움)"""
+    v = np.asarray(values, dtype=np.uint64)
+    if not len(v):
+        return b""
+    nbytes = np.ones(len(v), dtype=np.int64)
+    rest = v >> _U7
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= _U7
+    ends = np.cumsum(nbytes)
+    starts = ends - nbytes
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        sel = nbytes > k
+        byte = (v[sel] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[sel] - 1 > k).astype(np.uint64) << _U7
+        out[starts[sel] + k] = byte | more
+    return out.tobytes()
+
+
+def varint_decode(buf: bytes) -> np.ndarray:
+    b = np.frombuffer(buf, dtype=np.uint8)
+    if not len(b):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.r_[0, ends[:-1] + 1]
+    pos = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    parts = (b & 0x7F).astype(np.uint64) << (pos.astype(np.uint64) * _U7)
+    return np.add.reduceat(parts, starts)
+
+
+def encode_block(ts: np.ndarray, bpm: np.ndarray, status: np.ndarray) -> bytes:
+    """시간순 (ts ms, bpm, status 코드) 배열 → 블록 바이트"""
+    ts = np.asarray(ts, dtype=np.int64)
+    n = len(ts)
+    deltas = np.diff(ts)
+    ts_bytes = varint_encode(zigzag(np.diff(deltas, prepend=0)))
+    bpm_bytes = varint_encode(zigzag(np.diff(np.asarray(bpm, dtype=np.int64), prepend=0)))
+    status = np.asarray(status, dtype=np.uint8)
+    run_starts = np.flatnonzero(np.r_[True, status[1:] != status[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, n])
+    return b"".join((
+        _HEADER.pack(FORMAT_VERSION, n, int(ts[0]), len(ts_bytes), len(bpm_bytes), len(run_starts)),
+        ts_bytes, bpm_bytes, status[run_starts].tobytes(), varint_encode(run_lengths),
+    ))
+
+
+def decode_block(data: bytes) -> Samples:
+    version, n, first, ts_len, bpm_len, runs = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unknown block version {version}")
+    view = memoryview(data)
+    pos = _HEADER.size
+    deltas = np.cumsum(unzigzag(varint_decode(view[pos:pos + ts_len])))
+    pos += ts_len
+    ts = np.empty(n, dtype=np.int64)
+    ts[0] = first
+    ts[1:] = first + np.cumsum(deltas)
+    bpm = np.cumsum(unzigzag(varint_decode(view[pos:pos + bpm_len]))).astype(np.int16)
+    pos += bpm_len
+    codes = np.frombuffer(view[pos:pos + runs], dtype=np.uint8)
+    lengths = varint_decode(view[pos + runs:]).astype(np.int64)
+    return ts, bpm, np.repeat(codes, lengths)
+
+
+# ===== 조회 =====
+def _merge(parts: list, raw: list) -> Samples:
+    """블록 샘플 뒤에 원본 행을 붙여 ts 순 정렬, 같은 ts는 원본 우선"""
+    if raw:
+        data = np.array(raw, dtype=np.int64)
+        parts.append((data[:, 0], data[:, 1].astype(np.int16), data[:, 2].astype(np.uint8)))
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.int16), np.empty(0, np.uint8)
+    ts = np.concatenate([p[0] for p in parts])
+    bpm = np.concatenate([p[1] for p in parts])
+    status = np.concatenate([p[2] for p in parts])
+    if len(parts) > 1:
+        order = np.argsort(ts, kind="stable")
+        ts, bpm, status = ts[order], bpm[order], status[order]
+        keep = np.r_[ts[1:] != ts[:-1], True]  # 같은 ts 중 마지막 (원본)
+        if not keep.all():
+            ts, bpm, status = ts[keep], bpm[keep], status[keep]
+    return ts, bpm, status
+
+
+def read_range(conn: sqlite3.Connection, dog_key: int, from_ms: int, to_ms: int) -> Samples:
+    """[from_ms, to_ms) 샘플 (겹치는 블록만 풀고 bpm_data의 남은 행과 합침)"""
+    parts = []
+    for (data,) in conn.execute(
+            "SELECT data FROM bpm_blocks WHERE dog_key = ? AND block_ts > ? AND block_ts < ? ORDER BY block_ts",
+            (dog_key, from_ms - BLOCK_MS, to_ms)):
+        ts, bpm, status = decode_block(data)
+        if ts[0] < from_ms or ts[-1] >= to_ms:
+            sel = (ts >= from_ms) & (ts < to_ms)
+            ts, bpm, status = ts[sel], bpm[sel], status[sel]
+        parts.append((ts, bpm, status))
+    raw = conn.execute(
+        "SELECT ts, bpm, status FROM bpm_data WHERE dog_key = ? AND ts >= ? AND ts < ? ORDER BY ts",
+        (dog_key, from_ms, to_ms)).fetchall()
+    return _merge(parts, raw)
+
+
+def sealed_ts(conn: sqlite3.Connection, dog_key: int, ts_ms) -> set:
+    """ts_ms(epoch ms 목록) 중 이미 봉인된 블록에 있는 값 (시간대마다 블록 하나만 확인)"""
+    wanted = set(ts_ms)
+    found = set()
+    for hour in {t // BLOCK_MS for t in wanted}:
+        row = conn.execute("SELECT data FROM bpm_blocks WHERE dog_key = ? AND block_ts = ?",
+                           (dog_key, hour * BLOCK_MS)).fetchone()
+        if row is not None:
+            found.update(wanted.intersection(decode_block(row[0])[0].tolist()))
+    return found
+
+
+def bounds(conn: sqlite3.Connection, dog_key: int) -> Optional[Tuple[int, int]]:
+    """강아지의 첫/마지막 샘플 시각 범위 (ms, 마지막은 블록 끝으로 올림)"""
+    lo, hi = [], []
+    row = conn.execute("SELECT MIN(block_ts), MAX(block_ts) FROM bpm_blocks WHERE dog_key = ?",
+                       (dog_key,)).fetchone()
+    if row[0] is not None:
+        lo.append(row[0])
+        hi.append(row[1] + BLOCK_MS)
+    row = conn.execute("SELECT MIN(ts), MAX(ts) FROM bpm_data WHERE dog_key = ?", (dog_key,)).fetchone()
+    if row[0] is not None:
+        lo.append(row[0])
+        hi.append(row[1] + 1)
+    return (min(lo), max(hi)) if lo else None
+
+
+def iter_range(conn: sqlite3.Connection, dog_key: int, from_ms: Optional[int] = None,
+               to_ms: Optional[int] = None, step_ms: int = 24 * BLOCK_MS) -> Iterator[Samples]:
+    """긴 기간을 step_ms(BLOCK_MS 배수)씩 나눠 read_range (메모리 일정, 빈 구간은 건너뜀)"""
+    span = bounds(conn, dog_key)
+    if span is None:
+        return
+    start = max(span[0], from_ms) if from_ms is not None else span[0]
+    end = min(span[1], to_ms) if to_ms is not None else span[1]
+    while start < end:
+        # 블록 경계에 맞춰 나눠야 블록 하나를 두 번 풀지 않음
+        stop = min(end, (start // step_ms + 1) * step_ms)
+        ts, bpm, status = read_range(conn, dog_key, start, stop)
+        if len(ts):
+            yield ts, bpm, status
+        start = stop
+
+
+def iter_rows(conn: sqlite3.Connection, dog_key: int, from_ms: Optional[int] = None,
+              to_ms: Optional[int] = None, chunk_size: int = 10_000) -> Iterator[Samples]:
+    """[from_ms, to_ms) 샘플을 ts 순으로 스트리밍 (내보내기용)
+
+    원본 행은 커서 하나에서 fetchmany(chunk_size)로 받고 블록은 한 개씩 풀어서
+    메모리에는 블록 하나(한 시간)와 원본 행 chunk_size개 정도만 둔다.
+    블록 시간대에 늦게 들어온 원본 행은 그 블록과 합쳐서 내보낸다 (같은 ts는 원본 우선).
+    """
+    lo = from_ms if from_ms is not None else -(1 << 62)
+    hi = to_ms if to_ms is not None else 1 << 62
+    blocks = conn.execute(
+        "SELECT block_ts, data FROM bpm_blocks WHERE dog_key = ? AND block_ts > ? AND block_ts < ? ORDER BY block_ts",
+        (dog_key, lo - BLOCK_MS, hi))
+    raw = conn.execute(
+        "SELECT ts, bpm, status FROM bpm_data WHERE dog_key = ? AND ts >= ? AND ts < ? ORDER BY ts",
+        (dog_key, lo, hi))
+    buf = _merge([], [])
+    exhausted = False
+
+    def fetch():
+        nonlocal buf, exhausted
+        rows = raw.fetchmany(chunk_size)
+        if rows:
+            data = np.array(rows, dtype=np.int64)
+            new = (data[:, 0], data[:, 1].astype(np.int16), data[:, 2].astype(np.uint8))
+            buf = tuple(np.concatenate(pair) for pair in zip(buf, new))
+        else:
+            exhausted = True
+
+    def raw_before(limit: int) -> Iterator[Samples]:
+        nonlocal buf
+        while True:
+            if not exhausted and len(buf[0]) < chunk_size and (not len(buf[0]) or buf[0][-1] < limit):
+                fetch()
+                continue
+            k = int(np.searchsorted(buf[0], limit))
+            if k == 0:
+                return
+            out, buf = tuple(a[:k] for a in buf), tuple(a[k:] for a in buf)
+            yield out
+            if len(buf[0]):
+                return  # 남은 행은 limit 이후
+
+    try:
+        for block_ts, data in blocks:
+            yield from raw_before(block_ts)
+            parts = [decode_block(data), *raw_before(block_ts + BLOCK_MS)]
+            ts, bpm, status = _merge(parts, [])
+            if ts[0] < lo or ts[-1] >= hi:
+                sel = (ts >= lo) & (ts < hi)
+                ts, bpm, status = ts[sel], bpm[sel], status[sel]
+            if len(ts):
+                yield ts, bpm, status
+        yield from raw_before(hi)
+    finally:
+        blocks.close()
+        raw.close()
+
+
+# ===== 봉인 (bpm_data → bpm_blocks) =====
+def seal(conn: sqlite3.Connection, before_ms: Optional[int] = None, max_blocks: int = 50) -> dict:
+    """before_ms(기본: 현재 시간대 시작) 이전의 bpm_data를 블록으로 옮김, 한 트랜잭션에 최대 max_blocks개
+
+    반환값의 blocks가 max_blocks와 같으면 남은 것이 있으므로 다시 호출한다.
+    """
+    if before_ms is None:
+        before_ms = int(time.time() * 1000) // BLOCK_MS * BLOCK_MS
+    before_ms = before_ms // BLOCK_MS * BLOCK_MS
+    groups = conn.execute(
+        f"SELECT DISTINCT dog_key, ts / {BLOCK_MS} FROM bpm_data WHERE ts < ? LIMIT ?",
+        (before_ms, max_blocks)).fetchall()
+    rows_moved = 0
+    with conn:
+        for dog_key, hour in groups:
+            start, end = hour * BLOCK_MS, (hour + 1) * BLOCK_MS
+            ts, bpm, status = read_range(conn, dog_key, start, end)
+            rows_moved += conn.execute("DELETE FROM bpm_data WHERE dog_key = ? AND ts >= ? AND ts < ?",
+                                       (dog_key, start, end)).rowcount
+            conn.execute("""
+                INSERT INTO bpm_blocks (dog_key, block_ts, count, min_bpm, max_bpm, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dog_key, block_ts) DO UPDATE SET
+                    count = excluded.count, min_bpm = excluded.min_bpm,
+                    max_bpm = excluded.max_bpm, data = excluded.data
+            """, (dog_key, start, len(ts), int(bpm.min()), int(bpm.max()), encode_block(ts, bpm, status)))
+    return {"blocks": len(groups), "rows": rows_moved}
+
+
+def seal_all(conn: sqlite3.Connection, before_ms: Optional[int] = None, max_blocks: int = 50) -> dict:
+    totals = {"blocks": 0, "rows": 0}
+    while True:
+        done = seal(conn, before_ms, max_blocks)
+        totals["blocks"] += done["blocks"]
+        totals["rows"] += done["rows"]
+        if done["blocks"] < max_blocks:
+            return totals
+
+
+def block_stats(conn: sqlite3.Connection) -> dict:
+    blocks, samples, size = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(count), 0), COALESCE(SUM(LENGTH(data)), 0) FROM bpm_blocks").fetchone()
+    raw = conn.execute("SELECT COUNT(*) FROM bpm_data").fetchone()[0]
+    return {
+        "blocks": blocks,
+        "block_samples": samples,
+        "block_bytes": size,
+        "bytes_per_sample": round(size / samples, 2) if samples else None,
+        "raw_rows": raw,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bpm_data 압축 블록 관리")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("seal", help="지난 시간대의 bpm_data를 블록으로 옮김")
+    p.add_argument("--db", default="example_dogs.db")
+    p.add_argument("--max-blocks", type=int, default=200, help="트랜잭션당 블록 수")
+    p.add_argument("--vacuum", action="store_true", help="끝난 뒤 VACUUM으로 파일 크기 줄이기")
+    p = sub.add_parser("stats", help="블록 / 원본 행 수와 크기")
+    p.add_argument("--db", default="example_dogs.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    create_block_table(conn)
+    if args.command == "seal":
+        totals = seal_all(conn, max_blocks=args.max_blocks)
+        print(f"✅ sealed {totals['rows']} rows into {totals['blocks']} blocks")
+        if args.vacuum:
+            conn.execute("VACUUM")
+    elif args.command == "stats":
+        print(block_stats(conn))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
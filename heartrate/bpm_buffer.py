@@ -0,0 +1,80 @@
+from typing import Optional
+
+import numpy as np
+
+# 상태 문자열 <-> uint8 코드
+STATUS_NAMES = ["none", "low", "normal", "high"]
+STATUS_CODES = {name: i for i, name in enumerate(STATUS_NAMES)}
+
+BPM_INFO = np.iinfo(np.int16)
+
+
+def to_bpm16(bpm) -> np.ndarray:
+    """bpm 값(들)을 int16 배열로, 범위를 넘는 값은 양 끝으로 자름 (int16로 바로 바꾸면 OverflowError나 wrap)"""
+    return np.clip(np.asarray(bpm, dtype=np.float64), BPM_INFO.min, BPM_INFO.max).astype(np.int16)
+
+
+class DogRingBuffer:
+    """강아지 한 마리의 최근 샘플 (미리 할당한 배열 기반 링버퍼)"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.bpm = np.zeros(capacity, dtype=np.int16)
+        self.status = np.zeros(capacity, dtype=np.uint8)
+        self.head = 0   # 다음에 쓸 위치
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, ts: float, bpm: int, status: str):
+        i = self.head
+        self.ts[i] = ts
+        self.bpm[i] = to_bpm16(bpm)
+        self.status[i] = STATUS_CODES.get(status, 0)
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def extend(self, ts, bpm, status):
+        """ts/bpm/status 시퀀스를 한 번에 추가"""
+        ts = np.asarray(ts, dtype=np.float64)
+        bpm = to_bpm16(bpm)
+        codes = np.fromiter((STATUS_CODES.get(s, 0) for s in status), dtype=np.uint8, count=len(ts))
+        n = len(ts)
+        if n == 0:
+            return
+        if n > self.capacity:
+            ts, bpm, codes = ts[-self.capacity:], bpm[-self.capacity:], codes[-self.capacity:]
+            n = self.capacity
+        idx = (self.head + np.arange(n)) % self.capacity
+        self.ts[idx] = ts
+        self.bpm[idx] = bpm
+        self.status[idx] = codes
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def last(self) -> Optional[dict]:
+        if self.count == 0:
+            return None
+        i = (self.head - 1) % self.capacity
+        return {"ts": float(self.ts[i]), "bpm": int(self.bpm[i]),
+                "status": STATUS_NAMES[self.status[i]]}
+
+    def last_bpm(self) -> Optional[int]:
+        if self.count == 0:
+            return None
+        return int(self.bpm[(self.head - 1) % self.capacity])
+
+    def tail(self, n: int):
+        """최근 n개를 (ts, bpm, status) 배열로 반환 (오래된 것 → 최신 순)"""
+        n = max(0, min(n, self.count))
+        idx = (self.head - n + np.arange(n)) % self.capacity
+        return self.ts[idx], self.bpm[idx], self.status[idx]
+
+    def tail_dicts(self, n: int):
+        ts, bpm, status = self.tail(n)
+        return [{"ts": t, "bpm": b, "status": STATUS_NAMES[s]}
+                for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())]
+
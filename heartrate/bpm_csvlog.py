@@ -0,0 +1,388 @@
+"""심박 CSV 감사 로그 (백그라운드 스레드 + 시간/크기 단위 세그먼트)
+
+수집 핸들러는 행을 큐에 넣기만 하고(write), 전용 스레드가 파일 하나를 열어 둔 채
+묶어서 기록한다. flush_rows 행이 쌓이거나 flush_interval 초가 지나면 모은 줄을
+os.write 한 번으로 붙인다 (O_APPEND, 줄 중간에서 끊기지 않으므로 여러 워커가 같은 파일에 써도 됨).
+
+현재 파일(path, 예: hr_data.csv)이 rotate_s 경계(기본 매시)를 넘었거나 rotate_bytes 이상이면
+{root}.{YYYY-MM-DDTHH}{ext} 세그먼트로 이름을 바꾸고 헤더만 있는 새 파일을 연다.
+세그먼트별 시간 범위는 {root}.segments.jsonl에 한 줄씩 남긴다 (gzip/삭제는 bpm_retention).
+기록기가 떠 있지 않을 때는 rotate_stale로 같은 규칙의 교체를 한다 (bpm_retention CLI).
+교체는 {path}.lock flock을 잡은 워커 하나만 하고, 나머지는 다음 flush에서 inode가 바뀐 것을 보고 다시 연다.
+
+내구성: flush가 끝난 행(seq ≤ flushed)은 프로세스가 죽어도 남는다. 응답 전에 확인하려면 await wait(seq).
+기록이 실패하면 기다리던 쪽은 False를 받고, 행은 max_pending_rows까지 모아 두었다가 다시 시도한다
+(넘치면 오래된 행부터 버리고 dropped_rows로 셈).
+다시 열 때 마지막 줄이 잘려 있으면 잘라내고, 색인에 빠진 세그먼트는 파일에서 범위를 읽어 채운다.
+"""
+import asyncio
+import csv
+import fcntl
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bpm_retention import csv_segments
+
+HEADER = ["timestamp", "dog_id", "bpm", "status"]
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 기록할 행 한 개: (ts epoch seconds, dog_id, bpm, status)
+Row = Tuple[float, str, int, str]
+
+log = logging.getLogger("bpm.csvlog")
+
+
+# ===== 세그먼트 / 색인 =====
+def index_path(path: str) -> str:
+    root, _ = os.path.splitext(path)
+    return root + ".segments.jsonl"
+
+
+def _segment_name(path: str, start: str) -> str:
+    root, ext = os.path.splitext(path)
+    key = start[:13].replace(" ", "T")  # YYYY-MM-DDTHH
+    name, n = f"{root}.{key}{ext}", 1
+    while os.path.exists(name) or os.path.exists(name + ".gz"):
+        name, n = f"{root}.{key}.{n}{ext}", n + 1
+    return name
+
+
+def _is_row(line: bytes) -> bool:
+    return bool(line.strip()) and not line.startswith(b"timestamp")
+
+
+def _edge_rows(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """첫 행과 마지막 행의 timestamp (gzip이면 끝까지 읽음)"""
+    first = last = None
+    gz = path.endswith(".gz")
+    with (gzip.open(path, "rb") if gz else open(path, "rb")) as f:
+        for line in f:
+            if _is_row(line):
+                first = last = line
+                break
+        if first is None:
+            return None, None
+        if gz:
+            for line in f:
+                if _is_row(line):
+                    last = line
+        else:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 4096))
+            tail = [line for line in f.read().splitlines() if _is_row(line)]
+            if tail:
+                last = tail[-1]
+    return first[:19].decode(), last[:19].decode()
+
+
+@contextmanager
+def file_lock(path: str):
+    """세그먼트 교체/색인 갱신용 {path}.lock (워커와 CLI 공통)"""
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def rotate_segment(path: str) -> Optional[str]:
+    """현재 파일을 세그먼트로 이름을 바꾸고 색인에 기록 (file_lock 안에서 부름), 행이 없으면 None"""
+    first, last = _edge_rows(path)
+    if first is None:
+        return None
+    size = os.path.getsize(path)
+    segment = _segment_name(path, first)
+    os.rename(path, segment)
+    with open(index_path(path), "a") as f:
+        f.write(json.dumps({"segment": os.path.basename(segment), "from": first,
+                            "to": last, "bytes": size}) + "\n")
+    return segment
+
+
+def rotate_stale(path: str, rotate_s: float = 3600, rotate_bytes: int = 64 * 1024 * 1024,
+                 now: Optional[float] = None) -> Optional[str]:
+    """첫 행이 지난 rotate_s 구간이거나 rotate_bytes 이상이면 세그먼트로 떼어냄 (기록기와 같은 규칙)
+
+    새 파일은 기록기가 다음 flush에서 만든다 (inode가 바뀐 것을 보고 다시 엶).
+    """
+    with file_lock(path):
+        if not os.path.exists(path):
+            return None
+        first, _ = _edge_rows(path)
+        if first is None:
+            return None
+        start = datetime.strptime(first, TS_FORMAT).timestamp()
+        now = now if now is not None else time.time()
+        if int(now // rotate_s) == int(start // rotate_s) and os.path.getsize(path) < rotate_bytes:
+            return None
+        return rotate_segment(path)
+
+
+def segment_index(path: str) -> List[dict]:
+    """세그먼트 색인 (gzip된 세그먼트는 file이 .gz, 지워진 세그먼트는 빠짐)"""
+    out = []
+    base = os.path.dirname(path)
+    try:
+        with open(index_path(path)) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        for name in (entry["segment"], entry["segment"] + ".gz"):
+            if os.path.exists(os.path.join(base, name)):
+                out.append({**entry, "file": name})
+                break
+    return out
+
+
+# ===== 기록기 =====
+class CsvSegmentLog:
+    def __init__(self, path: str, rotate_s: float = 3600, rotate_bytes: int = 64 * 1024 * 1024,
+                 flush_interval: float = 1.0, flush_rows: int = 5000, max_pending_rows: int = 100_000):
+        self.path = path
+        self.rotate_s = rotate_s
+        self.rotate_bytes = rotate_bytes
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_pending_rows = max_pending_rows
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+        self._ino = None
+        self._head_key = 0
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._waiters: List[tuple] = []  # (seq, loop, future)
+
+        # 통계
+        self.flushed = 0  # 파일에 기록이 끝난 (또는 재시도 한도를 넘어 버린) 마지막 seq
+        self.flushes = 0
+        self.rotations = 0
+        self.errors = 0
+        self.dropped_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    # ===== 수명 주기 =====
+    def start(self):
+        with file_lock(self.path):
+            self._recover()
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="bpm-csvlog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """남은 행을 모두 기록한 뒤 파일을 닫음"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        os.close(self._fd)
+        self._fd = None
+
+    def _recover(self):
+        # 잘린 마지막 줄 제거
+        if os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(max(0, size - 65536))
+                    tail = f.read()
+                    if not tail.endswith(b"\n"):
+                        cut = tail.rfind(b"\n")
+                        keep = size - len(tail) + cut + 1 if cut >= 0 else 0
+                        f.truncate(keep)
+                        log.warning("%s: dropped %d bytes of a torn last row", self.path, size - keep)
+        # 색인에 없는 세그먼트 추가, 지워진 세그먼트 제거
+        entries = segment_index(self.path)
+        known = {e["segment"] for e in entries}
+        for seg, _, _ in csv_segments(self.path):
+            name = os.path.basename(seg)
+            name = name[:-3] if name.endswith(".gz") else name
+            if name not in known:
+                first, last = _edge_rows(seg)
+                entries.append({"segment": name, "from": first, "to": last, "bytes": os.path.getsize(seg)})
+                known.add(name)
+        entries.sort(key=lambda e: (e["from"] or "", e["segment"]))
+        tmp = index_path(self.path) + ".tmp"
+        with open(tmp, "w") as f:
+            for e in entries:
+                e.pop("file", None)
+                f.write(json.dumps(e) + "\n")
+        os.replace(tmp, index_path(self.path))
+
+    def _create(self):
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return  # 다른 워커가 먼저 만듦
+        try:
+            os.write(fd, (",".join(HEADER) + "\r\n").encode())
+        finally:
+            os.close(fd)
+
+    def _open(self):
+        self._create()
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self._ino = os.fstat(self._fd).st_ino
+        first, _ = _edge_rows(self.path)
+        start = datetime.strptime(first, TS_FORMAT).timestamp() if first else time.time()
+        self._head_key = int(start // self.rotate_s)
+
+    # ===== 쓰기 =====
+    def write(self, rows: List[Row]) -> int:
+        """행을 큐에 넣고 seq 반환 (파일 기록은 스레드에서)"""
+        with self._lock:  # seq 순서대로 큐에 들어가야 flushed가 앞지르지 않음
+            self._seq += len(rows)
+            seq = self._seq
+            self._queue.put((seq, rows))
+        return seq
+
+    async def wait(self, seq: int) -> bool:
+        """seq까지 파일에 기록될 때까지 대기, 기록이 실패했으면 False
+
+        스레드는 기다리는 쪽이 있으면 바로 flush한다.
+        """
+        if self.flushed >= seq:
+            return True
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            if self.flushed >= seq:
+                return True
+            self._waiters.append((seq, loop, fut))
+        self._queue.put((0, []))  # 깨우기
+        return await fut
+
+    def _wake_waiters(self, failed: bool = False):
+        """flushed까지 기다리던 쪽에 True, failed면 남은 쪽 모두에 False"""
+        with self._lock:
+            if failed:
+                ready, self._waiters = self._waiters, []
+            else:
+                ready = [w for w in self._waiters if w[0] <= self.flushed]
+                self._waiters = [w for w in self._waiters if w[0] > self.flushed]
+        for seq, loop, fut in ready:
+            ok = seq <= self.flushed
+            loop.call_soon_threadsafe(lambda f=fut, ok=ok: f.done() or f.set_result(ok))
+
+    def _drop_oldest(self, rows: List[Row], seq: int) -> List[Row]:
+        """재시도용 행이 max_pending_rows를 넘으면 오래된 행부터 버림 (rows는 seq까지 이어진 행)"""
+        excess = len(rows) - self.max_pending_rows
+        if excess <= 0:
+            return rows
+        self.dropped_rows += excess
+        self.flushed = seq - self.max_pending_rows  # 버린 행은 더 기다리지 않음
+        log.error("csv log retry buffer full: dropped %d oldest rows", excess)
+        return rows[excess:]
+
+    def _rotate_if_needed(self, now: float):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._ino:
+            self._open()  # 다른 워커가 교체함
+            return
+        if int(now // self.rotate_s) == self._head_key and st.st_size < self.rotate_bytes:
+            return
+        with file_lock(self.path):
+            if os.stat(self.path).st_ino == self._ino and rotate_segment(self.path) is not None:
+                self.rotations += 1
+            self._open()
+
+    def _flush(self, rows: List[Row]):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerows([datetime.fromtimestamp(ts).strftime(TS_FORMAT), dog_id, bpm, status]
+                         for ts, dog_id, bpm, status in rows)
+        data = memoryview(buf.getvalue().encode())
+        self._rotate_if_needed(time.time())
+        while data:
+            n = os.write(self._fd, data)
+            data = data[n:]
+
+    def _run(self):
+        rows: List[Row] = []
+        seq = self.flushed
+        last_flush = time.monotonic()
+        closing = False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = (0, [])
+            # 쌓인 것은 한 번에
+            while item is not None:
+                if item[0]:
+                    seq = item[0]
+                rows.extend(item[1])
+                if len(rows) >= self.flush_rows:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if item is None:
+                closing = True
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if not (closing or due or self._waiters or len(rows) >= self.flush_rows):
+                continue
+            if rows:
+                t0 = time.perf_counter()
+                try:
+                    self._flush(rows)
+                except OSError as e:
+                    self.errors += 1
+                    log.error("csv log write failed (%d rows kept for retry): %s", len(rows), e)
+                    rows = self._drop_oldest(rows, seq)
+                    self._wake_waiters(failed=True)
+                    if not closing:
+                        time.sleep(self.flush_interval)
+                        continue
+                    self.dropped_rows += len(rows)  # 종료 중이라 다시 시도하지 않음
+                    log.error("csv log closed with %d unwritten rows", len(rows))
+                else:
+                    elapsed = (time.perf_counter() - t0) * 1000
+                    self.flushes += 1
+                    self.last_flush_ms = elapsed
+                    self.max_flush_ms = max(self.max_flush_ms, elapsed)
+                    rows = []
+            else:
+                try:
+                    self._rotate_if_needed(time.time())  # 조용한 시간에도 매시 교체
+                except OSError as e:
+                    self.errors += 1
+                    log.error("csv log rotation failed: %s", e)
+            if not rows:
+                self.flushed = seq
+            last_flush = time.monotonic()
+            self._wake_waiters()
+
+    # ===== 통계 =====
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "pending_rows": self._seq - self.flushed,
+            "flushed_rows": self.flushed,
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+            "errors": self.errors,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
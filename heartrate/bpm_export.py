@@ -0,0 +1,173 @@
+"""bpm_data 대량 내보내기 (CSV / NDJSON / 열 단위 바이너리)
+
+강아지별로 bpm_blocks.iter_rows가 원본 행은 fetchmany(chunk_size)로, 압축 블록은 한 개씩 풀어
+주는 대로 chunk_size행씩 바로 인코딩해 내보낸다. 메모리는 기록 크기와 상관없이
+블록 하나(강아지 한 마리의 한 시간)와 원본 행 chunk_size개 정도이고, 첫 바이트가 바로 나간다.
+
+    python bpm_export.py --dog-id coco --from 2025-01-01 --to 2025-02-01 --format csv --out coco.csv
+    python bpm_export.py --format bin --out all.bpmx
+
+열 단위 바이너리 (little-endian):
+    b"BPMX" + version u8
+    블록 반복: n u32, dog_id 길이 u16, dog_id (UTF-8),
+              ts i64[n] (epoch ms), bpm i16[n], status u8[n] (bpm_buffer.STATUS_NAMES 코드)
+    n = 0 블록으로 끝
+"""
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import struct
+import sys
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+import numpy as np
+
+from bpm_blocks import create_block_table, iter_rows
+from bpm_buffer import STATUS_NAMES
+from bpm_schema import lookup_dog_key
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "bin": ("application/octet-stream", "bpmx"),
+}
+COLUMNAR_MAGIC = b"BPMX"
+COLUMNAR_VERSION = 1
+_BLOCK = struct.Struct("<IH")
+
+
+def iter_chunks(conn: sqlite3.Connection, dog_id: Optional[str] = None,
+                from_ts: Optional[float] = None, to_ts: Optional[float] = None,
+                chunk_size: int = 10_000) -> Iterator[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]:
+    """(dog_id, ts ms, bpm, status 코드) 배열 묶음을 강아지, 시각 순으로 차례로 반환"""
+    names = dict(conn.execute("SELECT id, dog_id FROM dogs ORDER BY id"))
+    if dog_id is not None:
+        key = lookup_dog_key(conn, dog_id)
+        if key is None:
+            return
+        names = {key: dog_id}
+    from_ms = int(from_ts * 1000) if from_ts is not None else None
+    to_ms = int(to_ts * 1000) if to_ts is not None else None
+    for key, name in names.items():
+        # 저장 형태(원본/블록)와 상관없이 같은 출력이 나오도록 정확히 chunk_size행씩 다시 자름
+        pending, count = [], 0
+        for part in iter_rows(conn, key, from_ms, to_ms, chunk_size):
+            pending.append(part)
+            count += len(part[0])
+            if count < chunk_size:
+                continue
+            ts, bpm, status = (np.concatenate(col) for col in zip(*pending))
+            cut = count // chunk_size * chunk_size
+            for i in range(0, cut, chunk_size):
+                yield name, ts[i:i + chunk_size], bpm[i:i + chunk_size], status[i:i + chunk_size]
+            pending, count = [(ts[cut:], bpm[cut:], status[cut:])], count - cut
+        if count:
+            yield (name, *(np.concatenate(col) for col in zip(*pending)))
+
+
+def _status_name(code: int) -> str:
+    return STATUS_NAMES[code] if 0 <= code < len(STATUS_NAMES) else "none"
+
+
+def _csv_chunks(chunks) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["ts_ms", "timestamp", "dog_id", "bpm", "status"])
+    yield buf.getvalue().encode()
+    for dog_id, ts, bpm, status in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(
+            [t, datetime.fromtimestamp(t / 1000).strftime("%Y-%m-%d %H:%M:%S"), dog_id, b, _status_name(s)]
+            for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())
+        )
+        yield buf.getvalue().encode()
+
+
+def _ndjson_chunks(chunks) -> Iterator[bytes]:
+    for dog_id, ts, bpm, status in chunks:
+        yield "".join(
+            json.dumps({"dog_id": dog_id, "ts": t / 1000, "bpm": b, "status": _status_name(s)},
+                       ensure_ascii=False, separators=(",", ":")) + "\n"
+            for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())
+        ).encode()
+
+
+def _columnar_chunks(chunks) -> Iterator[bytes]:
+    yield COLUMNAR_MAGIC + bytes([COLUMNAR_VERSION])
+    for dog_id, ts, bpm, status in chunks:
+        name = dog_id.encode()
+        yield b"".join((_BLOCK.pack(len(ts), len(name)), name, ts.astype("<i8").tobytes(),
+                        bpm.astype("<i2").tobytes(), status.astype(np.uint8).tobytes()))
+    yield _BLOCK.pack(0, 0)
+
+
+def export_stream(conn: sqlite3.Connection, fmt: str = "csv", **query) -> Iterator[bytes]:
+    """fmt 형식으로 인코딩한 바이트 조각을 차례로 반환 (query는 iter_chunks 인자)"""
+    chunks = iter_chunks(conn, **query)
+    if fmt == "csv":
+        return _csv_chunks(chunks)
+    if fmt == "ndjson":
+        return _ndjson_chunks(chunks)
+    if fmt == "bin":
+        return _columnar_chunks(chunks)
+    raise ValueError(f"unknown export format: {fmt}")
+
+
+def read_columnar(fp: BinaryIO) -> Iterator[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]:
+    """열 단위 바이너리를 (dog_id, ts ms, bpm, status) 블록 단위로 읽음"""
+    head = fp.read(len(COLUMNAR_MAGIC) + 1)
+    if head[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC or head[-1] != COLUMNAR_VERSION:
+        raise ValueError("not a BPMX export")
+    while True:
+        n, name_len = _BLOCK.unpack(fp.read(_BLOCK.size))
+        if n == 0:
+            return
+        dog_id = fp.read(name_len).decode()
+        body = fp.read(n * 11)
+        ts = np.frombuffer(body, dtype="<i8", count=n)
+        bpm = np.frombuffer(body, dtype="<i2", count=n, offset=8 * n)
+        status = np.frombuffer(body, dtype=np.uint8, count=n, offset=10 * n)
+        yield dog_id, ts, bpm, status
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """epoch seconds 또는 ISO 날짜/시각 (로컬 시간)"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bpm_data 내보내기")
+    parser.add_argument("--db", default="example_dogs.db")
+    parser.add_argument("--dog-id", default=None, help="지정하지 않으면 전체")
+    parser.add_argument("--from", dest="from_ts", default=None, help="시작 (epoch 초 또는 ISO, 포함)")
+    parser.add_argument("--to", dest="to_ts", default=None, help="끝 (epoch 초 또는 ISO, 미포함)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--out", default=None, help="출력 파일 (기본 stdout)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    create_block_table(conn)
+    stream = export_stream(conn, args.format, dog_id=args.dog_id, from_ts=parse_time(args.from_ts),
+                           to_ts=parse_time(args.to_ts), chunk_size=args.chunk_size)
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        for part in stream:
+            out.write(part)
+    finally:
+        if args.out:
+            out.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""BPM 이상치 필터 파이프라인
+
+실시간 단일 샘플과 배치/백필 모두 같은 코드로 처리하도록 NumPy 배열 단위로
+동작한다. 각 단계는 거부할 샘플을 NaN으로 표시하고, 마지막에 거부된 샘플은
+직전 정상값으로 채운다. 채울 값이 없으면 (이력 없이 처음부터 거부) 그 샘플은
+버리도록 표시한다. 단계별로 거부하거나 값을 바꾼 샘플 수를 집계한다.
+
+기본 구성 (강아지 크기별로 파라미터만 다름):
+    QualityGate → RangeFilter → HampelFilter → RateLimiter
+"""
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class FilterContext:
+    """한 번의 run()에 공통으로 쓰이는 값"""
+
+    __slots__ = ("key", "history", "confidence")
+
+    def __init__(self, key, history: np.ndarray, confidence: Optional[np.ndarray]):
+        self.key = key                # dog_id (단계별 상태 구분용)
+        self.history = history        # 같은 강아지의 최근 확정 bpm
+        self.confidence = confidence  # 샘플별 센서 신뢰도 (없으면 None)
+
+
+class FilterStage:
+    name = "stage"
+
+    def apply(self, x: np.ndarray, ctx: FilterContext) -> np.ndarray:
+        """x(float, 거부된 값은 NaN)를 받아 같은 길이 배열 반환"""
+        raise NotImplementedError
+
+
+class QualityGate(FilterStage):
+    """센서 신뢰도(MAX3010x confidence, 0~100)가 낮은 샘플 거부"""
+    name = "quality"
+
+    def __init__(self, min_confidence: float = 50.0):
+        self.min_confidence = min_confidence
+
+    def apply(self, x, ctx):
+        if ctx.confidence is None:
+            return x
+        return np.where(ctx.confidence < self.min_confidence, np.nan, x)
+
+
+class RangeFilter(FilterStage):
+    """생리적으로 불가능한 값 거부"""
+    name = "range"
+
+    def __init__(self, lo: float = 30, hi: float = 220):
+        self.lo = lo
+        self.hi = hi
+
+    def apply(self, x, ctx):
+        return np.where((x < self.lo) | (x > self.hi), np.nan, x)
+
+
+class HampelFilter(FilterStage):
+    """직전 window개 값의 중앙값에서 n_sigma·MAD 이상 벗어난 값 거부 (인과적 Hampel)
+
+    기준 창은 확정값이 아니라 이 단계에 들어온 값(앞 단계 통과값)으로 유지한다.
+    확정값을 쓰면 실제 심박이 크게 바뀌었을 때 계속 거부되어 값이 고정된다.
+    """
+    name = "hampel"
+
+    def __init__(self, window: int = 7, n_sigma: float = 3.0, min_mad: float = 2.0):
+        self.window = window
+        self.n_sigma = n_sigma
+        self.min_mad = min_mad
+        self._recent: Dict[object, np.ndarray] = {}
+
+    def apply(self, x, ctx):
+        w = self.window
+        recent = self._recent.get(ctx.key)
+        if recent is None:
+            recent = ctx.history[-w:]
+        seq = np.concatenate([recent, x])
+        self._recent[ctx.key] = seq[-w:]
+        pad = w - min(len(recent), w)
+        if pad:
+            seq = np.concatenate([np.full(pad, np.nan), seq])
+        windows = sliding_window_view(seq[:-1], w)  # 샘플 i 직전 w개
+        valid = ~np.isnan(windows)
+        enough = valid.sum(axis=1) >= max(3, w // 2)
+        if not enough.any():
+            return x
+        with warnings.catch_warnings():
+            # 값이 하나도 없는 창의 All-NaN 경고 (enough로 걸러짐)
+            warnings.simplefilter("ignore", RuntimeWarning)
+            med = np.nanmedian(windows, axis=1)
+            mad = 1.4826 * np.nanmedian(np.abs(windows - med[:, None]), axis=1)
+        mad = np.maximum(np.nan_to_num(mad), self.min_mad)
+        outlier = enough & (np.abs(x - med) > self.n_sigma * mad)
+        return np.where(outlier, np.nan, x)
+
+
+class RateLimiter(FilterStage):
+    """샘플 간 변화량을 max_step으로 제한
+
+    기존 '20 이상 튀면 이전 값 유지' 규칙은 실제 심박이 한 번에 바뀌면
+    값이 계속 고정되므로, 거부 대신 max_step만큼씩 따라가도록 한다.
+    """
+    name = "rate"
+
+    def __init__(self, max_step: float = 20):
+        self.max_step = max_step
+
+    def apply(self, x, ctx):
+        out = x.copy()
+        prev = ctx.history[-1] if len(ctx.history) else np.nan
+        step = self.max_step
+        # 이전 값에 의존하는 점화식이라 순차 처리 (배치 크기만큼의 단순 루프)
+        for i, v in enumerate(x.tolist()):
+            if v != v:  # NaN (앞 단계에서 거부)
+                continue
+            if prev == prev:
+                v = min(max(v, prev - step), prev + step)
+            out[i] = v
+            prev = v
+        return out
+
+
+class FilterPipeline:
+    def __init__(self, stages: List[FilterStage], history_size: int = 16):
+        self.stages = stages
+        self.history_size = history_size
+        self.seen = 0
+        self.rejected: Dict[str, int] = {s.name: 0 for s in stages}
+        self.held = 0     # 거부되어 직전 값으로 채운 샘플 수
+        self.dropped = 0  # 거부됐는데 채울 직전 값이 없어 버린 샘플 수
+
+    def run(self, values, history=None, confidence=None, key=None) -> Tuple[np.ndarray, np.ndarray]:
+        """원시 bpm 배열 → (필터링된 정수 bpm 배열, 저장할 샘플 bool 배열)
+
+        keep이 False인 샘플은 거부됐는데 직전 정상값이 없는 것으로, bpm 값은 의미 없음
+        (원래 값으로 저장하면 다음 샘플의 기준이 되어 RateLimiter가 잘못 끌어내림).
+
+        history: 같은 강아지의 최근 확정 bpm (오래된 것 → 최신)
+        confidence: 샘플별 센서 신뢰도 (None 항목은 통과)
+        key: 강아지 구분 키 (단계별 이력 보관용)
+        """
+        x = np.asarray(values, dtype=np.float64)
+        hist = np.asarray(history if history is not None else [], dtype=np.float64)[-self.history_size:]
+        conf = None if confidence is None else np.asarray(
+            [np.inf if c is None else c for c in confidence], dtype=np.float64)
+        ctx = FilterContext(key, hist, conf)
+        self.seen += len(x)
+
+        for stage in self.stages:
+            before = x
+            x = stage.apply(x, ctx)
+            # 이 단계에서 거부(NaN)되거나 값이 바뀐 샘플
+            changed = ~np.isnan(before) & (np.isnan(x) | (x != before))
+            self.rejected[stage.name] += int(changed.sum())
+
+        # 거부된 샘플은 직전 정상값으로 채움 (이력도 앞선 정상값도 없으면 버림)
+        keep = np.ones(len(x), dtype=bool)
+        bad = np.isnan(x)
+        if bad.any():
+            seed = hist[-1] if len(hist) else np.nan
+            filled = np.concatenate([[seed], x])
+            idx = np.where(np.isnan(filled), 0, np.arange(len(filled)))
+            np.maximum.accumulate(idx, out=idx)
+            x = filled[idx][1:]
+            keep = ~np.isnan(x)
+            x[~keep] = 0
+            self.dropped += int((~keep).sum())
+            self.held += int(bad.sum()) - int((~keep).sum())
+        return np.rint(x).astype(np.int64), keep
+
+    def stats(self) -> dict:
+        return {"seen": self.seen, "held": self.held, "dropped": self.dropped, "rejected": dict(self.rejected)}
+
+
+# ===== 강아지 크기별 기본 구성 =====
+FILTER_CONFIG = {
+    "small":  {"range": (40, 250), "hampel_window": 7, "n_sigma": 3.0, "max_step": 25, "min_confidence": 50},
+    "medium": {"range": (30, 220), "hampel_window": 7, "n_sigma": 3.0, "max_step": 20, "min_confidence": 50},
+    "large":  {"range": (25, 200), "hampel_window": 7, "n_sigma": 3.0, "max_step": 20, "min_confidence": 50},
+}
+
+
+def build_pipeline(config: dict) -> FilterPipeline:
+    lo, hi = config["range"]
+    return FilterPipeline([
+        QualityGate(config["min_confidence"]),
+        RangeFilter(lo, hi),
+        HampelFilter(config["hampel_window"], config["n_sigma"]),
+        RateLimiter(config["max_step"]),
+    ], history_size=max(16, config["hampel_window"]))
+
+
+def build_pipelines(config: Dict[str, dict] = FILTER_CONFIG) -> Dict[str, FilterPipeline]:
+    return {size: build_pipeline(c) for size, c in config.items()}
@@ -0,0 +1,125 @@
+"""차트용 기간 조회 (응답 크기를 max_points로 제한하는 다운샘플링)
+
+기간이 짧으면 원본(bpm_data + 압축 블록)을 읽어 LTTB(Largest-Triangle-Three-Buckets)로
+모양을 유지하며 줄이고, 길면 분/시/일 롤업 중 max_points/2 이상의 구간이
+나오는 가장 거친 레벨을 읽어 출력 구간별 평균/최소/최대로 합친다.
+어느 경우든 읽는 행 수는 대략 max_points × 60 이하로 묶인다.
+"""
+import sqlite3
+from typing import Optional
+
+import numpy as np
+
+from bpm_blocks import read_range
+from bpm_rollup import table_name
+from bpm_schema import get_setting, lookup_dog_key
+
+# 레벨별 구간 길이 (초)
+LEVEL_SECONDS = (("minute", 60), ("hour", 3600), ("day", 86400))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """LTTB로 고른 인덱스 (첫/마지막 점 포함, 길이 min(n, len(x)))"""
+    m = len(x)
+    if n >= m:
+        return np.arange(m)
+    if n < 3:
+        return np.array([0, m - 1])[:max(n, 1)]
+    # 첫/마지막 점을 뺀 나머지를 n-2개 구간으로 나눔
+    edges = (np.arange(n - 1) * (m - 2) / (n - 2) + 1).astype(np.int64)
+    edges[-1] = m - 1
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, m - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo = hi
+        nhi = edges[i + 2] if i + 2 < n - 1 else m
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        # 이전 선택점 a, 다음 구간 평균점과 이루는 삼각형 넓이가 최대인 점
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def choose_source(span: float, max_points: int) -> str:
+    """구간 수가 max_points/2 이상 나오는 가장 거친 롤업, 없으면 원본"""
+    source = "raw"
+    for level, seconds in LEVEL_SECONDS:
+        if span / seconds >= max_points / 2:
+            source = level
+    return source
+
+
+def _raw(conn: sqlite3.Connection, dog_id: str, from_ts: float, to_ts: float, max_points: int) -> dict:
+    key = lookup_dog_key(conn, dog_id)
+    if key is None:
+        return {"method": "none", "columns": ["ts", "bpm"], "points": []}
+    ts_ms, bpm, _ = read_range(conn, key, int(from_ts * 1000), int(to_ts * 1000))
+    if not len(ts_ms):
+        return {"method": "none", "columns": ["ts", "bpm"], "points": []}
+    ts = ts_ms / 1000.0
+    bpm = bpm.astype(np.float64)
+    method = "none"
+    if len(ts) > max_points:
+        idx = lttb(ts, bpm, max_points)
+        ts, bpm = ts[idx], bpm[idx]
+        method = "lttb"
+    return {"method": method, "columns": ["ts", "bpm"],
+            "points": [[t, int(b)] for t, b in zip(ts.tolist(), bpm.tolist())]}
+
+
+def _rollup(conn: sqlite3.Connection, level: str, seconds: int, dog_id: str,
+            from_ts: float, to_ts: float, max_points: int) -> dict:
+    rows = conn.execute(f"""
+        SELECT bucket_ts, count, sum_bpm, min_bpm, max_bpm
+        FROM {table_name(level)}
+        WHERE dog_id = ? AND bucket_ts > ? AND bucket_ts < ?
+        ORDER BY bucket_ts
+    """, (dog_id, from_ts - seconds, to_ts)).fetchall()
+    columns = ["ts", "avg", "min", "max"]
+    if not rows:
+        return {"method": "none", "columns": columns, "points": []}
+    data = np.array(rows, dtype=np.float64)
+    bucket_ts, count, total, lo, hi = data.T
+    method = "none"
+    if len(data) > max_points:
+        # 출력 구간별로 묶어 합산 (최소/최대는 그대로 보존)
+        width = (to_ts - from_ts) / max_points
+        group = np.minimum(((bucket_ts - from_ts) // width).clip(0), max_points - 1).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        bucket_ts = bucket_ts[starts]
+        count = np.add.reduceat(count, starts)
+        total = np.add.reduceat(total, starts)
+        lo = np.minimum.reduceat(lo, starts)
+        hi = np.maximum.reduceat(hi, starts)
+        method = "minmax"
+    avg = np.round(total / np.maximum(count, 1), 1)
+    return {"method": method, "columns": columns,
+            "points": [[int(t), a, int(l), int(h)]
+                       for t, a, l, h in zip(bucket_ts.tolist(), avg.tolist(), lo.tolist(), hi.tolist())]}
+
+
+def query_history(conn: sqlite3.Connection, dog_id: str, from_ts: float, to_ts: float,
+                  max_points: int = 1000, source: Optional[str] = None) -> dict:
+    """[from_ts, to_ts) 구간을 최대 max_points개 점으로
+
+    source를 주지 않으면 기간에 따라 raw/minute/hour/day 중에서 고른다
+    (원본 보존 기간 이전이 포함되면 raw 대신 minute).
+    """
+    span = max(0.0, to_ts - from_ts)
+    if source is None:
+        source = choose_source(span, max_points)
+        # 보존 기간이 지나 원본이 지워진 구간은 분 롤업에서
+        raw_from = get_setting(conn, "raw_before_ms")
+        if source == "raw" and raw_from is not None and from_ts * 1000 < raw_from:
+            source = "minute"
+    if source == "raw":
+        result = _raw(conn, dog_id, from_ts, to_ts, max_points)
+    else:
+        seconds = dict(LEVEL_SECONDS)[source]
+        result = _rollup(conn, source, seconds, dog_id, from_ts, to_ts, max_points)
+    return {"dog_id": dog_id, "from": from_ts, "to": to_ts, "source": source,
+            "count": len(result["points"]), **result}
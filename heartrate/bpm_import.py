@@ -0,0 +1,270 @@
+"""CSV 기록 일괄 적재 / 재생
+
+post_heartbeat_raw가 쓰는 `timestamp,dog_id,bpm,status` 형식 CSV를 읽는다
+(bpm_csvlog가 gzip한 세그먼트 .csv.gz도 그대로, gzip 파일은 나누지 않고 한 구간으로).
+
+load: 파일들을 줄 경계에 맞춘 바이트 구간으로 나눠 프로세스 풀에서 파싱하고,
+      메인 프로세스가 구간마다 한 트랜잭션으로 bpm_data와 롤업에 넣는다.
+      CSV 시각은 초 단위라 1초에 여러 샘플이 있을 수 있으므로 (dog_id, 초, bpm, status)가
+      같은 행만 중복으로 보고 건너뛴다 (같은 파일을 다시 넣거나 겹치는 파일을 함께 넣어도 됨).
+      같은 초의 샘플들은 그 초 안에서 비어 있는 ms에 차례로 넣는다.
+replay: 파일을 실행 중인 서버의 /heartbeat_batch로 N배속 재생 (시각은 지금 기준으로 당김)
+
+    python bpm_import.py load hr_data.csv old/*.csv --db example_dogs.db --workers 8
+    python bpm_import.py replay hr_data.csv --url http://127.0.0.1:8000 --speed 60
+
+실행 중인 서버의 리포트 캐시는 지난 날짜를 고정해 두므로, 과거 기록을 적재한 뒤에는
+서버를 재시작해야 리포트에 반영된다.
+"""
+import argparse
+import csv
+import glob
+import gzip
+import io
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bpm_blocks import create_block_table, read_range
+from bpm_buffer import STATUS_CODES
+from bpm_rollup import aggregate_arrays, create_rollup_tables, upsert_buckets
+from bpm_schema import DogKeys, init_schema
+
+# dog_id → (ts epoch seconds, bpm, status 코드), 시간순
+Parsed = Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+
+# ===== 파싱 (워커 프로세스) =====
+def split_file(path: str, chunk_bytes: int) -> List[Tuple[str, int, Optional[int]]]:
+    """파일을 줄 경계에 맞춘 (path, start, end) 구간들로 나눔 (gzip은 (path, 0, None) 하나)"""
+    if path.endswith(".gz"):
+        return [(path, 0, None)]
+    size = os.path.getsize(path)
+    out = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = min(size, start + chunk_bytes)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            out.append((path, start, end))
+            start = end
+    return out
+
+
+def local_to_epoch(naive: np.ndarray) -> np.ndarray:
+    """로컬 시각으로 적힌 datetime64[s] → epoch seconds (시간 단위로 오프셋 계산)"""
+    secs = naive.astype(np.int64)
+    hours, inv = np.unique(secs // 3600, return_inverse=True)
+    offsets = np.array([h * 3600 - int(time.mktime(time.gmtime(h * 3600)[:8] + (-1,)))
+                        for h in hours.tolist()], dtype=np.int64)
+    return secs - offsets[inv]
+
+
+def parse_chunk(task: Tuple[str, int, Optional[int]]) -> Tuple[Parsed, int]:
+    """(path, start, end) 구간 파싱, (강아지별 배열, 건너뛴 줄 수), end가 None이면 끝까지 (.gz는 항상)"""
+    path, start, end = task
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            data = f.read()
+    else:
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(-1 if end is None else end - start)
+    stamps, dogs, bpms, statuses = [], [], [], []
+    skipped = 0
+    # csv.writer가 따옴표로 감싼 필드(쉼표가 든 dog_id 등)도 그대로 읽음
+    for parts in csv.reader(io.StringIO(data.decode("utf-8", errors="replace"), newline="")):
+        if len(parts) != 4:
+            skipped += 1 if any(p.strip() for p in parts) else 0
+            continue
+        if parts[0] == "timestamp":  # 헤더
+            continue
+        try:
+            bpm = int(float(parts[2]))
+        except ValueError:
+            skipped += 1
+            continue
+        stamps.append(parts[0].strip())
+        dogs.append(parts[1].strip())
+        bpms.append(bpm)
+        statuses.append(STATUS_CODES.get(parts[3].strip(), 0))
+    if not stamps:
+        return {}, skipped
+    try:
+        naive = np.array(stamps).astype("U19").astype("datetime64[s]")
+    except ValueError:
+        # 잘못된 시각이 섞여 있으면 한 줄씩
+        ok, parsed = [], []
+        for i, s in enumerate(stamps):
+            try:
+                parsed.append(np.datetime64(s, "s"))
+                ok.append(i)
+            except ValueError:
+                skipped += 1
+        naive = np.array(parsed, dtype="datetime64[s]")
+        dogs = [dogs[i] for i in ok]
+        bpms = [bpms[i] for i in ok]
+        statuses = [statuses[i] for i in ok]
+    ts = local_to_epoch(naive)
+    dog_arr = np.array(dogs)
+    bpm_arr = np.array(bpms, dtype=np.int16)
+    status_arr = np.array(statuses, dtype=np.uint8)
+    out = {}
+    for dog_id in np.unique(dog_arr).tolist():
+        sel = dog_arr == dog_id
+        order = np.argsort(ts[sel], kind="stable")
+        out[dog_id] = (ts[sel][order], bpm_arr[sel][order], status_arr[sel][order])
+    return out, skipped
+
+
+# ===== 적재 (메인 프로세스) =====
+def _sample_keys(sec: np.ndarray, bpm: np.ndarray, status: np.ndarray) -> np.ndarray:
+    """(초, bpm, status)를 정수 하나로 (중복 판단용, 초 순서 유지)"""
+    return (sec.astype(np.int64) << 24) | (bpm.astype(np.uint16).astype(np.int64) << 8) | status
+
+
+def _assign_ms(sec: np.ndarray, taken: np.ndarray) -> np.ndarray:
+    """정렬된 초 배열의 각 샘플에 그 초 안의 ms 자리 배정 (taken의 ms는 피함)"""
+    idx = np.arange(len(sec))
+    first = np.maximum.accumulate(np.where(np.r_[True, sec[1:] != sec[:-1]], idx, 0))
+    ms = sec * 1000 + (idx - first)
+    clash = np.isin(ms, taken)
+    if clash.any():
+        # 이미 있는 ms와 겹치는 초만 한 줄씩 다시 배정
+        used = set(taken.tolist())
+        for s in np.unique(sec[clash]).tolist():
+            rows = np.flatnonzero(sec == s)
+            free = (m for m in range(s * 1000, s * 1000 + 1000) if m not in used)
+            ms[rows] = [next(free) for _ in rows]
+    return ms
+
+
+def load_parsed(conn: sqlite3.Connection, keys: DogKeys, parsed: Parsed) -> Tuple[int, int]:
+    """파싱 결과를 한 트랜잭션으로 적재, (넣은 행, 중복으로 건너뛴 행)"""
+    inserted = duplicates = 0
+    with conn:
+        for dog_id, (ts, bpm, status) in parsed.items():
+            total = len(ts)
+            # 같은 구간 안의 중복 (같은 초, bpm, status) 제거
+            _, first = np.unique(_sample_keys(ts, bpm, status), return_index=True)
+            ts, bpm, status = ts[first], bpm[first], status[first]
+            key = keys.key(conn, dog_id)
+            existing_ms, existing_bpm, existing_status = read_range(
+                conn, key, int(ts[0]) * 1000, (int(ts[-1]) + 1) * 1000)
+            new = ~np.isin(_sample_keys(ts, bpm, status),
+                           _sample_keys(existing_ms // 1000, existing_bpm, existing_status))
+            ts, bpm, status = ts[new], bpm[new], status[new]
+            duplicates += total - len(ts)
+            if not len(ts):
+                continue
+            ms = _assign_ms(ts, existing_ms)
+            conn.executemany(
+                "INSERT OR IGNORE INTO bpm_data (dog_key, ts, bpm, status) VALUES (?, ?, ?, ?)",
+                zip([key] * len(ts), ms.tolist(), bpm.tolist(), status.tolist())
+            )
+            for level, rows in aggregate_arrays(dog_id, ms / 1000, bpm, status).items():
+                upsert_buckets(conn, level, rows)
+            inserted += len(ts)
+    return inserted, duplicates
+
+
+def load(db_file: str, paths: List[str], workers: int = None, chunk_mb: int = 16) -> dict:
+    conn = sqlite3.connect(db_file)
+    init_schema(conn)
+    create_rollup_tables(conn)
+    create_block_table(conn)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-200000")  # 약 200MB
+    keys = DogKeys()
+
+    tasks = [t for p in paths for t in split_file(p, chunk_mb * 1024 * 1024)]
+    totals = {"files": len(paths), "chunks": len(tasks), "inserted": 0, "duplicates": 0, "skipped": 0}
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 파싱은 병렬, 쓰기는 메인 프로세스 연결 하나로 순서대로
+        for i, (parsed, skipped) in enumerate(pool.map(parse_chunk, tasks)):
+            inserted, duplicates = load_parsed(conn, keys, parsed)
+            totals["inserted"] += inserted
+            totals["duplicates"] += duplicates
+            totals["skipped"] += skipped
+            print(f"  chunk {i + 1}/{len(tasks)}: +{inserted} rows ({duplicates} duplicate)", flush=True)
+    conn.close()
+    totals["seconds"] = round(time.time() - t0, 2)
+    return totals
+
+
+# ===== 재생 =====
+def replay(path: str, url: str, speed: float = 1.0, interval: float = 0.2, limit: int = None) -> int:
+    """CSV를 /heartbeat_batch로 speed배속 재생 (디바이스 replay-<dog_id>로 등록)"""
+    import httpx
+
+    parsed, _ = parse_chunk((path, 0, None))
+    events = [(float(t), dog_id, int(b), int(s))
+              for dog_id, (ts, bpm, status) in parsed.items()
+              for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())]
+    events.sort()
+    if limit:
+        events = events[:limit]
+    if not events:
+        return 0
+    sent = 0
+    with httpx.Client(base_url=url, timeout=10) as client:
+        devices = {}
+        for dog_id in parsed:
+            devices[dog_id] = f"replay-{dog_id}"
+            client.post("/register_device", json={"device_id": devices[dog_id], "dog_id": dog_id})
+        first = events[0][0]
+        start = time.time()
+        i = 0
+        while i < len(events):
+            # 지금까지 재생 시각에 도달한 샘플을 강아지별로 묶어 전송
+            now = time.time()
+            due = first + (now - start) * speed
+            batch: Dict[str, list] = {}
+            while i < len(events) and events[i][0] <= due:
+                t, dog_id, b, _ = events[i]
+                batch.setdefault(dog_id, []).append({"ts": start + (t - first) / speed, "bpm": b})
+                i += 1
+            for dog_id, samples in batch.items():
+                client.post("/heartbeat_batch", json={"device_id": devices[dog_id], "samples": samples})
+                sent += len(samples)
+            if i < len(events):
+                time.sleep(max(0.0, min(interval, (events[i][0] - due) / speed)))
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV 기록 적재 / 재생")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("load", help="CSV를 bpm_data와 롤업에 적재 (중복 제외)")
+    p.add_argument("files", nargs="+", help="CSV 파일 (glob 가능)")
+    p.add_argument("--db", default="example_dogs.db")
+    p.add_argument("--workers", type=int, default=None, help="파싱 프로세스 수 (기본 CPU 수)")
+    p.add_argument("--chunk-mb", type=int, default=16)
+    p = sub.add_parser("replay", help="CSV를 실행 중인 서버로 N배속 재생")
+    p.add_argument("file")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--speed", type=float, default=1.0, help="배속 (60 = 1분을 1초에)")
+    p.add_argument("--limit", type=int, default=None, help="앞에서부터 최대 샘플 수")
+    args = parser.parse_args()
+
+    if args.command == "load":
+        paths = sorted({p for pattern in args.files for p in (glob.glob(pattern) or [pattern])})
+        totals = load(args.db, paths, args.workers, args.chunk_mb)
+        print(f"✅ imported {totals['inserted']} rows from {totals['files']} files "
+              f"({totals['duplicates']} duplicate, {totals['skipped']} skipped) in {totals['seconds']}s")
+    elif args.command == "replay":
+        n = replay(args.file, args.url, args.speed, limit=args.limit)
+        print(f"✅ replayed {n} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""강아지 전체 최신값 색인 (/latest_all)
+
+샘플이 들어올 때마다 전역 버전을 1 올리고 강아지별로 (버전, 마지막 샘플)을 남긴다.
+갱신 순서대로 유지해 since=<버전> 조회는 그 뒤에 바뀐 강아지만 끝에서부터 훑는다.
+
+버전은 프로세스 안에서만 이어지므로 epoch(프로세스마다 임의 값)을 함께 준다.
+다른 epoch의 since(재시작, 다른 워커)나 아직 없는 버전이면 전체 스냅샷으로 답한다.
+"""
+import os
+from collections import OrderedDict
+from typing import Optional
+
+COLUMNS = ["dog_id", "ts", "bpm", "status", "version"]
+
+
+class LatestIndex:
+    def __init__(self):
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        self._dogs: "OrderedDict[str, tuple]" = OrderedDict()  # dog_id → (버전, ts, bpm, status), 갱신 순
+
+    def update(self, dog_id: str, ts: float, bpm: int, status: str):
+        self.version += 1
+        self._dogs[dog_id] = (self.version, ts, bpm, status)
+        self._dogs.move_to_end(dog_id)
+
+    def etag(self, since: Optional[int] = None, count: Optional[int] = None) -> str:
+        """같은 버전·같은 since면 같은 응답 (max_age로 걸러낸 경우 시간이 지나며 빠지는 강아지가 있어 count도 넣음)"""
+        tag = f"{self.epoch}-{self.version}"
+        if since is not None:
+            tag += f"-s{since}"
+        if count is not None:
+            tag += f"-n{count}"
+        return f'"{tag}"'
+
+    def is_delta(self, since: Optional[int], epoch: Optional[str]) -> bool:
+        return since is not None and (epoch is None or epoch == self.epoch) and since <= self.version
+
+    def snapshot(self, since: Optional[int] = None, epoch: Optional[str] = None,
+                 max_age: Optional[float] = None, now: Optional[float] = None) -> dict:
+        """전체 또는 since 이후 바뀐 강아지만 (max_age 초보다 오래된 샘플은 제외)"""
+        delta = self.is_delta(since, epoch)
+        rows = []
+        for dog_id, (version, ts, bpm, status) in reversed(self._dogs.items()):
+            if delta and version <= since:
+                break
+            if max_age is not None and ts < now - max_age:
+                continue
+            rows.append([dog_id, ts, bpm, status, version])
+        rows.reverse()
+        return {"epoch": self.epoch, "version": self.version, "full": not delta,
+                "count": len(rows), "columns": COLUMNS, "dogs": rows}
+
+    def __len__(self) -> int:
+        return len(self._dogs)
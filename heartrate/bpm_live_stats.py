@@ -0,0 +1,206 @@
+"""강아지별 실시간 통계 (수집 시 샘플당 O(1) 갱신, 조회 시 DB 접근 없음)
+
+창(1분 / 1시간 / 24시간)마다 시간을 고정 폭 구간으로 나눠 구간별 개수, 평균,
+M2(Welford), 최소/최대, 상태별 개수를 두고, 창 전체 합계를 따로 유지한다.
+구간이 창 밖으로 밀려나면 합계에서 그 구간을 빼고(Welford 역병합),
+최소/최대는 구간 단위 단조 덱으로 구한다. 창 경계는 구간 폭만큼의 오차가 있다.
+
+시간은 샘플 시각 기준이며, 현재 구간보다 늦게 도착한 샘플은 창 안이면
+현재 구간에 합산하고 창 밖이면 버린다.
+"""
+import math
+from collections import deque
+from typing import Dict, List, Optional
+
+from bpm_buffer import STATUS_CODES
+
+# (이름, 창 길이 초, 구간 폭 초)
+WINDOWS = (("1m", 60, 1), ("1h", 3600, 10), ("24h", 86400, 60))
+# 지수 가중 평균 시간 상수 (이름, 초)
+EWMA_TAUS = (("10s", 10.0), ("1m", 60.0), ("10m", 600.0))
+
+_HIGH = STATUS_CODES["high"]
+_LOW = STATUS_CODES["low"]
+_NORMAL = STATUS_CODES["normal"]
+
+
+class RollingWindow:
+    """시간 창 하나의 합계 (개수/평균/분산/최소/최대/상태별 개수)"""
+
+    __slots__ = ("window", "res", "buckets", "n", "mean", "m2", "status",
+                 "_min", "_max")
+
+    def __init__(self, window: float, res: float):
+        self.window = window
+        self.res = res
+        # 구간: [시작, 개수, 평균, M2, high, low, normal]
+        self.buckets: deque = deque()
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.status = [0, 0, 0]  # high, low, normal
+        # 단조 덱: (구간 시작, 값), 구간당 최대 한 항목
+        self._min: deque = deque()
+        self._max: deque = deque()
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        buckets = self.buckets
+        while buckets and buckets[0][0] + self.res <= cutoff:
+            start, n, mean, m2, high, low, normal = buckets.popleft()
+            rest = self.n - n
+            if rest <= 0:
+                self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            else:
+                # Welford 병합의 역연산
+                new_mean = (self.n * self.mean - n * mean) / rest
+                delta = mean - new_mean
+                self.m2 = max(0.0, self.m2 - m2 - delta * delta * n * rest / self.n)
+                self.n, self.mean = rest, new_mean
+            self.status[0] -= high
+            self.status[1] -= low
+            self.status[2] -= normal
+            while self._min and self._min[0][0] <= start:
+                self._min.popleft()
+            while self._max and self._max[0][0] <= start:
+                self._max.popleft()
+
+    def add(self, ts: float, bpm: float, code: int):
+        self._expire(ts)
+        start = ts - ts % self.res
+        buckets = self.buckets
+        if buckets and start <= buckets[-1][0]:
+            if start + self.res <= buckets[-1][0] - self.window:
+                return  # 창 밖의 늦은 샘플
+            b = buckets[-1]
+            start = b[0]
+        else:
+            b = [start, 0, 0.0, 0.0, 0, 0, 0]
+            buckets.append(b)
+
+        # 구간과 창 합계 모두 Welford 갱신
+        b[1] += 1
+        d = bpm - b[2]
+        b[2] += d / b[1]
+        b[3] += d * (bpm - b[2])
+        self.n += 1
+        d = bpm - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (bpm - self.mean)
+        if code == _HIGH:
+            b[4] += 1
+            self.status[0] += 1
+        elif code == _LOW:
+            b[5] += 1
+            self.status[1] += 1
+        elif code == _NORMAL:
+            b[6] += 1
+            self.status[2] += 1
+
+        mn = self._min
+        while mn and mn[-1][1] >= bpm:
+            mn.pop()
+        if not (mn and mn[-1][0] == start):
+            mn.append((start, bpm))
+        mx = self._max
+        while mx and mx[-1][1] <= bpm:
+            mx.pop()
+        if not (mx and mx[-1][0] == start):
+            mx.append((start, bpm))
+
+    def summary(self, now: Optional[float] = None) -> dict:
+        if now is not None:
+            self._expire(now)
+        n = self.n
+        high, low, normal = self.status
+        return {
+            "count": n,
+            "mean": round(self.mean, 2) if n else None,
+            "std": round(math.sqrt(self.m2 / (n - 1)), 2) if n > 1 else None,
+            "min": self._min[0][1] if self._min else None,
+            "max": self._max[0][1] if self._max else None,
+            "high": high,
+            "low": low,
+            "normal": normal,
+            "high_share": round(high / n, 4) if n else None,
+            "low_share": round(low / n, 4) if n else None,
+            "normal_share": round(normal / n, 4) if n else None,
+        }
+
+
+class DogLiveStats:
+    __slots__ = ("windows", "ewma", "last_ts", "last_bpm", "n", "mean", "m2")
+
+    def __init__(self):
+        self.windows = {name: RollingWindow(w, r) for name, w, r in WINDOWS}
+        self.ewma: Dict[str, Optional[float]] = {name: None for name, _ in EWMA_TAUS}
+        self.last_ts: Optional[float] = None
+        self.last_bpm: Optional[int] = None
+        # 전체 기간 Welford
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, ts: float, bpm: int, code: int):
+        for w in self.windows.values():
+            w.add(ts, bpm, code)
+        # 샘플 간격을 반영한 지수 가중 평균 (간격이 불규칙해도 시간 상수 유지)
+        dt = 0.0 if self.last_ts is None else max(0.0, ts - self.last_ts)
+        for name, tau in EWMA_TAUS:
+            prev = self.ewma[name]
+            if prev is None:
+                self.ewma[name] = float(bpm)
+            else:
+                alpha = 1.0 - math.exp(-dt / tau) if dt > 0 else 0.0
+                self.ewma[name] = prev + alpha * (bpm - prev)
+        self.n += 1
+        d = bpm - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (bpm - self.mean)
+        if self.last_ts is None or ts >= self.last_ts:
+            self.last_ts = ts
+            self.last_bpm = bpm
+
+    def summary(self, now: Optional[float] = None) -> dict:
+        return {
+            "last_ts": self.last_ts,
+            "last_bpm": self.last_bpm,
+            "ewma": {k: (round(v, 2) if v is not None else None) for k, v in self.ewma.items()},
+            "windows": {name: w.summary(now) for name, w in self.windows.items()},
+            "lifetime": {
+                "count": self.n,
+                "mean": round(self.mean, 2) if self.n else None,
+                "std": round(math.sqrt(self.m2 / (self.n - 1)), 2) if self.n > 1 else None,
+            },
+        }
+
+
+class LiveStats:
+    """dog_id → DogLiveStats
+
+    수집 핸들러와 조회 핸들러가 모두 이벤트 루프에서 돌기 때문에 락은 두지 않는다.
+    """
+
+    def __init__(self):
+        self._dogs: Dict[str, DogLiveStats] = {}
+
+    def add(self, dog_id: str, ts: float, bpm: int, status: str):
+        st = self._dogs.get(dog_id)
+        if st is None:
+            st = self._dogs[dog_id] = DogLiveStats()
+        st.add(ts, bpm, STATUS_CODES.get(status, 0))
+
+    def extend(self, dog_id: str, ts: List[float], bpm: List[int], codes: List[int]):
+        """시간순 샘플 묶음 (status는 STATUS_CODES 코드)"""
+        st = self._dogs.get(dog_id)
+        if st is None:
+            st = self._dogs[dog_id] = DogLiveStats()
+        for t, b, c in zip(ts, bpm, codes):
+            st.add(t, b, c)
+
+    def summary(self, dog_id: str, now: Optional[float] = None) -> Optional[dict]:
+        st = self._dogs.get(dog_id)
+        return st.summary(now) if st is not None else None
+
+    def dog_ids(self) -> List[str]:
+        return list(self._dogs)
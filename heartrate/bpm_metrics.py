@@ -0,0 +1,178 @@
+"""수집/리포트 경로 계측과 Prometheus 텍스트 출력
+
+prometheus_client 없이 필요한 만큼만 구현한다. 관측 한 번은 버킷 경계
+이진 탐색 + 정수 증가뿐이라 핸들러에서 매번 호출해도 부담이 적다.
+버퍼 크기, 큐 길이처럼 이미 다른 객체가 들고 있는 값은 스크레이프할 때
+collector 함수로 읽어 온다.
+
+    INGEST = registry.histogram("bpm_ingest_stage_seconds", "...", ["stage"])
+    with INGEST.time("filter"):
+        ...
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 수집 단계는 수 µs ~ 수 ms, 리포트 쿼리는 수 ms ~ 수 초
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# collector가 돌려주는 한 줄: (이름, 라벨, 값)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+        return False
+
+
+class Histogram:
+    """고정 버킷 히스토그램 (라벨 값 조합별)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 라벨 값 → [버킷별 개수(+Inf 포함), 합계, 개수]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def time(self, *labels) -> _Timer:
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for labels, counts, total, count in series:
+            cum = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                lines.append(f"{self.name}_bucket"
+                             f"{_labels(self.labelnames + ('le',), labels + (_number(bound),))} {cum}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    """단조 증가 카운터 (라벨 값 조합별)"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}")
+        return lines
+
+
+class Collected:
+    """스크레이프 시점에 fn()이 돌려주는 (이름, 라벨, 값) 목록을 그대로 출력
+
+    types: 메트릭 이름 → (종류, 설명)
+    """
+
+    def __init__(self, fn: Callable[[], Iterable[Sample]], types: Dict[str, Tuple[str, str]]):
+        self.fn = fn
+        self.types = types
+
+    def render(self) -> List[str]:
+        by_name: Dict[str, List[str]] = {name: [] for name in self.types}
+        for name, labels, value in self.fn():
+            line = f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}"
+            by_name.setdefault(name, []).append(line)
+        lines = []
+        for name, samples in by_name.items():
+            kind, help = self.types.get(name, ("gauge", ""))
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        h = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(h)
+        return h
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        c = Counter(name, help, labelnames)
+        self._metrics.append(c)
+        return c
+
+    def collector(self, fn: Callable[[], Iterable[Sample]],
+                  types: Optional[Dict[str, Tuple[str, str]]] = None):
+        self._metrics.append(Collected(fn, types or {}))
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
+log = logging.getLogger("bpm.readpool")
+
+
+class ReadPool:
+    """읽기 전용 SQLite 연결 풀 (리포트/기간 조회용)
+
+    size개 스레드가 각자 read-only 연결을 하나씩 열어 계속 쓰므로,
+    같은 SQL은 연결의 statement 캐시에서 준비된 문장을 재사용한다.
+    조회는 전용 스레드풀에서 돌아 이벤트 루프나 FastAPI 기본 스레드풀을
+    막지 않고, 쓰기(StorageWriter)와도 연결을 나누지 않는다.
+    observe는 (대기 초, 실행 초)를 받는다 (예: 지연 히스토그램).
+    스레드풀은 start()마다 새로 만들므로 close() 뒤에 다시 start 가능.
+    """
+
+    def __init__(self, db_file: str, size: int = 4, cached_statements: int = 256,
+                 observe: Optional[Callable[[float, float], None]] = None):
+        self.db_file = db_file
+        self.size = size
+        self.cached_statements = cached_statements
+        self.observe = observe
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        # 통계
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_wait_ms = 0.0
+        self.total_wait_ms = 0.0
+        self.total_query_ms = 0.0
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="bpm-read")
+
+    def _open(self) -> sqlite3.Connection:
+        uri = Path(self.db_file).absolute().as_uri() + "?mode=ro"
+        # 풀 종료 시 다른 스레드에서 닫으므로 check_same_thread=False
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute("PRAGMA query_only = 1")
+        with self._lock:
+            self._conns.append(conn)
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def _call(self, enqueued: float, fn: Callable, args: tuple):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(self._conn(), *args)
+        except sqlite3.Error:
+            self.failed += 1
+            raise
+        finally:
+            done = time.perf_counter()
+            wait, query = started - enqueued, done - started
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.max_wait_ms = max(self.max_wait_ms, wait * 1000)
+                self.total_wait_ms += wait * 1000
+                self.total_query_ms += query * 1000
+            if self.observe is not None:
+                self.observe(wait, query)
+
+    async def run(self, fn: Callable, *args):
+        """풀의 연결로 fn(conn, *args)를 실행하고 결과를 기다림"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, time.perf_counter(), fn, args)
+
+    def close(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+
+    # ===== 통계 =====
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "connections": len(self._conns),
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "avg_wait_ms": round(self.total_wait_ms / self.completed, 3) if self.completed else 0.0,
+            "avg_query_ms": round(self.total_query_ms / self.completed, 3) if self.completed else 0.0,
+        }
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from bpm_buffer import STATUS_NAMES, DogRingBuffer
+
+DEFAULT_SIZE = "medium"
+
+
+class DogState:
+    """강아지 한 마리의 수집 상태 (크기, 기준 범위, 최근 샘플 버퍼)"""
+
+    __slots__ = ("dog_id", "size", "limits", "buffer")
+
+    def __init__(self, dog_id: str, size: str, limits: dict, capacity: int):
+        self.dog_id = dog_id
+        self.size = size
+        self.limits = limits
+        self.buffer = DogRingBuffer(capacity)
+
+
+class SharedDogState(DogState):
+    """크기와 버퍼를 SharedState(bpm_shm)의 slot에서 읽고 쓰는 DogState"""
+
+    __slots__ = ("_shared", "_slot", "_hr_limits")
+
+    def __init__(self, dog_id: str, shared, slot: int, hr_limits: dict):
+        from bpm_shm import SharedRingBuffer
+        self.dog_id = dog_id
+        self._shared = shared
+        self._slot = slot
+        self._hr_limits = hr_limits
+        self.buffer = SharedRingBuffer(shared, slot)
+
+    @property
+    def size(self) -> str:
+        return self._shared.size(self._slot)
+
+    @size.setter
+    def size(self, value: str):
+        self._shared.set_size(self._slot, value)
+
+    @property
+    def limits(self) -> dict:
+        return self._hr_limits[self.size]
+
+    @limits.setter
+    def limits(self, value: dict):
+        pass  # size에서 계산
+
+
+class DogStateTable:
+    """dog_id별 상태를 샤드로 나눠 보관
+
+    샤드마다 별도 락을 두어 서로 다른 강아지의 수집이 같은 전역 dict/락을
+    두고 경쟁하지 않도록 한다. 조회(get)는 락 없이 dict 읽기만 한다.
+    shared(bpm_shm.SharedState)를 주면 크기와 버퍼는 워커 간 공유 메모리에 두고,
+    여기에는 dog_id → 상태 객체만 캐시한다.
+    """
+
+    def __init__(self, hr_limits: dict, shards: int = 16, default_capacity: int = 10_000,
+                 shared=None):
+        self.hr_limits = hr_limits
+        self.default_capacity = default_capacity
+        self.shared = shared
+        self._shards: List[Dict[str, DogState]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._capacity: Dict[str, int] = {}
+
+    def _index(self, dog_id: str) -> int:
+        return hash(dog_id) % len(self._shards)
+
+    def get(self, dog_id: Optional[str]) -> Optional[DogState]:
+        if not dog_id:
+            return None
+        st = self._shards[self._index(dog_id)].get(dog_id)
+        if st is None and self.shared is not None and self.shared.find(dog_id) is not None:
+            # 다른 워커가 만든 강아지
+            st = self.state(dog_id)
+        return st
+
+    def state(self, dog_id: str) -> DogState:
+        """상태 조회, 없으면 기본 크기로 생성"""
+        i = self._index(dog_id)
+        st = self._shards[i].get(dog_id)
+        if st is not None:
+            return st
+        with self._locks[i]:
+            st = self._shards[i].get(dog_id)
+            if st is None:
+                if self.shared is not None:
+                    st = SharedDogState(dog_id, self.shared, self.shared.slot(dog_id), self.hr_limits)
+                else:
+                    st = DogState(dog_id, DEFAULT_SIZE, self.hr_limits[DEFAULT_SIZE],
+                                  self._capacity.get(dog_id, self.default_capacity))
+                self._shards[i][dog_id] = st
+        return st
+
+    def set_size(self, dog_id: str, size: str) -> DogState:
+        if size not in self.hr_limits:
+            raise ValueError(f"unknown dog size: {size!r}")
+        st = self.state(dog_id)
+        st.size = size
+        st.limits = self.hr_limits[size]
+        return st
+
+    def set_capacity(self, dog_id: str, capacity: int):
+        """dog_id별 버퍼 용량 지정 (기존 데이터는 최근 것부터 유지)"""
+        if self.shared is not None:
+            raise RuntimeError("shared state buffers have a fixed capacity")
+        self._capacity[dog_id] = capacity
+        st = self.get(dog_id)
+        if st is not None and st.buffer.capacity != capacity:
+            new = DogRingBuffer(capacity)
+            ts, bpm, status = st.buffer.tail(capacity)
+            new.extend(ts, bpm, [STATUS_NAMES[s] for s in status.tolist()])
+            st.buffer = new
+
+    def states(self) -> List[DogState]:
+        if self.shared is not None:
+            return [self.state(self.shared.dog_id(slot)) for slot in self.shared.used_slots()]
+        return [st for shard in self._shards for st in list(shard.values())]
+
+    def dog_ids(self) -> List[str]:
+        if self.shared is not None:
+            return [self.shared.dog_id(slot) for slot in self.shared.used_slots()]
+        return [dog_id for shard in self._shards for dog_id in list(shard)]
+
+    def sizes(self) -> Dict[str, str]:
+        if self.shared is not None:
+            return {st.dog_id: st.size for st in self.states()}
+        return {st.dog_id: st.size for shard in self._shards for st in list(shard.values())}
+
+    def buffer_sizes(self) -> Dict[str, int]:
+        if self.shared is not None:
+            return {st.dog_id: len(st.buffer) for st in self.states()}
+        return {st.dog_id: len(st.buffer) for shard in self._shards for st in list(shard.values())}
+
+
+class DeviceRegistry:
+    """device_id → dog_id 매핑 (dogs DB의 devices 테이블에 저장)
+
+    shared(bpm_shm.SharedState)를 주면 매핑을 워커 간 공유 메모리에서 조회한다.
+    """
+
+    def __init__(self, db_file: str, shared=None):
+        self.db_file = db_file
+        self.shared = shared
+        self._map: Dict[str, str] = {}
+
+    def load(self):
+        conn = sqlite3.connect(self.db_file)
+        for device_id, dog_id in conn.execute("SELECT device_id, dog_id FROM devices"):
+            self._map[device_id] = dog_id
+            if self.shared is not None:
+                self.shared.set_device(device_id, dog_id)
+        conn.close()
+
+    def resolve(self, device_id: Optional[str]) -> Optional[str]:
+        if not device_id:
+            return None
+        if self.shared is not None:
+            return self.shared.resolve_device(device_id)
+        return self._map.get(device_id)
+
+    def register(self, device_id: str, dog_id: str):
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO devices (device_id, dog_id) VALUES (?, ?)",
+                         (device_id, dog_id))
+        conn.close()
+        self._map[device_id] = dog_id
+        if self.shared is not None:
+            self.shared.set_device(device_id, dog_id)
+
+    def unregister(self, device_id: str) -> bool:
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            conn.execute("DELETE FROM devices WHERE device_id = ?", (device_id,))
+        conn.close()
+        removed = self._map.pop(device_id, None) is not None
+        if self.shared is not None:
+            removed = self.shared.remove_device(device_id)
+        return removed
+
+    def devices(self) -> Dict[str, str]:
+        if self.shared is not None:
+            return self.shared.devices()
+        return dict(self._map)
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bpm_rollup import query_daily
+
+ALL_DOGS = "*"  # dog_id 미지정(전체 합산) 리포트 키
+
+
+def day_start(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class ReportCache:
+    """(dog_id, 날짜)별 일 요약 캐시
+
+    지난 날짜(closed day)는 바뀌지 않으므로 LRU로 계속 보관하고,
+    오늘 구간만 매번 일 롤업에서 다시 읽는다. 늦게 들어온 과거 샘플이
+    커밋되면 invalidate_rows()로 해당 날짜만 버린다. 조회 도중 무효화가 끼면
+    (generation이 바뀜) 읽은 값은 돌려주기만 하고 캐시에 넣지 않는다.
+
+    shared=True(워커 여러 개)면 다른 워커의 커밋은 이 프로세스에 통지되지 않으므로
+    지난 날짜도 캐시하지 않고 last_modified는 항상 현재 시각을 준다 (ETag로만 304).
+    """
+
+    def __init__(self, max_entries: int = 50_000, shared: bool = False):
+        self.max_entries = max_entries
+        self.shared = shared
+        self._generation = 0  # 지난 날짜를 무효화할 때마다 증가
+        self._entries: "OrderedDict[Tuple[str, str], Optional[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_modified: Dict[str, float] = {}
+        self._started = time.time()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ===== 조회 =====
+    def daily(self, conn, days: int, dog_id: Optional[str] = None) -> List[dict]:
+        """오늘을 포함한 최근 days일의 날짜별 요약 (데이터 없는 날은 제외, 최대 days개)"""
+        key_dog = dog_id or ALL_DOGS
+        today = day_start(datetime.now())
+        dates = [(today - timedelta(days=i)) for i in range(days - 1, 0, -1)]
+
+        found: Dict[str, Optional[dict]] = {}
+        missing = []
+        with self._lock:
+            generation = self._generation
+            for d in dates:
+                key = (key_dog, d.strftime("%Y-%m-%d"))
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key[1]] = self._entries[key]
+                    self.hits += 1
+                else:
+                    missing.append(d)
+                    self.misses += 1
+
+        if missing:
+            # 빠진 지난 날짜들을 한 번에 읽어서 채움 (데이터 없는 날도 None으로 기록)
+            rows = query_daily(conn, int(missing[0].timestamp()), dog_id, until_ts=int(today.timestamp()))
+            by_date = {row["date"]: row for row in rows}
+            with self._lock:
+                cache = not self.shared and self._generation == generation
+                for d in missing:
+                    date = d.strftime("%Y-%m-%d")
+                    row = by_date.get(date)
+                    found[date] = row
+                    if cache:
+                        self._put((key_dog, date), row)
+
+        # 오늘은 항상 새로 계산
+        today_rows = query_daily(conn, int(today.timestamp()), dog_id)
+
+        report = [found[d.strftime("%Y-%m-%d")] for d in dates]
+        return [row for row in report if row is not None] + today_rows
+
+    def _put(self, key, row):
+        self._entries[key] = row
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # ===== 변경 반영 =====
+    def invalidate_rows(self, rows):
+        """StorageWriter 커밋 후 콜백: 저장 행 (dog_id, ts, bpm, status)"""
+        now = time.time()
+        today_ts = day_start(datetime.now()).timestamp()
+        stale = set()
+        with self._lock:
+            for dog_id, ts, _, _ in rows:
+                self._last_modified[dog_id] = now
+                if ts < today_ts:
+                    stale.add((dog_id, datetime.fromtimestamp(ts).strftime("%Y-%m-%d")))
+            if rows:
+                self._last_modified[ALL_DOGS] = now
+            if stale:
+                self._generation += 1
+            for dog_id, date in stale:
+                for key in ((dog_id, date), (ALL_DOGS, date)):
+                    if self._entries.pop(key, False) is not False:
+                        self.invalidations += 1
+
+    def last_modified(self, dog_id: Optional[str] = None) -> float:
+        if self.shared:
+            return time.time()
+        return self._last_modified.get(dog_id or ALL_DOGS, self._started)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ===== 통계 =====
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
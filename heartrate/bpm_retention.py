@@ -0,0 +1,332 @@
+"""보존 기간 정책과 정리(compaction) 작업
+
+기본 정책: 원본(bpm_data + 압축 블록) 14일, 분 롤업 1년, 시/일 롤업 무기한,
+CSV 기록은 bpm_csvlog 세그먼트(기본 매시)를 gzip하고 90일 보관.
+
+원본은 롤업이 수집 시점에 이미 만들어 두므로 따로 다운샘플링하지 않고 지운다.
+다만 강아지별로 롤업에 있는 마지막 구간 끝까지만 지워서, 롤업이 없거나
+(v1 마이그레이션 뒤 rebuild 전 등) 늦게 따라오는 구간의 원본은 남긴다.
+삭제 기준은 로컬 날짜 경계에 맞춰, 분/시/일 롤업 구간이 기준에 걸쳐 잘리지 않게 한다.
+마지막 기준은 settings.raw_before_ms에 남고, bpm_rollup.rebuild는 그 이후만
+다시 만들며 bpm_history는 그 이전 기간을 분 롤업에서 읽는다.
+
+삭제는 강아지별로 batch 행씩 짧은 트랜잭션으로 나눠 수집 커밋이 오래 기다리지 않게 하고,
+auto_vacuum=INCREMENTAL DB면 끝에 incremental_vacuum으로 빈 페이지를 돌려준다
+(기존 DB는 enable-incremental로 한 번 전체 VACUUM 필요).
+
+    python bpm_retention.py dry-run --db example_dogs.db --csv hr_data.csv
+    python bpm_retention.py run --db example_dogs.db --csv hr_data.csv --raw-days 14
+    python bpm_retention.py enable-incremental --db example_dogs.db
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bpm_blocks import BLOCK_MS, create_block_table
+from bpm_rollup import ROLLUP_LEVELS, bucket_starts, table_name
+from bpm_schema import get_setting, set_setting
+
+VACUUM_PAGES = 2000  # incremental_vacuum 한 번에 돌려줄 페이지 수
+BLOCK_BATCH = 24     # 트랜잭션당 압축 블록 수
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# (이름, conn을 받아 이번에 처리한 개수를 돌려주는 함수) - 0이 나올 때까지 반복 호출
+Step = Tuple[str, Callable[[sqlite3.Connection], int]]
+
+
+class RetentionPolicy:
+    """계층별 보존 일수 (None이면 무기한)"""
+
+    def __init__(self, raw_days: Optional[float] = 14, minute_days: Optional[float] = 365,
+                 hour_days: Optional[float] = None, day_days: Optional[float] = None,
+                 csv_days: Optional[float] = 90, csv_rotate_mb: float = 64, csv_rotate_s: float = 3600):
+        self.raw_days = raw_days
+        self.rollup_days = {"minute": minute_days, "hour": hour_days, "day": day_days}
+        self.csv_days = csv_days
+        self.csv_rotate_mb = csv_rotate_mb
+        self.csv_rotate_s = csv_rotate_s
+
+    def to_dict(self) -> dict:
+        return {"raw_days": self.raw_days, **{f"{k}_days": v for k, v in self.rollup_days.items()},
+                "csv_days": self.csv_days, "csv_rotate_mb": self.csv_rotate_mb, "csv_rotate_s": self.csv_rotate_s}
+
+
+def day_floor(ts: float) -> int:
+    """ts가 속한 로컬 날짜 시작 (epoch seconds, 롤업 일 구간과 같은 경계)"""
+    return bucket_starts(ts)[2]
+
+
+def cutoffs(policy: RetentionPolicy, now: float) -> Dict[str, Optional[int]]:
+    """계층별 삭제 기준 (raw는 epoch ms, 롤업은 epoch seconds, 이보다 이전을 지움)"""
+    out = {"raw": day_floor(now - policy.raw_days * 86400) * 1000 if policy.raw_days is not None else None}
+    for level in ROLLUP_LEVELS:
+        days = policy.rollup_days[level]
+        out[level] = day_floor(now - days * 86400) if days is not None else None
+    return out
+
+
+def rollup_covered_ms(conn: sqlite3.Connection, dog_id: str) -> Optional[int]:
+    """롤업에 반영된 원본의 끝 (가장 촘촘한 롤업의 마지막 구간 끝, epoch ms), 롤업이 없으면 None"""
+    for level in ROLLUP_LEVELS:
+        latest = conn.execute(f"SELECT MAX(bucket_ts) FROM {table_name(level)} WHERE dog_id = ?",
+                              (dog_id,)).fetchone()[0]
+        if latest is not None:
+            return (latest + BUCKET_SECONDS[level]) * 1000
+    return None
+
+
+def raw_limits(conn: sqlite3.Connection, cutoff_ms: int) -> Dict[int, int]:
+    """dog_key → 실제로 지울 원본 기준 (cutoff_ms와 롤업이 덮는 끝 중 이른 쪽)"""
+    limits = {}
+    for key, dog_id in conn.execute("SELECT id, dog_id FROM dogs ORDER BY id").fetchall():
+        covered = rollup_covered_ms(conn, dog_id)
+        if covered is None:
+            has_raw = conn.execute("SELECT 1 FROM bpm_data WHERE dog_key = ? LIMIT 1", (key,)).fetchone() or \
+                conn.execute("SELECT 1 FROM bpm_blocks WHERE dog_key = ? LIMIT 1", (key,)).fetchone()
+            if not has_raw:
+                continue  # 등록만 된 강아지
+            covered = 0
+        limits[key] = min(cutoff_ms, covered)
+    return limits
+
+
+# ===== 배치 삭제 =====
+def mark_raw_cutoff(conn: sqlite3.Connection, cutoff_ms: int) -> int:
+    if cutoff_ms > (get_setting(conn, "raw_before_ms") or 0):
+        set_setting(conn, "raw_before_ms", cutoff_ms)
+    return 0
+
+
+def delete_raw_batch(conn: sqlite3.Connection, dog_key: int, cutoff_ms: int, batch: int) -> int:
+    """한 강아지의 cutoff_ms 이전 bpm_data를 오래된 것부터 batch행 (같은 ts는 함께)"""
+    row = conn.execute("SELECT ts FROM bpm_data WHERE dog_key = ? AND ts < ? ORDER BY ts LIMIT 1 OFFSET ?",
+                       (dog_key, cutoff_ms, batch - 1)).fetchone()
+    upto = row[0] + 1 if row else cutoff_ms
+    return conn.execute("DELETE FROM bpm_data WHERE dog_key = ? AND ts < ?", (dog_key, upto)).rowcount
+
+
+def delete_block_batch(conn: sqlite3.Connection, dog_key: int, cutoff_ms: int, batch: int) -> int:
+    """cutoff_ms 전에 끝나는 압축 블록을 batch개, 지운 샘플 수 반환"""
+    rows = conn.execute("SELECT rowid, count FROM bpm_blocks WHERE dog_key = ? AND block_ts <= ? "
+                        "ORDER BY block_ts LIMIT ?", (dog_key, cutoff_ms - BLOCK_MS, batch)).fetchall()
+    conn.executemany("DELETE FROM bpm_blocks WHERE rowid = ?", [(rowid,) for rowid, _ in rows])
+    return sum(count for _, count in rows)
+
+
+def delete_rollup_batch(conn: sqlite3.Connection, table: str, dog_id: str, cutoff_s: int, batch: int) -> int:
+    return conn.execute(f"""
+        DELETE FROM {table} WHERE rowid IN (
+            SELECT rowid FROM {table} WHERE dog_id = ? AND bucket_ts < ? LIMIT ?
+        )
+    """, (dog_id, cutoff_s, batch)).rowcount
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int = VACUUM_PAGES) -> int:
+    """빈 페이지를 최대 pages개 파일에서 돌려주고 그 수를 반환 (auto_vacuum=INCREMENTAL일 때만)"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not before:
+        return 0
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def plan(conn: sqlite3.Connection, policy: RetentionPolicy, now: Optional[float] = None,
+         batch: int = 5000) -> List[Step]:
+    """정책을 적용할 단계 목록 (각 단계는 0을 돌려줄 때까지 한 트랜잭션씩 반복 호출)"""
+    limits = cutoffs(policy, now if now is not None else time.time())
+    dogs = conn.execute("SELECT id, dog_id FROM dogs ORDER BY id").fetchall()
+    steps: List[Step] = []
+    if limits["raw"] is not None:
+        raw = raw_limits(conn, limits["raw"])
+        # 기준 이전은 롤업에서 읽으므로 모든 강아지가 실제로 지운 만큼만 기록
+        steps.append(("raw_cutoff", partial(mark_raw_cutoff, cutoff_ms=min(raw.values(), default=limits["raw"]))))
+        for key, cutoff_ms in raw.items():
+            if cutoff_ms <= 0:
+                continue
+            steps.append(("bpm_data", partial(delete_raw_batch, dog_key=key, cutoff_ms=cutoff_ms, batch=batch)))
+            steps.append(("bpm_blocks", partial(delete_block_batch, dog_key=key, cutoff_ms=cutoff_ms,
+                                                batch=BLOCK_BATCH)))
+    for level in ROLLUP_LEVELS:
+        if limits[level] is None:
+            continue
+        for _, dog_id in dogs:
+            steps.append((table_name(level), partial(delete_rollup_batch, table=table_name(level),
+                                                     dog_id=dog_id, cutoff_s=limits[level], batch=batch)))
+    steps.append(("vacuum_pages", incremental_vacuum))
+    return steps
+
+
+# ===== CSV 세그먼트 =====
+def csv_segments(path: str) -> List[Tuple[str, str, int]]:
+    """(세그먼트 경로, 날짜 YYYY-MM-DD, 바이트) - 나눠 둔 것만, 현재 파일 제외"""
+    root, ext = os.path.splitext(path)
+    out = []
+    for seg in sorted(glob.glob(f"{glob.escape(root)}.????-??-??*{ext}*")):
+        if seg.endswith(".tmp"):
+            continue
+        date = seg[len(root) + 1:len(root) + 11]
+        out.append((seg, date, os.path.getsize(seg)))
+    return out
+
+
+def finish_csv_segments(path: str, keep_days: Optional[float], now: Optional[float] = None) -> dict:
+    """떼어낸 세그먼트를 gzip하고 보존 기간이 지난 세그먼트는 삭제"""
+    now = now if now is not None else time.time()
+    oldest = (datetime.fromtimestamp(now) - timedelta(days=keep_days)).strftime("%Y-%m-%d") \
+        if keep_days is not None else None
+    done = {"csv_gzipped": 0, "csv_deleted": 0, "csv_deleted_bytes": 0}
+    for seg, date, size in csv_segments(path):
+        if oldest is not None and date < oldest:
+            os.remove(seg)
+            done["csv_deleted"] += 1
+            done["csv_deleted_bytes"] += size
+        elif not seg.endswith(".gz"):
+            with open(seg, "rb") as src, gzip.open(seg + ".gz.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(seg + ".gz.tmp", seg + ".gz")
+            os.remove(seg)
+            done["csv_gzipped"] += 1
+    return done
+
+
+# ===== 실행 / 미리보기 =====
+def compact(conn: sqlite3.Connection, policy: RetentionPolicy, csv_file: Optional[str] = None,
+            now: Optional[float] = None, batch: int = 5000) -> dict:
+    """정책을 끝까지 적용 (CLI용, 서버에서는 같은 단계를 저장기 스레드에서 하나씩 실행)"""
+    totals: Dict[str, int] = {}
+    for name, step in plan(conn, policy, now, batch):
+        while True:
+            with conn:
+                n = step(conn)
+            if not n:
+                break
+            totals[name] = totals.get(name, 0) + n
+    if csv_file:
+        # 서버가 꺼져 있어도 bpm_csvlog와 같은 이름/색인으로 현재 파일을 떼어냄
+        from bpm_csvlog import rotate_stale
+        segment = rotate_stale(csv_file, policy.csv_rotate_s, int(policy.csv_rotate_mb * 1024 * 1024), now)
+        totals["csv_rotated"] = int(segment is not None)
+        totals.update(finish_csv_segments(csv_file, policy.csv_days, now))
+    return totals
+
+
+def _object_bytes(conn: sqlite3.Connection, names: List[str]) -> Optional[int]:
+    try:
+        q = ",".join("?" * len(names))
+        return conn.execute(f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({q})", names).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None  # dbstat 없이 빌드된 SQLite
+
+
+def _estimate(total_bytes: Optional[int], part: int, total: int) -> Optional[int]:
+    if total_bytes is None or not total:
+        return None
+    return int(total_bytes * part / total)
+
+
+def dry_run(conn: sqlite3.Connection, policy: RetentionPolicy, csv_file: Optional[str] = None,
+            now: Optional[float] = None) -> dict:
+    """지울 행 수와 돌려받을 수 있는 공간 추정 (아무것도 바꾸지 않음)"""
+    now = now if now is not None else time.time()
+    limits = cutoffs(policy, now)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    report = {
+        "policy": policy.to_dict(),
+        "cutoffs": {k: (datetime.fromtimestamp(v / 1000 if k == "raw" else v).isoformat() if v is not None else None)
+                    for k, v in limits.items()},
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        "tables": {},
+    }
+    indexes = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'bpm_data'")]
+    total = conn.execute("SELECT COUNT(*) FROM bpm_data").fetchone()[0]
+    raw = raw_limits(conn, limits["raw"]) if limits["raw"] is not None else {}
+    old = blocks = samples = size = 0
+    for key, cutoff_ms in raw.items():
+        old += conn.execute("SELECT COUNT(*) FROM bpm_data WHERE dog_key = ? AND ts < ?",
+                            (key, cutoff_ms)).fetchone()[0]
+        n, c, b = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(count), 0), COALESCE(SUM(LENGTH(data)), 0) FROM bpm_blocks "
+            "WHERE dog_key = ? AND block_ts <= ?", (key, cutoff_ms - BLOCK_MS)).fetchone()
+        blocks, samples, size = blocks + n, samples + c, size + b
+    report["tables"]["bpm_data"] = {"rows": total, "delete_rows": old,
+                                    "reclaim_bytes": _estimate(_object_bytes(conn, ["bpm_data"] + indexes), old, total)}
+    report["tables"]["bpm_blocks"] = {"delete_blocks": blocks, "delete_samples": samples, "reclaim_bytes": size}
+    for level in ROLLUP_LEVELS:
+        table = table_name(level)
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        old = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE bucket_ts < ?",
+                           (limits[level],)).fetchone()[0] if limits[level] is not None else 0
+        report["tables"][table] = {"rows": total, "delete_rows": old,
+                                   "reclaim_bytes": _estimate(_object_bytes(conn, [table, f"sqlite_autoindex_{table}_1"]),
+                                                              old, total)}
+    if csv_file:
+        oldest = (datetime.fromtimestamp(now) - timedelta(days=policy.csv_days)).strftime("%Y-%m-%d") \
+            if policy.csv_days is not None else None
+        segments = csv_segments(csv_file)
+        report["csv"] = {
+            "current_bytes": os.path.getsize(csv_file) if os.path.exists(csv_file) else 0,
+            "segments": len(segments),
+            "uncompressed_segment_bytes": sum(s for p, _, s in segments if not p.endswith(".gz")),
+            "delete_segment_bytes": sum(s for _, d, s in segments if oldest is not None and d < oldest),
+        }
+    known = [t["reclaim_bytes"] for t in report["tables"].values()]
+    report["reclaim_bytes"] = sum(known) if None not in known else None
+    return report
+
+
+def enable_incremental(conn: sqlite3.Connection):
+    """기존 DB를 auto_vacuum=INCREMENTAL로 전환 (전체 VACUUM, 서버를 멈추고 실행)"""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="보존 기간 정리")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("dry-run", "지울 양과 돌려받을 공간 미리보기"), ("run", "정책 적용")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--db", default="example_dogs.db")
+        p.add_argument("--csv", default=None, help="CSV 기록 파일 (세그먼트 회전/gzip/삭제)")
+        p.add_argument("--raw-days", type=float, default=14)
+        p.add_argument("--minute-days", type=float, default=365)
+        p.add_argument("--hour-days", type=float, default=None)
+        p.add_argument("--day-days", type=float, default=None)
+        p.add_argument("--csv-days", type=float, default=90)
+        p.add_argument("--csv-rotate-mb", type=float, default=64)
+        p.add_argument("--csv-rotate-s", type=float, default=3600)
+        p.add_argument("--batch", type=int, default=5000)
+    sub.add_parser("enable-incremental", help="auto_vacuum=INCREMENTAL로 전환 (전체 VACUUM)").add_argument(
+        "--db", default="example_dogs.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.command == "enable-incremental":
+        enable_incremental(conn)
+        print("✅ auto_vacuum = incremental")
+        conn.close()
+        return
+    create_block_table(conn)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    policy = RetentionPolicy(args.raw_days, args.minute_days, args.hour_days, args.day_days,
+                             args.csv_days, args.csv_rotate_mb, args.csv_rotate_s)
+    if args.command == "dry-run":
+        print(json.dumps(dry_run(conn, policy, args.csv), indent=2, ensure_ascii=False))
+    elif args.command == "run":
+        print(json.dumps(compact(conn, policy, args.csv, batch=args.batch), indent=2))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""bpm_data 분/시/일 롤업 테이블
+
+수집 시점에 저장기 트랜잭션 안에서 증분 갱신되고(늦게 들어온 데이터도
+같은 UPSERT로 해당 구간에 합산됨), 리포트는 원본 대신 이 테이블을 읽는다.
+
+기존 원본으로부터 다시 채우기:
+    python bpm_rollup.py rebuild [--db example_dogs.db] [--dog-id DOG]
+"""
+import argparse
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from bpm_blocks import create_block_table, iter_range
+from bpm_buffer import STATUS_CODES
+from bpm_schema import get_setting
+
+ROLLUP_LEVELS = ("minute", "hour", "day")
+
+
+def table_name(level: str) -> str:
+    return f"bpm_rollup_{level}"
+
+
+def create_rollup_tables(conn: sqlite3.Connection):
+    for level in ROLLUP_LEVELS:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name(level)} (
+            dog_id TEXT,
+            bucket_ts INTEGER,   -- 구간 시작 (epoch seconds, 로컬 시간 기준 정렬)
+            count INTEGER,
+            sum_bpm INTEGER,
+            min_bpm INTEGER,
+            max_bpm INTEGER,
+            high_count INTEGER,
+            low_count INTEGER,
+            normal_count INTEGER,
+            PRIMARY KEY (dog_id, bucket_ts)
+        )
+        """)
+
+
+def bucket_starts(ts: float) -> Tuple[int, int, int]:
+    """(분, 시, 일) 구간 시작 시각"""
+    dt = datetime.fromtimestamp(ts)
+    minute = int(dt.replace(second=0, microsecond=0).timestamp())
+    hour = int(dt.replace(minute=0, second=0, microsecond=0).timestamp())
+    day = int(dt.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+    return minute, hour, day
+
+
+def aggregate(rows: Iterable[Tuple[str, int, str, float]]) -> Dict[str, dict]:
+    """(dog_id, bpm, status, ts) 행들을 레벨별 {(dog_id, bucket_ts): [count, sum, min, max, high, low, normal]}로 집계"""
+    out = {level: {} for level in ROLLUP_LEVELS}
+    cache = {}  # 같은 분에 속한 샘플은 구간 계산 재사용
+    for dog_id, bpm, status, ts in rows:
+        key_min = int(ts) // 60
+        starts = cache.get(key_min)
+        if starts is None:
+            starts = cache[key_min] = bucket_starts(ts)
+        high = 1 if status == "high" else 0
+        low = 1 if status == "low" else 0
+        normal = 1 if status == "normal" else 0
+        for level, bucket in zip(ROLLUP_LEVELS, starts):
+            agg = out[level].get((dog_id, bucket))
+            if agg is None:
+                out[level][(dog_id, bucket)] = [1, bpm, bpm, bpm, high, low, normal]
+            else:
+                agg[0] += 1
+                agg[1] += bpm
+                if bpm < agg[2]:
+                    agg[2] = bpm
+                if bpm > agg[3]:
+                    agg[3] = bpm
+                agg[4] += high
+                agg[5] += low
+                agg[6] += normal
+    return out
+
+
+def aggregate_arrays(dog_id: str, ts: np.ndarray, bpm: np.ndarray, status: np.ndarray) -> Dict[str, List[tuple]]:
+    """한 강아지의 시간순 배열(status는 STATUS_NAMES 코드)을 레벨별 롤업 행으로 집계 (대량 적재용)
+
+    aggregate()와 같은 결과를 분 단위 구간 계산 + reduceat으로 구한다.
+    """
+    out = {level: [] for level in ROLLUP_LEVELS}
+    if not len(ts):
+        return out
+    ts = np.asarray(ts, dtype=np.float64)
+    bpm = np.asarray(bpm, dtype=np.int64)
+    status = np.asarray(status)
+    minutes, inv = np.unique((ts // 60).astype(np.int64), return_inverse=True)
+    starts = np.array([bucket_starts(m * 60) for m in minutes.tolist()], dtype=np.int64)
+    high = (status == STATUS_CODES["high"]).astype(np.int64)
+    low = (status == STATUS_CODES["low"]).astype(np.int64)
+    normal = (status == STATUS_CODES["normal"]).astype(np.int64)
+    for li, level in enumerate(ROLLUP_LEVELS):
+        bucket = starts[inv, li]
+        order = np.argsort(bucket, kind="stable")
+        b = bucket[order]
+        cut = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        v = bpm[order]
+        cols = (
+            np.diff(np.r_[cut, len(b)]),
+            np.add.reduceat(v, cut),
+            np.minimum.reduceat(v, cut),
+            np.maximum.reduceat(v, cut),
+            np.add.reduceat(high[order], cut),
+            np.add.reduceat(low[order], cut),
+            np.add.reduceat(normal[order], cut),
+        )
+        out[level] = [(dog_id, *row) for row in zip(b[cut].tolist(), *(c.tolist() for c in cols))]
+    return out
+
+
+def upsert_buckets(conn: sqlite3.Connection, level: str, rows: Iterable[tuple]):
+    """(dog_id, bucket_ts, count, sum, min, max, high, low, normal) 행을 level 롤업에 합산"""
+    conn.executemany(f"""
+        INSERT INTO {table_name(level)}
+            (dog_id, bucket_ts, count, sum_bpm, min_bpm, max_bpm, high_count, low_count, normal_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (dog_id, bucket_ts) DO UPDATE SET
+            count = count + excluded.count,
+            sum_bpm = sum_bpm + excluded.sum_bpm,
+            min_bpm = MIN(min_bpm, excluded.min_bpm),
+            max_bpm = MAX(max_bpm, excluded.max_bpm),
+            high_count = high_count + excluded.high_count,
+            low_count = low_count + excluded.low_count,
+            normal_count = normal_count + excluded.normal_count
+    """, rows)
+
+
+def apply_rollups(conn: sqlite3.Connection, rows):
+    """(dog_id, bpm, status, ts) 행들을 롤업 테이블에 합산 (호출한 쪽 트랜잭션 안에서 실행)"""
+    for level, buckets in aggregate(rows).items():
+        if buckets:
+            upsert_buckets(conn, level, [(dog_id, bucket, *agg) for (dog_id, bucket), agg in buckets.items()])
+
+
+def storage_rollup_hook(conn: sqlite3.Connection, rows):
+    """StorageWriter 훅: 저장 행 (dog_id, ts, bpm, status)을 롤업에 반영"""
+    apply_rollups(conn, ((dog_id, bpm, status, ts) for dog_id, ts, bpm, status in rows))
+
+
+def query_daily(conn: sqlite3.Connection, since_ts: int, dog_id: Optional[str] = None,
+                until_ts: Optional[int] = None):
+    """일 롤업에서 날짜별 요약 (dog_id 없으면 전체 합산, until_ts는 미포함)"""
+    params = [since_ts]
+    dog_filter = ""
+    if until_ts is not None:
+        dog_filter += "AND bucket_ts < ? "
+        params.append(until_ts)
+    if dog_id:
+        dog_filter += "AND dog_id = ?"
+        params.append(dog_id)
+    rows = conn.execute(f"""
+        SELECT bucket_ts, SUM(count), SUM(sum_bpm), MAX(max_bpm), MIN(min_bpm),
+               SUM(high_count), SUM(low_count), SUM(normal_count)
+        FROM {table_name("day")}
+        WHERE bucket_ts >= ? {dog_filter}
+        GROUP BY bucket_ts
+        ORDER BY bucket_ts
+    """, params).fetchall()
+    return [{
+        "date": datetime.fromtimestamp(bucket_ts).strftime("%Y-%m-%d"),
+        "avg_bpm": total / count if count else None,
+        "max_bpm": max_bpm,
+        "min_bpm": min_bpm,
+        "high_count": high,
+        "low_count": low,
+        "normal_count": normal,
+    } for bucket_ts, count, total, max_bpm, min_bpm, high, low, normal in rows]
+
+
+def rollups_missing(conn: sqlite3.Connection) -> bool:
+    """원본(bpm_data 또는 압축 블록)은 있는데 롤업이 비어 있는지 (v1 DB를 마이그레이션한 직후 등)"""
+    if conn.execute(f"SELECT 1 FROM {table_name('day')} LIMIT 1").fetchone():
+        return False
+    return bool(conn.execute("SELECT 1 FROM bpm_data LIMIT 1").fetchone()
+                or conn.execute("SELECT 1 FROM bpm_blocks LIMIT 1").fetchone())
+
+
+def rebuild(db_file: str, dog_id: Optional[str] = None) -> int:
+    """원본(bpm_data + 압축 블록)으로 롤업을 다시 채움 (하루씩 읽어 메모리 일정)
+
+    보존 기간 정리로 원본을 지운 DB면 남아 있는 원본 구간(settings.raw_before_ms 이후)만
+    다시 만들고 그 이전 롤업은 그대로 둔다.
+    """
+    conn = sqlite3.connect(db_file)
+    create_rollup_tables(conn)
+    create_block_table(conn)
+    raw_from = get_setting(conn, "raw_before_ms")
+    since = raw_from // 1000 if raw_from else 0
+    with conn:
+        for level in ROLLUP_LEVELS:
+            if dog_id:
+                conn.execute(f"DELETE FROM {table_name(level)} WHERE dog_id = ? AND bucket_ts >= ?", (dog_id, since))
+            else:
+                conn.execute(f"DELETE FROM {table_name(level)} WHERE bucket_ts >= ?", (since,))
+
+    query = "SELECT id, dog_id FROM dogs"
+    dogs = conn.execute(query + " WHERE dog_id = ?", (dog_id,)).fetchall() if dog_id else conn.execute(query).fetchall()
+    total = 0
+    for key, name in dogs:
+        # 하루치씩 읽어 (압축 블록 포함) 배열로 집계
+        for ts, bpm, status in iter_range(conn, key, from_ms=raw_from):
+            with conn:
+                for level, rows in aggregate_arrays(name, ts / 1000, bpm, status).items():
+                    upsert_buckets(conn, level, rows)
+            total += len(ts)
+    conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bpm_data 롤업 관리")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("rebuild", help="원본 bpm_data와 압축 블록으로 롤업 재생성")
+    p.add_argument("--db", default="example_dogs.db")
+    p.add_argument("--dog-id", default=None)
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        n = rebuild(args.db, args.dog_id)
+        print(f"✅ rebuilt rollups from {n} rows")
+
+
+if __name__ == "__main__":
+    main()
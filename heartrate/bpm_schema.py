@@ -0,0 +1,252 @@
+"""example_dogs.db 스키마 버전 관리
+
+버전 (PRAGMA user_version):
+    1  기존 스키마 - bpm_data(id, dog_id TEXT, bpm, status TEXT, timestamp DATETIME), 인덱스 없음
+    2  dogs(id INTEGER PRIMARY KEY, dog_id TEXT UNIQUE, size)
+       bpm_data(dog_key INTEGER → dogs.id, ts INTEGER epoch ms, bpm INTEGER, status INTEGER 코드)
+       + (dog_key, ts) 복합 인덱스 (clustered 옵션이면 WITHOUT ROWID 기본키)
+    3  (dog_key, ts) 인덱스를 UNIQUE로 - 같은 ms 샘플은 하나만 (clustered와 같은 규칙)
+
+수동 마이그레이션:
+    python bpm_schema.py migrate [--db example_dogs.db] [--chunk-size 50000] [--clustered]
+"""
+import argparse
+import sqlite3
+from datetime import datetime
+from typing import Dict, Optional
+
+from bpm_buffer import STATUS_CODES
+
+SCHEMA_VERSION = 3
+
+
+# ===== 공통 =====
+def to_ms(ts: float) -> int:
+    return int(round(ts * 1000))
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0 and (_table_exists(conn, "bpm_data") or _table_exists(conn, "dogs")):
+        return 1  # 버전 표시 이전에 만들어진 DB
+    return version
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone()
+    return row is not None
+
+
+def _create_dogs(conn: sqlite3.Connection, name: str = "dogs"):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY,
+        dog_id TEXT UNIQUE NOT NULL,
+        size TEXT
+    )
+    """)
+
+
+def _create_bpm_data(conn: sqlite3.Connection, name: str = "bpm_data", clustered: bool = False):
+    if clustered:
+        # (dog_key, ts) 순으로 물리 정렬 - 같은 ms 샘플은 하나만 유지
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            dog_key INTEGER NOT NULL REFERENCES dogs(id),
+            ts INTEGER NOT NULL,
+            bpm INTEGER,
+            status INTEGER,
+            PRIMARY KEY (dog_key, ts)
+        ) WITHOUT ROWID
+        """)
+    else:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            dog_key INTEGER NOT NULL REFERENCES dogs(id),
+            ts INTEGER NOT NULL,
+            bpm INTEGER,
+            status INTEGER
+        )
+        """)
+
+
+def _create_indexes(conn: sqlite3.Connection):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='bpm_data'").fetchone()[0]
+    if "WITHOUT ROWID" in sql:
+        return  # 기본키가 이미 (dog_key, ts)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bpm_data_dog_ts ON bpm_data (dog_key, ts)")
+
+
+def init_schema(conn: sqlite3.Connection, clustered: bool = False):
+    """새 DB면 최신 스키마로 생성, 이전 버전이면 마이그레이션"""
+    version = get_version(conn)
+    if version == 0:
+        _create_dogs(conn)
+        _create_bpm_data(conn, clustered=clustered)
+        _create_indexes(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    elif version < SCHEMA_VERSION:
+        migrate(conn, clustered=clustered)
+
+
+# ===== dog_id ↔ dog_key =====
+class DogKeys:
+    """dogs.dog_id(TEXT) → dogs.id(INTEGER) 캐시, 없는 강아지는 기본 크기로 등록"""
+
+    def __init__(self):
+        self._keys: Dict[str, int] = {}
+
+    def key(self, conn: sqlite3.Connection, dog_id: str) -> int:
+        key = self._keys.get(dog_id)
+        if key is None:
+            conn.execute("INSERT OR IGNORE INTO dogs (dog_id, size) VALUES (?, 'medium')", (dog_id,))
+            key = conn.execute("SELECT id FROM dogs WHERE dog_id = ?", (dog_id,)).fetchone()[0]
+            self._keys[dog_id] = key
+        return key
+
+
+def lookup_dog_key(conn: sqlite3.Connection, dog_id: str) -> Optional[int]:
+    row = conn.execute("SELECT id FROM dogs WHERE dog_id = ?", (dog_id,)).fetchone()
+    return row[0] if row else None
+
+
+def upsert_dog(conn: sqlite3.Connection, dog_id: str, size: str):
+    # INSERT OR REPLACE는 id를 새로 발급하므로 사용하지 않음
+    conn.execute(
+        "INSERT INTO dogs (dog_id, size) VALUES (?, ?) "
+        "ON CONFLICT (dog_id) DO UPDATE SET size = excluded.size",
+        (dog_id, size)
+    )
+
+
+# ===== 설정 값 (settings 테이블) =====
+def get_setting(conn: sqlite3.Connection, name: str) -> Optional[int]:
+    # 읽기 전용 연결에서도 부르므로 테이블을 만들지 않음
+    if not _table_exists(conn, "settings"):
+        return None
+    row = conn.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def set_setting(conn: sqlite3.Connection, name: str, value: int):
+    conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value INTEGER)")
+    conn.execute("INSERT INTO settings (name, value) VALUES (?, ?) "
+                 "ON CONFLICT (name) DO UPDATE SET value = excluded.value", (name, value))
+
+
+# ===== 마이그레이션 =====
+def _legacy_ts_ms(value) -> int:
+    return to_ms(datetime.fromisoformat(str(value)).timestamp())
+
+
+def _migrate_1_to_2(conn: sqlite3.Connection, chunk_size: int, clustered: bool):
+    # 진행 상황을 기록해 중간에 멈춰도 이어서 진행
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_migration (step TEXT PRIMARY KEY, last_id INTEGER)")
+
+    # 1) dogs → 정수 키 테이블
+    has_legacy_data = _table_exists(conn, "bpm_data")
+    with conn:
+        if not _table_exists(conn, "dogs_v2"):
+            _create_dogs(conn, "dogs_v2")
+            if _table_exists(conn, "dogs"):
+                conn.execute("INSERT OR IGNORE INTO dogs_v2 (dog_id, size) SELECT dog_id, size FROM dogs")
+            if has_legacy_data:
+                # 등록 없이 데이터만 있는 강아지
+                conn.execute("""
+                    INSERT OR IGNORE INTO dogs_v2 (dog_id, size)
+                    SELECT DISTINCT dog_id, 'medium' FROM bpm_data WHERE dog_id IS NOT NULL
+                """)
+        _create_bpm_data(conn, "bpm_data_v2", clustered=clustered)
+    keys = dict(conn.execute("SELECT dog_id, id FROM dogs_v2"))
+
+    # 2) bpm_data를 id 순으로 chunk 단위 복사
+    row = conn.execute("SELECT last_id FROM schema_migration WHERE step = 'bpm_data_v2'").fetchone()
+    last_id = row[0] if row else 0
+    insert = "INSERT OR REPLACE INTO bpm_data_v2 (dog_key, ts, bpm, status) VALUES (?, ?, ?, ?)"
+    while has_legacy_data:
+        chunk = conn.execute(
+            "SELECT id, dog_id, bpm, status, timestamp FROM bpm_data WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        with conn:
+            conn.executemany(insert, [
+                (keys[dog_id], _legacy_ts_ms(ts), bpm, STATUS_CODES.get(status, 0))
+                for _, dog_id, bpm, status, ts in chunk if dog_id is not None and ts is not None
+            ])
+            conn.execute("INSERT OR REPLACE INTO schema_migration (step, last_id) VALUES ('bpm_data_v2', ?)",
+                         (last_id,))
+
+    # 3) 테이블 교체
+    with conn:
+        if has_legacy_data:
+            conn.execute("DROP TABLE bpm_data")
+        conn.execute("ALTER TABLE bpm_data_v2 RENAME TO bpm_data")
+        if _table_exists(conn, "dogs"):
+            conn.execute("DROP TABLE dogs")
+        conn.execute("ALTER TABLE dogs_v2 RENAME TO dogs")
+        _create_indexes(conn)
+        conn.execute("DROP TABLE schema_migration")
+        conn.execute("PRAGMA user_version = 2")
+    if has_legacy_data:
+        print("   rollups are not built from legacy rows here - the server rebuilds them on start, "
+              "or run: python bpm_rollup.py rebuild")
+
+
+def _migrate_2_to_3(conn: sqlite3.Connection, chunk_size: int, clustered: bool):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='bpm_data'").fetchone()[0]
+    with conn:
+        if "WITHOUT ROWID" not in sql:
+            # 같은 (dog_key, ts)는 먼저 들어온 행만 남기고 인덱스를 UNIQUE로 다시 만듦
+            removed = conn.execute("""
+                DELETE FROM bpm_data WHERE rowid NOT IN
+                    (SELECT MIN(rowid) FROM bpm_data GROUP BY dog_key, ts)
+            """).rowcount
+            conn.execute("DROP INDEX IF EXISTS idx_bpm_data_dog_ts")
+            _create_indexes(conn)
+            if removed:
+                print(f"   removed {removed} duplicate rows - rollups counted them, "
+                      f"run: python bpm_rollup.py rebuild")
+        conn.execute("PRAGMA user_version = 3")
+
+
+MIGRATIONS = {1: _migrate_1_to_2, 2: _migrate_2_to_3}
+
+
+def migrate(conn: sqlite3.Connection, chunk_size: int = 50_000, clustered: bool = False) -> int:
+    """현재 버전부터 SCHEMA_VERSION까지 차례로 적용, 최종 버전 반환"""
+    version = get_version(conn)
+    if version == 0:
+        init_schema(conn, clustered)
+        return SCHEMA_VERSION
+    while version < SCHEMA_VERSION:
+        print(f"🔧 migrating schema v{version} → v{version + 1}")
+        MIGRATIONS[version](conn, chunk_size, clustered)
+        version = get_version(conn)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="example_dogs.db 스키마 마이그레이션")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("migrate", help="최신 스키마로 변환")
+    p.add_argument("--db", default="example_dogs.db")
+    p.add_argument("--chunk-size", type=int, default=50_000)
+    p.add_argument("--clustered", action="store_true", help="bpm_data를 WITHOUT ROWID (dog_key, ts) 테이블로 생성")
+    sub.add_parser("version", help="현재 스키마 버전").add_argument("--db", default="example_dogs.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.command == "migrate":
+        version = migrate(conn, args.chunk_size, args.clustered)
+        print(f"✅ schema v{version}")
+    elif args.command == "version":
+        print(get_version(conn))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""여러 워커 프로세스가 함께 쓰는 수집 상태 (mmap 파일)
+
+uvicorn --workers N 으로 띄우면 워커마다 모듈 전역이 따로 생겨 최신값,
+활성 강아지, 디바이스 매핑이 워커별로 달라진다. BPM_SHARED_STATE에 파일
+경로(예: /dev/shm/bpm_state)를 주면 이 상태를 모든 워커가 같은 mmap 파일에서
+읽고 쓴다.
+
+배치 (모두 little-endian, 워커는 같은 설정으로 열어야 함):
+    header    magic, slots, capacity, dev_slots, active (활성 강아지 slot, -1 = 없음)
+    dogs      slots × (dog_id S32, size u1, used u1)
+    devices   dev_slots × (device_id S32, dog i4, used u1)
+    meta      slots × (seq u8, head u8, count u8, written u8)
+    rings     ts f8[slots, capacity], bpm i2[slots, capacity], status u1[slots, capacity]
+
+쓰기: slot별 lockf 바이트 락(+ 프로세스 안 스레드 락)으로 쓰는 쪽을 하나로 만들고,
+      seq를 홀수로 올린 뒤 기록하고 다시 짝수로 올린다 (seqlock).
+읽기: 락 없이 seq가 짝수이고 읽기 전후로 같을 때까지 다시 읽는다.
+slot은 한 번 배정되면 바뀌지 않으므로 dog_id → slot은 프로세스별로 캐시한다.
+"""
+import fcntl
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bpm_buffer import STATUS_CODES, STATUS_NAMES, to_bpm16
+
+MAGIC = b"BPMSHM01"
+SIZE_NAMES = ["small", "medium", "large"]
+SIZE_CODES = {name: i for i, name in enumerate(SIZE_NAMES)}
+
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("slots", "<u4"), ("capacity", "<u4"),
+                         ("dev_slots", "<u4"), ("active", "<i4")])
+DOG_DTYPE = np.dtype([("dog_id", "S32"), ("size", "u1"), ("used", "u1")])
+DEVICE_DTYPE = np.dtype([("device_id", "S32"), ("dog", "<i4"), ("used", "u1")])
+META_DTYPE = np.dtype([("seq", "<u8"), ("head", "<u8"), ("count", "<u8"), ("written", "<u8")])
+
+_PAGE = 4096
+_DIR_LOCK = 0  # lockf 바이트 0 = 디렉터리, 1 + slot = slot
+
+
+def _align(n: int) -> int:
+    return (n + _PAGE - 1) // _PAGE * _PAGE
+
+
+class SharedState:
+    def __init__(self, path: str, slots: int = 256, capacity: int = 10_000, dev_slots: int = 1024):
+        self.path = path
+        self.slots = slots
+        self.capacity = capacity
+        self.dev_slots = dev_slots
+
+        # 영역별 오프셋
+        off = _align(HEADER_DTYPE.itemsize)
+        self._off_dogs = off
+        off = _align(off + DOG_DTYPE.itemsize * slots)
+        self._off_devices = off
+        off = _align(off + DEVICE_DTYPE.itemsize * dev_slots)
+        self._off_meta = off
+        off = _align(off + META_DTYPE.itemsize * slots)
+        self._off_ts = off
+        off = _align(off + 8 * slots * capacity)
+        self._off_bpm = off
+        off = _align(off + 2 * slots * capacity)
+        self._off_status = off
+        self.nbytes = _align(off + slots * capacity)
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_locks = [threading.Lock() for _ in range(slots + 1)]
+        self._init_file()
+        self._mm = mmap.mmap(self._fd, self.nbytes)
+        self._map_views()
+        self._slot_cache: Dict[str, int] = {}
+
+    # ===== 파일 준비 =====
+    def _init_file(self):
+        # 여러 워커가 동시에 시작해도 한 프로세스만 초기화
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            st = os.fstat(self._fd)
+            head = os.pread(self._fd, HEADER_DTYPE.itemsize, 0)
+            if st.st_size == 0 or head[:len(MAGIC)] != MAGIC:
+                os.ftruncate(self._fd, self.nbytes)
+                header = np.zeros(1, dtype=HEADER_DTYPE)
+                header[0] = (MAGIC, self.slots, self.capacity, self.dev_slots, -1)
+                os.pwrite(self._fd, header.tobytes(), 0)
+                return
+            header = np.frombuffer(head, dtype=HEADER_DTYPE)[0]
+            if (int(header["slots"]), int(header["capacity"]), int(header["dev_slots"])) != \
+                    (self.slots, self.capacity, self.dev_slots) or st.st_size < self.nbytes:
+                raise ValueError(f"{self.path} was created with a different layout "
+                                 f"(slots={int(header['slots'])}, capacity={int(header['capacity'])}, "
+                                 f"dev_slots={int(header['dev_slots'])})")
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _map_views(self):
+        mm = self._mm
+        self._header = np.frombuffer(mm, dtype=HEADER_DTYPE, count=1, offset=0)
+        self._dogs = np.frombuffer(mm, dtype=DOG_DTYPE, count=self.slots, offset=self._off_dogs)
+        self._devices = np.frombuffer(mm, dtype=DEVICE_DTYPE, count=self.dev_slots, offset=self._off_devices)
+        self._meta = np.frombuffer(mm, dtype=META_DTYPE, count=self.slots, offset=self._off_meta)
+        n = self.slots * self.capacity
+        self._ts = np.frombuffer(mm, dtype="<f8", count=n, offset=self._off_ts).reshape(self.slots, -1)
+        self._bpm = np.frombuffer(mm, dtype="<i2", count=n, offset=self._off_bpm).reshape(self.slots, -1)
+        self._status = np.frombuffer(mm, dtype=np.uint8, count=n, offset=self._off_status).reshape(self.slots, -1)
+
+    def close(self):
+        # numpy 뷰가 mmap을 참조하므로 뷰를 먼저 놓음
+        self._header = self._dogs = self._devices = self._meta = None
+        self._ts = self._bpm = self._status = None
+        self._mm.close()
+        os.close(self._fd)
+
+    @contextmanager
+    def _locked(self, index: int):
+        with self._thread_locks[index]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, index)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, index)
+
+    # ===== 강아지 디렉터리 =====
+    def find(self, dog_id: str) -> Optional[int]:
+        slot = self._slot_cache.get(dog_id)
+        if slot is not None:
+            return slot
+        raw = dog_id.encode()
+        hits = np.flatnonzero((self._dogs["used"] == 1) & (self._dogs["dog_id"] == raw))
+        if not len(hits):
+            return None
+        slot = self._slot_cache[dog_id] = int(hits[0])
+        return slot
+
+    def slot(self, dog_id: str) -> int:
+        """dog_id의 slot, 없으면 배정 (기본 크기 medium)"""
+        slot = self.find(dog_id)
+        if slot is not None:
+            return slot
+        raw = dog_id.encode()
+        if len(raw) > DOG_DTYPE["dog_id"].itemsize:
+            raise ValueError(f"dog_id too long for shared state: {dog_id!r}")
+        with self._locked(_DIR_LOCK):
+            slot = self.find(dog_id)
+            if slot is not None:
+                return slot
+            free = np.flatnonzero(self._dogs["used"] == 0)
+            if not len(free):
+                raise RuntimeError("shared state is full (increase BPM_SHARED_SLOTS)")
+            slot = int(free[0])
+            self._dogs["dog_id"][slot] = raw
+            self._dogs["size"][slot] = SIZE_CODES["medium"]
+            self._dogs["used"][slot] = 1  # 마지막에 표시해야 반쯤 쓴 항목이 안 보임
+        self._slot_cache[dog_id] = slot
+        return slot
+
+    def dog_id(self, slot: int) -> str:
+        return self._dogs["dog_id"][slot].decode()
+
+    def used_slots(self) -> List[int]:
+        return np.flatnonzero(self._dogs["used"] == 1).tolist()
+
+    def size(self, slot: int) -> str:
+        return SIZE_NAMES[int(self._dogs["size"][slot])]
+
+    def set_size(self, slot: int, size: str):
+        self._dogs["size"][slot] = SIZE_CODES[size]
+
+    # ===== 활성 강아지 =====
+    def active_dog(self) -> Optional[str]:
+        slot = int(self._header["active"][0])
+        return self.dog_id(slot) if slot >= 0 else None
+
+    def set_active_dog(self, dog_id: Optional[str]):
+        self._header["active"][0] = self.slot(dog_id) if dog_id else -1
+
+    # ===== 디바이스 매핑 =====
+    def _device_index(self, device_id: str) -> Optional[int]:
+        hits = np.flatnonzero((self._devices["used"] == 1) & (self._devices["device_id"] == device_id.encode()))
+        return int(hits[0]) if len(hits) else None
+
+    def resolve_device(self, device_id: str) -> Optional[str]:
+        i = self._device_index(device_id)
+        if i is None:
+            return None
+        dog = int(self._devices["dog"][i])
+        return self.dog_id(dog) if dog >= 0 else None
+
+    def set_device(self, device_id: str, dog_id: str):
+        raw = device_id.encode()
+        if len(raw) > DEVICE_DTYPE["device_id"].itemsize:
+            raise ValueError(f"device_id too long for shared state: {device_id!r}")
+        slot = self.slot(dog_id)
+        with self._locked(_DIR_LOCK):
+            i = self._device_index(device_id)
+            if i is None:
+                free = np.flatnonzero(self._devices["used"] == 0)
+                if not len(free):
+                    raise RuntimeError("shared device table is full")
+                i = int(free[0])
+                self._devices["device_id"][i] = raw
+                self._devices["dog"][i] = slot
+                self._devices["used"][i] = 1
+            else:
+                self._devices["dog"][i] = slot
+
+    def remove_device(self, device_id: str) -> bool:
+        with self._locked(_DIR_LOCK):
+            i = self._device_index(device_id)
+            if i is None:
+                return False
+            self._devices["used"][i] = 0
+            self._devices["dog"][i] = -1
+            return True
+
+    def devices(self) -> Dict[str, str]:
+        out = {}
+        for i in np.flatnonzero(self._devices["used"] == 1).tolist():
+            dog = int(self._devices["dog"][i])
+            if dog >= 0:
+                out[self._devices["device_id"][i].decode()] = self.dog_id(dog)
+        return out
+
+    # ===== 링버퍼 =====
+    def append(self, slot: int, ts, bpm, status_codes):
+        """ts/bpm/status 코드 배열을 slot 링버퍼에 추가"""
+        n = len(ts)
+        if n == 0:
+            return
+        cap = self.capacity
+        ts = np.asarray(ts, dtype=np.float64)[-cap:]
+        bpm = to_bpm16(bpm)[-cap:]
+        codes = np.asarray(status_codes, dtype=np.uint8)[-cap:]
+        meta = self._meta
+        with self._locked(1 + slot):
+            m = len(ts)
+            head = int(meta["head"][slot])
+            meta["seq"][slot] += 1  # 홀수: 쓰는 중
+            if m == 1:
+                self._ts[slot, head] = ts[0]
+                self._bpm[slot, head] = bpm[0]
+                self._status[slot, head] = codes[0]
+            else:
+                idx = (head + np.arange(m)) % cap
+                self._ts[slot, idx] = ts
+                self._bpm[slot, idx] = bpm
+                self._status[slot, idx] = codes
+            meta["head"][slot] = (head + m) % cap
+            meta["count"][slot] = min(int(meta["count"][slot]) + m, cap)
+            meta["written"][slot] += n
+            meta["seq"][slot] += 1  # 짝수: 완료
+
+    def _read(self, slot: int, n: int, since: Optional[int] = None):
+        """(ts, bpm, status, written) 최근 n개 일관된 스냅샷 (since를 주면 written > since 인 것만)"""
+        meta = self._meta
+        while True:
+            s1 = int(meta["seq"][slot])
+            if s1 & 1:
+                os.sched_yield()
+                continue
+            head = int(meta["head"][slot])
+            count = int(meta["count"][slot])
+            written = int(meta["written"][slot])
+            if since is not None:
+                n = written - since
+            k = max(0, min(n, count))
+            idx = (head - k + np.arange(k)) % self.capacity
+            ts, bpm, status = self._ts[slot, idx], self._bpm[slot, idx], self._status[slot, idx]
+            if int(meta["seq"][slot]) == s1:
+                return ts, bpm, status, written
+
+    def tail(self, slot: int, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ts, bpm, status, _ = self._read(slot, n)
+        return ts, bpm, status
+
+    def count(self, slot: int) -> int:
+        return int(self._meta["count"][slot])
+
+    def written(self, slot: int) -> int:
+        return int(self._meta["written"][slot])
+
+    def changes(self, seen: Dict[int, int], baseline: bool = True) -> List[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]:
+        """seen(slot → 본 written 값) 이후 새로 추가된 샘플, seen은 갱신됨
+
+        다른 워커가 받은 샘플을 이 워커의 실시간 통계와 SSE 구독자에게 전달할 때 쓴다.
+        seen에 없는 slot은 baseline이면 지금 위치부터 보고, 아니면 처음부터 돌려준다.
+        """
+        out = []
+        for slot in self.used_slots():
+            last = seen.get(slot)
+            now = self.written(slot)
+            if last is None:
+                if baseline:
+                    seen[slot] = now
+                    continue
+                last = 0
+            if now == last:
+                continue
+            ts, bpm, status, written = self._read(slot, 0, since=last)
+            seen[slot] = written
+            out.append((self.dog_id(slot), ts, bpm, status))
+        return out
+
+
+class SharedRingBuffer:
+    """DogRingBuffer와 같은 인터페이스로 SharedState의 slot 하나를 감쌈"""
+
+    __slots__ = ("shared", "slot")
+
+    def __init__(self, shared: SharedState, slot: int):
+        self.shared = shared
+        self.slot = slot
+
+    @property
+    def capacity(self) -> int:
+        return self.shared.capacity
+
+    def __len__(self):
+        return self.shared.count(self.slot)
+
+    def append(self, ts: float, bpm: int, status: str):
+        self.shared.append(self.slot, (ts,), (bpm,), (STATUS_CODES.get(status, 0),))
+
+    def extend(self, ts, bpm, status):
+        codes = [STATUS_CODES.get(s, 0) for s in status]
+        self.shared.append(self.slot, ts, bpm, codes)
+
+    def tail(self, n: int):
+        return self.shared.tail(self.slot, n)
+
+    def last(self) -> Optional[dict]:
+        ts, bpm, status = self.tail(1)
+        if not len(ts):
+            return None
+        return {"ts": float(ts[0]), "bpm": int(bpm[0]), "status": STATUS_NAMES[status[0]]}
+
+    def last_bpm(self) -> Optional[int]:
+        _, bpm, _ = self.tail(1)
+        return int(bpm[0]) if len(bpm) else None
+
+    def tail_dicts(self, n: int):
+        ts, bpm, status = self.tail(n)
+        return [{"ts": t, "bpm": b, "status": STATUS_NAMES[s]}
+                for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())]
@@ -0,0 +1,87 @@
+import asyncio
+import json
+from collections import deque
+from typing import Dict, Optional, Set
+
+
+class Subscriber:
+    """구독자 한 명의 대기열 (가득 차면 가장 오래된 항목부터 버림)"""
+
+    __slots__ = ("dog_id", "queue", "event", "dropped")
+
+    def __init__(self, dog_id: Optional[str], max_queue: int):
+        self.dog_id = dog_id
+        self.queue: deque = deque(maxlen=max_queue)
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, message: str):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(message)
+        self.event.set()
+
+
+class Broadcaster:
+    """수집된 심박을 dog_id별 구독자에게 바로 전달 (프로세스 내 fan-out)
+
+    dog_id=None으로 구독하면 모든 강아지의 샘플을 받는다.
+    """
+
+    def __init__(self, max_queue: int = 64, keepalive: float = 15.0):
+        self.max_queue = max_queue
+        self.keepalive = keepalive
+        self._subs: Dict[Optional[str], Set[Subscriber]] = {}
+        self.published = 0
+
+    def subscribe(self, dog_id: Optional[str]) -> Subscriber:
+        sub = Subscriber(dog_id, self.max_queue)
+        self._subs.setdefault(dog_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        subs = self._subs.get(sub.dog_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.dog_id]
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subs)
+
+    def publish(self, dog_id: str, item: dict):
+        targets = self._subs.get(dog_id)
+        everyone = self._subs.get(None)
+        if not targets and not everyone:
+            return  # 구독자 없으면 직렬화도 하지 않음
+        message = json.dumps(item, separators=(",", ":"))
+        for subs in (targets, everyone):
+            if subs:
+                for sub in subs:
+                    sub.push(message)
+        self.published += 1
+
+    async def sse(self, sub: Subscriber):
+        """Server-Sent Events 본문 생성기"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(sub.event.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                sub.event.clear()
+                while sub.queue:
+                    yield f"event: heartbeat\ndata: {sub.queue.popleft()}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        subs = [s for group in self._subs.values() for s in group]
+        return {
+            "subscribers": len(subs),
+            "dogs": len([k for k in self._subs if k is not None]),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in subs),
+        }
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bpm_blocks import create_block_table, sealed_ts
+from bpm_buffer import STATUS_CODES
+from bpm_schema import DogKeys, to_ms
+
+# 저장할 샘플 한 개: (dog_id, ts epoch seconds, bpm, status)
+Row = Tuple[str, float, int, str]
+
+log = logging.getLogger("bpm.writer")
+
+
+def _existing_ts(conn: sqlite3.Connection, dog_key: int, ts_ms: List[int]) -> set:
+    """ts_ms 중 bpm_data에 이미 있는 값 (수집 배치는 시간 범위가 좁아 (dog_key, ts) 인덱스 범위 한 번으로 읽음)"""
+    wanted = set(ts_ms)
+    rows = conn.execute("SELECT ts FROM bpm_data WHERE dog_key = ? AND ts BETWEEN ? AND ?",
+                        (dog_key, min(wanted), max(wanted)))
+    return wanted.intersection(t for t, in rows)
+
+
+class StorageWriter:
+    """bpm_data 쓰기 전용 write-behind 저장기
+
+    핸들러는 행을 큐에 넣기만 하고, 백그라운드 태스크가
+    batch_size 행 또는 flush_interval 초마다 한 번에 커밋한다.
+    put_many로 넣은 묶음은 나누지 않고 한 트랜잭션에 들어간다 (max_queue도 묶음 단위).
+    커밋이 실패하면 같은 행을 retry_delay부터 두 배씩 늘려 max_retries번 다시 시도하고,
+    그래도 실패하면 버리고 dropped_rows로 센다.
+    이미 있는 (강아지, ts ms) 샘플은 bpm_data든 봉인된 블록이든 무시하고
+    duplicate_rows로 센다 (재전송, 겹친 import).
+    hooks는 (conn, rows)를 받아 같은 트랜잭션 안에서 실행되고 (예: 롤업 갱신),
+    after_commit은 (rows)를 받아 커밋이 끝난 뒤 실행된다 (예: 캐시 무효화).
+    두 경우 모두 rows는 실제로 들어간 행만이다.
+    observe는 (커밋 소요 초, 행 수)를 받는다 (예: 지연 히스토그램).
+    """
+
+    def __init__(self, db_file: str, batch_size: int = 200,
+                 flush_interval: float = 0.25, max_queue: int = 10_000,
+                 max_retries: int = 3, retry_delay: float = 0.1,
+                 hooks: Optional[List[Callable]] = None,
+                 after_commit: Optional[List[Callable]] = None,
+                 observe: Optional[Callable[[float, int], None]] = None):
+        self.db_file = db_file
+        self.hooks = list(hooks or [])
+        self.after_commit = list(after_commit or [])
+        self.observe = observe
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._dog_keys = DogKeys()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # 통계
+        self.enqueued = 0
+        self.pending_rows = 0  # 큐에 들어 있는 행 수
+        self.committed_rows = 0
+        self.duplicate_rows = 0
+        self.commits = 0
+        self.failed_commits = 0
+        self.retried_commits = 0
+        self.dropped_rows = 0  # 재시도 끝에 버린 행 수
+        self.callback_errors = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self.total_commit_ms = 0.0
+
+    # ===== 수명 주기 =====
+    def _open(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        create_block_table(conn)
+        return conn
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # 커밋은 항상 같은 스레드에서 (연결 하나를 계속 사용)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bpm-writer")
+        self._conn = await loop.run_in_executor(self._executor, self._open)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """남은 행을 모두 커밋한 뒤 연결을 닫음 (실행기는 start()마다 새로 만들므로 다시 start 가능)"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._conn.close)
+        self._conn = None
+        self._executor.shutdown(wait=True)
+
+    # ===== 쓰기 =====
+    async def put(self, row: Row):
+        await self.put_many([row])
+
+    async def put_many(self, rows: List[Row]):
+        """rows를 한 묶음으로 큐에 넣음 (같은 트랜잭션에 커밋됨)"""
+        if not rows:
+            return
+        # 큐가 가득 차면 여기서 대기 (backpressure)
+        await self._queue.put(list(rows))
+        self.enqueued += len(rows)
+        self.pending_rows += len(rows)
+
+    async def execute(self, fn: Callable, *args):
+        """fn(conn, *args)를 저장기 연결의 한 트랜잭션으로 실행 (강아지 등록 같은 작은 쓰기)
+
+        커밋 스레드에서 돌기 때문에 수집 배치와 순서대로 처리되고
+        쓰기 잠금을 두고 다투지 않는다.
+        """
+        def run():
+            with self._conn:
+                return fn(self._conn, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, run)
+
+    def _commit(self, rows: List[Row]) -> List[Row]:
+        """들어간 행만 반환
+
+        executemany는 행별 결과를 주지 않으므로 이미 있는 (강아지, ts)를 먼저 읽어 걸러 낸 뒤
+        남은 행만 한 번에 넣는다. 같은 트랜잭션 안이라 그 사이에 다른 워커가 끼어들면
+        커밋이 실패하고 _flush가 다시 시도한다.
+        """
+        conn = self._conn
+        sql = "INSERT OR IGNORE INTO bpm_data (dog_key, ts, bpm, status) VALUES (?, ?, ?, ?)"
+        with conn:
+            keyed = [(self._dog_keys.key(conn, row[0]), to_ms(row[1]), row) for row in rows]
+            by_dog: Dict[int, List[int]] = {}
+            for dog_key, ts_ms, _ in keyed:
+                by_dog.setdefault(dog_key, []).append(ts_ms)
+            # bpm_data에 있는 샘플 + 이미 블록으로 옮겨진 시간대에 다시 온 샘플 (UNIQUE로 못 거름)
+            taken = set()
+            for dog_key, ts_list in by_dog.items():
+                taken.update((dog_key, t) for t in _existing_ts(conn, dog_key, ts_list))
+                taken.update((dog_key, t) for t in sealed_ts(conn, dog_key, ts_list))
+            inserted, params = [], []
+            for dog_key, ts_ms, row in keyed:
+                if (dog_key, ts_ms) in taken:
+                    continue
+                taken.add((dog_key, ts_ms))  # 같은 배치 안에서는 먼저 온 행만
+                _, _, bpm, status = row
+                params.append((dog_key, ts_ms, bpm, STATUS_CODES.get(status, 0)))
+                inserted.append(row)
+            conn.executemany(sql, params)
+            if inserted:
+                for hook in self.hooks:
+                    hook(self._conn, inserted)
+        return inserted
+
+    async def _flush(self, rows: List[Row]):
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                inserted = await loop.run_in_executor(self._executor, self._commit, rows)
+                break
+            except sqlite3.Error as e:
+                self.failed_commits += 1
+                log.error("bpm_data commit failed (attempt %d): %s", attempt + 1, e)
+            except Exception:
+                # 훅 오류도 트랜잭션째 롤백됨
+                self.failed_commits += 1
+                log.exception("bpm_data commit hook failed (attempt %d, %d rows rolled back)", attempt + 1, len(rows))
+            if attempt >= self.max_retries:
+                # 저장 루프는 계속 (다음 배치까지 막지 않음)
+                self.dropped_rows += len(rows)
+                log.error("bpm_data commit gave up after %d attempts: dropped %d rows", attempt + 1, len(rows))
+                return
+            # 같은 행을 그대로 다시 (뒤 배치는 기다림, 순서 유지)
+            await asyncio.sleep(self.retry_delay * 2 ** attempt)
+            attempt += 1
+            self.retried_commits += 1
+        elapsed = (time.perf_counter() - t0) * 1000
+        if self.observe is not None:
+            self.observe(elapsed / 1000, len(rows))
+        self.commits += 1
+        self.committed_rows += len(inserted)
+        self.duplicate_rows += len(rows) - len(inserted)
+        self.last_commit_ms = elapsed
+        self.max_commit_ms = max(self.max_commit_ms, elapsed)
+        self.total_commit_ms += elapsed
+        if inserted:
+            for callback in self.after_commit:
+                try:
+                    callback(inserted)
+                except Exception:
+                    self.callback_errors += 1
+                    log.exception("after_commit callback %r failed", callback)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            rows = await self._queue.get()
+            if rows is None:
+                break
+            # 묶음 단위로 모음 (batch_size를 넘는 묶음도 나누지 않음)
+            batch = list(rows)
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    rows = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if rows is None:
+                    closing = True
+                    break
+                batch.extend(rows)
+            self.pending_rows -= len(batch)
+            await self._flush(batch)
+
+        # 종료 시점에 남은 행 정리
+        rest = []
+        while not self._queue.empty():
+            rows = self._queue.get_nowait()
+            if rows is not None:
+                rest.extend(rows)
+        if rest:
+            self.pending_rows -= len(rest)
+            await self._flush(rest)
+
+    # ===== 통계 =====
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.pending_rows,
+            "queue_batches": self._queue.qsize() if self._queue else 0,
+            "queue_max": self.max_queue,
+            "enqueued": self.enqueued,
+            "committed_rows": self.committed_rows,
+            "duplicate_rows": self.duplicate_rows,
+            "commits": self.commits,
+            "failed_commits": self.failed_commits,
+            "retried_commits": self.retried_commits,
+            "dropped_rows": self.dropped_rows,
+            "callback_errors": self.callback_errors,
+            "last_commit_ms": round(self.last_commit_ms, 3),
+            "max_commit_ms": round(self.max_commit_ms, 3),
+            "avg_commit_ms": round(self.total_commit_ms / self.commits, 3) if self.commits else 0.0,
+        }
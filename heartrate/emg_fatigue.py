@@ -0,0 +1,339 @@
+"""EMG 누적 피로도 엔진 (shieldf_py/esp32f.py 모델의 서버 포팅)
+
+ESP32 한 대가 쉴드 하나만 처리하던 계산을, 여러 강아지 세션에 대해
+NumPy로 한 번에 수행한다.
+
+- 1초 RMS 창: 각 계산 시점 T에서 (T-1000ms, T] 구간, 최대 CAP개 샘플
+- 계산 주기: 마지막 계산 후 1000ms 이상 지난 샘플이 들어온 시점 (esp32f의 millis() 대신 샘플 시각)
+- CALIB_REST 10초 동안 RMS_rest 추정 후 RUN 단계에서 S_t / F_t 누적
+"""
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# ===== 피로도 계산 파라미터 (esp32f.py와 동일) =====
+WINDOW_MS = 1000    # 1초 RMS 창
+REST_MS = 10000     # 휴식 캘리브 10초
+EPS_DENOM = 1e-9
+CAP = 2000          # RMS 링버퍼 크기
+
+ALPHA = 0.6
+K_INTENSITY = 4.5
+GAMMA_ACTIVE = 0.010
+GAMMA_REST = 0.035
+BASELINE_S = 26.0
+
+# 세션 재생 시 바꿔 볼 수 있는 값 (FatigueEngine(params=...))
+DEFAULT_PARAMS = {
+    "rest_ms": REST_MS,
+    "alpha": ALPHA,
+    "k_intensity": K_INTENSITY,
+    "gamma_active": GAMMA_ACTIVE,
+    "gamma_rest": GAMMA_REST,
+    "baseline_s": BASELINE_S,
+}
+
+CALIB_REST, RUN = 0, 1
+PHASE_NAMES = ["CALIB_REST", "RUN"]
+
+
+def create_tables(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS emg_fatigue (
+        dog_id TEXT,
+        session_ts INTEGER,  -- 세션 시작 (epoch ms)
+        ts INTEGER,          -- 계산 시점 (epoch ms)
+        rms REAL,
+        s_t REAL,
+        fatigue REAL,
+        phase INTEGER
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_emg_fatigue_dog_ts ON emg_fatigue (dog_id, ts)")
+
+
+def save_ticks(db_file: str, ticks: List[tuple]):
+    """step() 결과 (dog_id, session_ts, ts, rms, s_t, fatigue, phase)를 저장"""
+    if not ticks:
+        return
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.executemany(
+            "INSERT INTO emg_fatigue (dog_id, session_ts, ts, rms, s_t, fatigue, phase) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ticks
+        )
+    conn.close()
+
+
+def window_rms(ts: np.ndarray, sq: np.ndarray, end_idx: np.ndarray, tick_ts: np.ndarray) -> np.ndarray:
+    """각 계산 시점의 1초 RMS (end_idx는 계산 시점 샘플 위치, 포함)
+
+    sq는 샘플 제곱. 계산 시점은 1000ms 이상 떨어져 창이 겹치지 않으므로
+    창마다 따로 더한다 (긴 누적합의 차이로 구하면 조용한 구간에서 자릿수를 잃음).
+    """
+    start = np.searchsorted(ts, tick_ts - WINDOW_MS, side="right")
+    start = np.maximum(start, end_idx + 1 - CAP)
+    count = end_idx + 1 - start
+    bounds = np.empty(2 * len(start), dtype=np.int64)
+    bounds[0::2] = start
+    bounds[1::2] = end_idx + 1
+    sums = np.add.reduceat(np.append(sq, 0.0), bounds)[0::2]
+    m2 = np.where(count > 0, sums, 0.0) / np.maximum(count, 1)
+    return np.where((count > 0) & (m2 > 0), np.sqrt(np.maximum(m2, 0.0)), 0.0)
+
+
+class FatigueEngine:
+    """강아지별 EMG 세션 상태를 슬롯 배열로 보관하고 1초 갱신을 벡터화"""
+
+    def __init__(self, initial_slots: int = 64, params: Optional[dict] = None):
+        unknown = set(params or {}) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"unknown fatigue params: {sorted(unknown)}")
+        self.params = {**DEFAULT_PARAMS, **{k: float(v) for k, v in (params or {}).items()}}
+        self._slots: Dict[str, int] = {}
+        self._dog_ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._alloc(initial_slots)
+
+        # 세션별 아직 계산에 쓰이지 않은 샘플 (t > t_last)
+        self._ts: Dict[int, np.ndarray] = {}
+        self._val: Dict[int, np.ndarray] = {}
+
+    def _alloc(self, n: int):
+        def grow(name, dtype, fill=0):
+            old = getattr(self, name, None)
+            arr = np.full(n, fill, dtype=dtype)
+            if old is not None:
+                arr[:len(old)] = old
+            setattr(self, name, arr)
+
+        start = len(self._dog_ids)
+        grow("phase", np.int8)
+        grow("rest_count", np.int64)
+        grow("t_start", np.float64)
+        grow("t_last", np.float64)
+        grow("rms_rest", np.float64)
+        grow("rms_max", np.float64, 1.0)
+        grow("s_prev", np.float64)
+        grow("f_prev", np.float64)
+        grow("fatigue", np.float64)
+        grow("last_rms", np.float64)
+        grow("last_emg", np.float64)
+        grow("last_sample", np.float64, -np.inf)
+        self._dog_ids.extend([None] * (n - start))
+        self._free.extend(range(n - 1, start - 1, -1))
+
+    # ===== 세션 =====
+    def start(self, dog_id: str, t0_ms: float) -> int:
+        """새 세션 시작 (CALIB_REST부터 다시)"""
+        slot = self._slots.get(dog_id)
+        if slot is None:
+            if not self._free:
+                self._alloc(len(self._dog_ids) * 2)
+            slot = self._free.pop()
+            self._slots[dog_id] = slot
+            self._dog_ids[slot] = dog_id
+        self.phase[slot] = CALIB_REST
+        self.rest_count[slot] = 0
+        self.t_start[slot] = t0_ms
+        self.t_last[slot] = t0_ms
+        self.rms_rest[slot] = 0.0
+        self.rms_max[slot] = 1.0
+        self.s_prev[slot] = 0.0
+        self.f_prev[slot] = 0.0
+        self.fatigue[slot] = 0.0
+        self.last_rms[slot] = 0.0
+        self.last_emg[slot] = 0.0
+        self.last_sample[slot] = -np.inf
+        self._ts[slot] = np.empty(0, dtype=np.float64)
+        self._val[slot] = np.empty(0, dtype=np.float64)
+        return slot
+
+    def stop(self, dog_id: str) -> bool:
+        slot = self._slots.pop(dog_id, None)
+        if slot is None:
+            return False
+        self._dog_ids[slot] = None
+        self._ts.pop(slot, None)
+        self._val.pop(slot, None)
+        self._free.append(slot)
+        return True
+
+    def dog_ids(self) -> List[str]:
+        return list(self._slots)
+
+    # ===== 샘플 =====
+    def ingest(self, dog_id: str, ts_ms, values) -> int:
+        """샘플 묶음 추가 (NaN 및 이미 받은 시각 이전 샘플은 무시), 추가된 개수 반환"""
+        ts_ms = np.asarray(ts_ms, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        ok = ~np.isnan(values)
+        ts_ms, values = ts_ms[ok], values[ok]
+        if len(ts_ms) == 0:
+            return 0
+        order = np.argsort(ts_ms, kind="stable")
+        ts_ms, values = ts_ms[order], values[order]
+
+        slot = self._slots.get(dog_id)
+        if slot is None:
+            slot = self.start(dog_id, float(ts_ms[0]))
+        keep = ts_ms >= self.last_sample[slot]
+        ts_ms, values = ts_ms[keep], values[keep]
+        if len(ts_ms) == 0:
+            return 0
+
+        self._ts[slot] = np.concatenate([self._ts[slot], ts_ms])
+        self._val[slot] = np.concatenate([self._val[slot], values])
+        self.last_sample[slot] = ts_ms[-1]
+        self.last_emg[slot] = values[-1]
+        return len(ts_ms)
+
+    # ===== 1초 갱신 =====
+    def _ticks(self, slot: int):
+        """세션 하나의 대기 샘플에서 계산 시점과 RMS를 구함"""
+        ts = self._ts[slot]
+        if len(ts) == 0:
+            return None
+        t_last = self.t_last[slot]
+        ends = []
+        i = np.searchsorted(ts, t_last + 1000, side="left")
+        while i < len(ts):
+            ends.append(i)
+            i = np.searchsorted(ts, ts[i] + 1000, side="left")
+        if not ends:
+            return None
+        end_idx = np.asarray(ends)
+        tick_ts = ts[end_idx]
+        vals = self._val[slot]
+        rms = window_rms(ts, vals * vals, end_idx, tick_ts)
+        return tick_ts, rms
+
+    def _update(self, idx: np.ndarray, tick_ts: np.ndarray, rms: np.ndarray):
+        """슬롯 idx들의 한 번의 1초 갱신 (esp32f.py loop()의 계산부)"""
+        p = self.params
+        phase = self.phase[idx]
+        calib = phase == CALIB_REST
+        run = ~calib
+
+        # ---- CALIB_REST ----
+        if calib.any():
+            c = idx[calib]
+            r = rms[calib]
+            self.rest_count[c] += 1
+            rest = np.where(self.rest_count[c] == 1, r, 0.85 * self.rms_rest[c] + 0.15 * r)
+            done = tick_ts[calib] - self.t_start[c] >= p["rest_ms"]
+            rest = np.where(done & (rest < EPS_DENOM), EPS_DENOM, rest)
+            self.rms_rest[c] = rest
+            self.rms_max[c] = np.where(done, np.maximum(rest * 1.3, rest + 0.005), self.rms_max[c])
+            self.phase[c] = np.where(done, RUN, CALIB_REST)
+            self.fatigue[c] = 0.0
+
+        # ---- RUN ----
+        if run.any():
+            u = idx[run]
+            r = rms[run]
+            rest = self.rms_rest[u]
+            rms_max = np.maximum(0.990 * self.rms_max[u], r)
+            denom = rms_max - rest
+            floor_den = np.maximum(0.05 * rest, EPS_DENOM)
+            denom = np.where(denom < floor_den, floor_den, denom)
+            r_t = np.clip((r - rest) / denom, 0.0, 1.0)
+            s_raw = 100.0 * np.sqrt(r_t)
+            s_raw = np.where(r_t > 0.03, np.minimum(100.0, s_raw + 5.0), s_raw)
+            s_t = p["alpha"] * s_raw + (1.0 - p["alpha"]) * self.s_prev[u]
+            gamma = np.where(s_t < 20.0, p["gamma_rest"], p["gamma_active"])
+            delta = (s_t - p["baseline_s"]) / p["k_intensity"]
+            f_t = np.clip(self.f_prev[u] + delta - gamma, 0.0, 100.0)
+            self.rms_max[u] = rms_max
+            self.fatigue[u] = f_t
+            self.s_prev[u] = s_t
+            self.f_prev[u] = f_t
+
+        self.t_last[idx] = tick_ts
+        self.last_rms[idx] = rms
+
+    def step(self) -> List[tuple]:
+        """모든 세션의 대기 샘플을 처리
+
+        k번째 계산 시점들을 세션 전체에 대해 한 번에 갱신한다.
+        반환: (dog_id, session_ts, ts, rms, s_t, fatigue, phase) 목록
+        """
+        pending = {}
+        for slot in self._slots.values():
+            ticks = self._ticks(slot)
+            if ticks is not None:
+                pending[slot] = ticks
+        if not pending:
+            return []
+
+        slots = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        n_ticks = np.array([len(pending[s][0]) for s in slots])
+        width = int(n_ticks.max())
+        tick_mat = np.full((len(slots), width), np.nan)
+        rms_mat = np.zeros((len(slots), width))
+        for row, s in enumerate(slots):
+            t, r = pending[s]
+            tick_mat[row, :len(t)] = t
+            rms_mat[row, :len(r)] = r
+
+        out = []
+        for k in range(width):
+            active = n_ticks > k
+            idx = slots[active]
+            tick_ts = tick_mat[active, k]
+            self._update(idx, tick_ts, rms_mat[active, k])
+            for s, t in zip(idx.tolist(), tick_ts.tolist()):
+                out.append((self._dog_ids[s], int(self.t_start[s]), int(t), float(self.last_rms[s]),
+                            float(self.s_prev[s]), float(self.fatigue[s]), int(self.phase[s])))
+
+        # 마지막 계산 시점 이후 샘플만 남김
+        for s in slots.tolist():
+            keep = self._ts[s] > self.t_last[s]
+            self._ts[s] = self._ts[s][keep]
+            self._val[s] = self._val[s][keep]
+        return out
+
+    # ===== 조회 =====
+    def snapshot(self, dog_id: str) -> Optional[dict]:
+        slot = self._slots.get(dog_id)
+        if slot is None:
+            return None
+        return {
+            "dog_id": dog_id,
+            "emg": float(self.last_emg[slot]),
+            "fatigue": float(self.fatigue[slot]),
+            "rms": float(self.last_rms[slot]),
+            "phase": PHASE_NAMES[self.phase[slot]],
+            "session_ts": int(self.t_start[slot]),
+            "ts": int(self.t_last[slot]),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._slots),
+            "pending_samples": int(sum(len(self._ts[s]) for s in self._slots.values())),
+        }
+
+
+# ===== 저장된 세션 재생 =====
+def replay(chunks: Iterable[Tuple[np.ndarray, np.ndarray]], params: Optional[dict] = None,
+           t0_ms: Optional[float] = None) -> List[tuple]:
+    """(ts, values) 묶음을 시각 순으로 새 엔진에 흘려 계산 시점 전체를 반환
+
+    emg_store의 memmap 조각을 그대로 넘기면 전체 파일을 메모리에 올리지 않고
+    몇 시간 분량을 다른 파라미터로 다시 계산할 수 있다.
+    반환: (ts, rms, s_t, fatigue, phase) 목록
+    """
+    engine = FatigueEngine(initial_slots=1, params=params)
+    out = []
+    for ts, values in chunks:
+        if len(ts) == 0:
+            continue
+        if t0_ms is None:
+            t0_ms = float(ts[0])
+        if not engine.dog_ids():
+            engine.start("replay", t0_ms)
+        engine.ingest("replay", ts, values)
+        out.extend(tick[2:] for tick in engine.step())
+    return out
@@ -0,0 +1,150 @@
+"""EMG 주파수 분석 (Median / Mean Power Frequency)
+
+채널별 슬라이딩 창(기본 1초, 0.5초 간격)마다 Welch PSD를 구해
+MDF(중앙 주파수)와 MNF(평균 주파수)를 계산한다. 같은 샘플링 주파수의
+준비된 창들은 세션/채널과 상관없이 한 번의 rfft 호출로 처리한다.
+"""
+import sqlite3
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def create_tables(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS emg_spectral (
+        dog_id TEXT,
+        channel INTEGER,
+        ts INTEGER,      -- 창 끝 시각 (epoch ms)
+        mdf REAL,
+        mnf REAL,
+        power REAL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_emg_spectral_dog_ts ON emg_spectral (dog_id, ts)")
+
+
+def save_windows(db_file: str, rows: List[tuple]):
+    """step() 결과 (dog_id, channel, ts, mdf, mnf, power)를 저장"""
+    if not rows:
+        return
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.executemany(
+            "INSERT INTO emg_spectral (dog_id, channel, ts, mdf, mnf, power) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    conn.close()
+
+
+def welch_psd(x: np.ndarray, fs: float, nperseg: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(창 개수, N) 배열의 창별 Welch PSD (Hann, 50% 겹침, 세그먼트별 평균 제거)
+
+    scipy.signal.welch(x, fs, nperseg=nperseg, axis=-1)의 기본값(detrend="constant")과 같다.
+    """
+    step = nperseg // 2
+    segs = sliding_window_view(x, nperseg, axis=-1)[:, ::step]  # (W, S, nperseg)
+    segs = segs - segs.mean(axis=-1, keepdims=True)
+    win = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(nperseg) / nperseg)  # periodic Hann
+    spec = np.fft.rfft(segs * win, axis=-1)
+    psd = (spec.real ** 2 + spec.imag ** 2).mean(axis=1) / (fs * (win ** 2).sum())
+    psd[:, 1:-1] *= 2  # 단측 스펙트럼
+    return np.fft.rfftfreq(nperseg, 1.0 / fs), psd
+
+
+def median_mean_frequency(freqs: np.ndarray, psd: np.ndarray, f_lo: float, f_hi: float):
+    """창별 MDF, MNF, 대역 전력"""
+    band = (freqs >= f_lo) & (freqs <= f_hi)
+    if not band.any():
+        zeros = np.zeros(len(psd))
+        return zeros, zeros.copy(), zeros.copy()
+    f = freqs[band]
+    p = psd[:, band]
+    total = p.sum(axis=1)
+    safe = np.where(total > 0, total, 1.0)
+    mnf = (p * f).sum(axis=1) / safe
+
+    # 누적 전력이 절반을 넘는 지점을 bin 사이에서 선형 보간
+    cum = np.cumsum(p, axis=1)
+    half = total / 2
+    k = np.argmax(cum >= half[:, None], axis=1)
+    rows = np.arange(len(k))
+    prev = np.where(k > 0, cum[rows, k - 1], 0.0)
+    step = cum[rows, k] - prev
+    frac = np.where(step > 0, (half - prev) / np.where(step > 0, step, 1.0), 0.0)
+    f_prev = np.where(k > 0, f[np.maximum(k - 1, 0)], f[0])
+    mdf = f_prev + frac * (f[k] - f_prev)
+
+    zero = total <= 0
+    mdf[zero] = 0.0
+    mnf[zero] = 0.0
+    return mdf, mnf, total
+
+
+class SpectralStage:
+    """(dog_id, channel)별 스트림의 MDF/MNF 계산"""
+
+    def __init__(self, window_s: float = 1.0, hop_s: float = 0.5, segments: int = 4,
+                 f_lo: float = 20.0, f_hi: float = 450.0):
+        self.window_s = window_s
+        self.hop_s = hop_s
+        self.segments = segments
+        self.f_lo = f_lo
+        self.f_hi = f_hi
+        self._streams: Dict[Tuple[str, int], dict] = {}
+        self.latest: Dict[Tuple[str, int], dict] = {}
+
+    def ingest(self, dog_id: str, channel: int, ts_ms, values, fs: float):
+        ts_ms = np.asarray(ts_ms, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        ok = ~np.isnan(values)
+        ts_ms, values = ts_ms[ok], values[ok]
+        key = (dog_id, channel)
+        st = self._streams.get(key)
+        if st is None or st["fs"] != fs:
+            st = self._streams[key] = {"fs": fs, "val": np.empty(0), "ts": np.empty(0)}
+        st["val"] = np.concatenate([st["val"], values])
+        st["ts"] = np.concatenate([st["ts"], ts_ms])
+
+    def remove(self, dog_id: str):
+        for key in [k for k in self._streams if k[0] == dog_id]:
+            del self._streams[key]
+            self.latest.pop(key, None)
+
+    def step(self) -> List[tuple]:
+        """준비된 창을 모두 계산, (dog_id, channel, ts, mdf, mnf, power) 목록 반환"""
+        groups: Dict[float, list] = {}
+        for key, st in self._streams.items():
+            fs = st["fs"]
+            n = int(round(self.window_s * fs))
+            hop = max(1, int(round(self.hop_s * fs)))
+            count = len(st["val"])
+            if count < n:
+                continue
+            k = 1 + (count - n) // hop
+            windows = sliding_window_view(st["val"], n)[::hop][:k]
+            ends = st["ts"][np.arange(k) * hop + n - 1]
+            groups.setdefault(fs, []).append((key, windows, ends))
+            # 다음 창 시작부터 보관
+            st["val"] = st["val"][k * hop:]
+            st["ts"] = st["ts"][k * hop:]
+
+        out = []
+        for fs, items in groups.items():
+            x = np.concatenate([w for _, w, _ in items])
+            n = x.shape[1]
+            nperseg = max(16, 2 * n // (self.segments + 1))
+            freqs, psd = welch_psd(x, fs, min(nperseg, n))
+            mdf, mnf, power = median_mean_frequency(freqs, psd, self.f_lo, min(self.f_hi, fs / 2))
+            row = 0
+            for (dog_id, channel), _, ends in items:
+                for t in ends.tolist():
+                    out.append((dog_id, channel, int(t), float(mdf[row]), float(mnf[row]), float(power[row])))
+                    row += 1
+                last = out[-1]
+                self.latest[(dog_id, channel)] = {"ts": last[2], "mdf": last[3], "mnf": last[4]}
+        return out
+
+    def snapshot(self, dog_id: str) -> Dict[int, dict]:
+        return {ch: v for (d, ch), v in self.latest.items() if d == dog_id}
@@ -0,0 +1,302 @@
+"""EMG 원본 파형 세션 저장소 (append-only 고정 폭 파일 + numpy.memmap 조회)
+
+강아지 × 세션(시작 시각 epoch ms)마다 디렉터리 하나, 채널마다 파일 두 개:
+
+    {root}/{dog_id}/{session_ts}/meta.json   dog_id, session_ts, 채널별 rate_hz
+    {root}/{dog_id}/{session_ts}/ch0.dat     RECORD 반복 (ts <f8 epoch ms, value <f4)
+    {root}/{dog_id}/{session_ts}/ch0.idx     INDEX_STRIDE개마다 (ts <f8, 위치 <i8)
+
+샘플은 시각 순으로만 붙인다 (마지막 시각보다 이전 샘플은 버림). 읽을 때는 .dat를
+memmap으로 열고 .idx로 범위를 좁힌 뒤 searchsorted로 구간을 찾아 복사 없이 잘라낸다.
+비정상 종료로 마지막 레코드가 잘렸으면 다시 열 때 온전한 레코드까지만 남기고,
+.idx는 .dat에서 언제든 다시 만들 수 있다.
+"""
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+RECORD = np.dtype([("ts", "<f8"), ("value", "<f4")])
+INDEX = np.dtype([("ts", "<f8"), ("pos", "<i8")])
+INDEX_STRIDE = 1024
+
+
+def _dog_dir(root: str, dog_id: str) -> str:
+    return os.path.join(root, quote(dog_id, safe=""))
+
+
+def _record_count(path: str) -> int:
+    return os.path.getsize(path) // RECORD.itemsize if os.path.exists(path) else 0
+
+
+def build_index(ts: np.ndarray) -> np.ndarray:
+    pos = np.arange(0, len(ts), INDEX_STRIDE, dtype=np.int64)
+    index = np.empty(len(pos), dtype=INDEX)
+    index["ts"] = ts[pos]
+    index["pos"] = pos
+    return index
+
+
+# ===== 쓰기 =====
+class _ChannelWriter:
+    __slots__ = ("dat", "idx", "count", "last_ts")
+
+    def __init__(self, base: str):
+        dat_path, idx_path = base + ".dat", base + ".idx"
+        count = _record_count(dat_path)
+        if os.path.exists(dat_path) and os.path.getsize(dat_path) != count * RECORD.itemsize:
+            os.truncate(dat_path, count * RECORD.itemsize)  # 잘린 마지막 레코드
+        last_ts = -np.inf
+        if count:
+            data = np.memmap(dat_path, dtype=RECORD, mode="r")
+            last_ts = float(data["ts"][-1])
+            expected = (count + INDEX_STRIDE - 1) // INDEX_STRIDE
+            if not os.path.exists(idx_path) or os.path.getsize(idx_path) != expected * INDEX.itemsize:
+                build_index(data["ts"]).tofile(idx_path)
+            del data
+        self.dat = open(dat_path, "ab")
+        self.idx = open(idx_path, "ab")
+        self.count = count
+        self.last_ts = last_ts
+
+    def append(self, ts: np.ndarray, values: np.ndarray) -> int:
+        keep = ts > self.last_ts
+        if not keep.all():
+            ts, values = ts[keep], values[keep]
+        n = len(ts)
+        if not n:
+            return 0
+        rec = np.empty(n, dtype=RECORD)
+        rec["ts"] = ts
+        rec["value"] = values
+        # 새로 INDEX_STRIDE 경계를 넘는 위치마다 색인 한 줄
+        first = -(-self.count // INDEX_STRIDE) * INDEX_STRIDE
+        pos = np.arange(first, self.count + n, INDEX_STRIDE, dtype=np.int64)
+        self.dat.write(rec.tobytes())
+        self.dat.flush()
+        if len(pos):
+            index = np.empty(len(pos), dtype=INDEX)
+            index["ts"] = ts[pos - self.count]
+            index["pos"] = pos
+            self.idx.write(index.tobytes())
+            self.idx.flush()
+        self.count += n
+        self.last_ts = float(ts[-1])
+        return n
+
+    def close(self):
+        self.dat.close()
+        self.idx.close()
+
+
+class _Session:
+    def __init__(self, path: str, dog_id: str, session_ts: int):
+        self.path = path
+        self.meta = {"dog_id": dog_id, "session_ts": session_ts, "rate_hz": {}}
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        self.channels: Dict[int, _ChannelWriter] = {}
+
+    def append(self, channel: int, ts: np.ndarray, values: np.ndarray, rate_hz: float) -> int:
+        writer = self.channels.get(channel)
+        if writer is None:
+            writer = self.channels[channel] = _ChannelWriter(os.path.join(self.path, f"ch{channel}"))
+        if self.meta["rate_hz"].get(str(channel)) != rate_hz:
+            self.meta["rate_hz"][str(channel)] = rate_hz
+            self._save_meta()
+        return writer.append(ts, values)
+
+    def _save_meta(self):
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    def close(self):
+        for writer in self.channels.values():
+            writer.close()
+        self.channels.clear()
+
+
+class EmgStore:
+    """강아지별 현재 세션에 원본 EMG 샘플을 이어 붙이고, 지난 세션을 조회"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._open: Dict[str, _Session] = {}
+        self.samples = 0
+        self.dropped = 0
+
+    def start(self, dog_id: str, session_ts: float) -> int:
+        """새 세션 시작 (같은 강아지의 이전 세션 파일은 닫음)"""
+        self.stop(dog_id)
+        session_ts = int(session_ts)
+        path = os.path.join(_dog_dir(self.root, dog_id), str(session_ts))
+        os.makedirs(path, exist_ok=True)
+        session = self._open[dog_id] = _Session(path, dog_id, session_ts)
+        session._save_meta()
+        return session_ts
+
+    def stop(self, dog_id: str) -> bool:
+        session = self._open.pop(dog_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def current(self, dog_id: str) -> Optional[int]:
+        session = self._open.get(dog_id)
+        return session.meta["session_ts"] if session is not None else None
+
+    def append(self, dog_id: str, channel: int, ts_ms, values, rate_hz: float) -> int:
+        """시각 순 샘플 묶음 추가 (세션이 없으면 첫 샘플 시각으로 시작), 저장한 개수 반환"""
+        ts = np.asarray(ts_ms, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float32)
+        if not len(ts):
+            return 0
+        if len(ts) > 1 and (np.diff(ts) < 0).any():
+            order = np.argsort(ts, kind="stable")
+            ts, values = ts[order], values[order]
+        if dog_id not in self._open:
+            self.start(dog_id, ts[0])
+        n = self._open[dog_id].append(int(channel), ts, values, float(rate_hz))
+        self.samples += n
+        self.dropped += len(ts) - n
+        return n
+
+    def close(self):
+        for dog_id in list(self._open):
+            self.stop(dog_id)
+
+    # ===== 조회 =====
+    def sessions(self, dog_id: str) -> List[dict]:
+        base = _dog_dir(self.root, dog_id)
+        if not os.path.isdir(base):
+            return []
+        out = []
+        for name in sorted(os.listdir(base), key=lambda s: int(s) if s.isdigit() else -1):
+            if not name.isdigit():
+                continue
+            channels = {}
+            for ch in self.channels(dog_id, int(name)):
+                reader = self.reader(dog_id, int(name), ch)
+                channels[ch] = {"samples": len(reader), "first_ts": reader.first_ts,
+                                "last_ts": reader.last_ts, "rate_hz": reader.rate_hz}
+            out.append({"session_ts": int(name), "open": self.current(dog_id) == int(name), "channels": channels})
+        return out
+
+    def channels(self, dog_id: str, session_ts: int) -> List[int]:
+        path = os.path.join(_dog_dir(self.root, dog_id), str(session_ts))
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(f[2:-4]) for f in os.listdir(path) if f.startswith("ch") and f.endswith(".dat"))
+
+    def reader(self, dog_id: str, session_ts: int, channel: int = 0) -> Optional["EmgReader"]:
+        path = os.path.join(_dog_dir(self.root, dog_id), str(session_ts))
+        if not os.path.exists(os.path.join(path, f"ch{channel}.dat")):
+            return None
+        return EmgReader(path, channel)
+
+    def delete(self, dog_id: str, session_ts: int) -> bool:
+        if self.current(dog_id) == session_ts:
+            self.stop(dog_id)
+        path = os.path.join(_dog_dir(self.root, dog_id), str(session_ts))
+        if not os.path.isdir(path):
+            return False
+        shutil.rmtree(path)
+        return True
+
+    def dog_ids(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(unquote(name) for name in os.listdir(self.root))
+
+    def stats(self) -> dict:
+        return {"open_sessions": len(self._open), "samples": self.samples, "dropped": self.dropped}
+
+
+# ===== 읽기 =====
+class EmgReader:
+    """채널 파일 하나를 memmap으로 열어 시간 구간을 복사 없이 잘라냄 (연 시점까지의 샘플)"""
+
+    def __init__(self, session_path: str, channel: int):
+        base = os.path.join(session_path, f"ch{channel}")
+        self.channel = channel
+        n = _record_count(base + ".dat")
+        self.data = np.memmap(base + ".dat", dtype=RECORD, mode="r", shape=(n,)) if n else np.empty(0, RECORD)
+        n_idx = min(os.path.getsize(base + ".idx") // INDEX.itemsize if os.path.exists(base + ".idx") else 0,
+                    (n + INDEX_STRIDE - 1) // INDEX_STRIDE)
+        self.index = np.fromfile(base + ".idx", dtype=INDEX, count=n_idx) if n_idx else build_index(self.data["ts"])
+        with open(os.path.join(session_path, "meta.json")) as f:
+            self.rate_hz = json.load(f)["rate_hz"].get(str(channel))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def first_ts(self) -> Optional[float]:
+        return float(self.data["ts"][0]) if len(self.data) else None
+
+    @property
+    def last_ts(self) -> Optional[float]:
+        return float(self.data["ts"][-1]) if len(self.data) else None
+
+    def _locate(self, t: float) -> int:
+        """ts >= t 인 첫 위치 (색인으로 INDEX_STRIDE 구간을 고른 뒤 그 안에서만 탐색)"""
+        k = int(np.searchsorted(self.index["ts"], t, side="right")) - 1
+        if k < 0:
+            return 0
+        lo = int(self.index["pos"][k])
+        hi = min(lo + INDEX_STRIDE, len(self.data))
+        return lo + int(np.searchsorted(self.data["ts"][lo:hi], t, side="left"))
+
+    def range(self, from_ms: Optional[float] = None, to_ms: Optional[float] = None) -> Tuple[int, int]:
+        i = self._locate(from_ms) if from_ms is not None else 0
+        j = self._locate(to_ms) if to_ms is not None else len(self.data)
+        return i, max(i, j)
+
+    def slice(self, from_ms: Optional[float] = None, to_ms: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """[from_ms, to_ms) 구간의 (ts, value) memmap 뷰"""
+        i, j = self.range(from_ms, to_ms)
+        part = self.data[i:j]
+        return part["ts"], part["value"]
+
+    def iter_chunks(self, from_ms: Optional[float] = None, to_ms: Optional[float] = None,
+                    chunk: int = 200 * 600) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        i, j = self.range(from_ms, to_ms)
+        for a in range(i, j, chunk):
+            part = self.data[a:min(j, a + chunk)]
+            yield part["ts"], part["value"]
+
+
+def decimate(ts: np.ndarray, values: np.ndarray, max_points: int, mode: str = "minmax") -> dict:
+    """차트용으로 줄임 - minmax: 구간별 [시작 ts, 최소, 최대], mean: [ts, 평균], stride: 간격 추출 [ts, 값]"""
+    n = len(ts)
+    if mode == "minmax":
+        columns = ["ts", "min", "max"]
+    else:
+        columns = ["ts", "value"]
+    if n <= max_points:
+        v = np.asarray(values, dtype=np.float64)
+        rows = np.column_stack([ts, v, v]) if mode == "minmax" else np.column_stack([ts, v])
+        return {"method": "none", "columns": columns, "points": rows.tolist()}
+    if mode == "stride":
+        idx = np.linspace(0, n - 1, max_points).astype(np.int64)
+        return {"method": "stride", "columns": columns,
+                "points": np.column_stack([ts[idx], np.asarray(values[idx], dtype=np.float64)]).tolist()}
+    buckets = max_points // 2 if mode == "minmax" else max_points
+    starts = (np.arange(buckets) * n // buckets).astype(np.int64)
+    v = np.asarray(values, dtype=np.float64)
+    if mode == "minmax":
+        rows = np.column_stack([ts[starts], np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts)])
+    elif mode == "mean":
+        counts = np.diff(np.r_[starts, n])
+        rows = np.column_stack([ts[starts], np.add.reduceat(v, starts) / counts])
+    else:
+        raise ValueError(f"unknown decimation mode: {mode}")
+    return {"method": mode, "columns": columns, "points": rows.tolist()}
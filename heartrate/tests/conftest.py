@@ -0,0 +1,25 @@
+import os
+import sys
+
+# heartrate/ 모듈은 같은 디렉터리 기준으로 서로 import 함
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """bpm_FastAPI 모듈 (설정은 import 시점에 환경 변수에서 읽으므로 세션당 한 번, 임시 디렉터리 사용)"""
+    d = tmp_path_factory.mktemp("api")
+    os.environ.update({"BPM_DB_FILE": str(d / "dogs.db"), "BPM_CSV_FILE": str(d / "hr.csv"),
+                       "BPM_EMG_DIR": str(d / "emg"), "BPM_BINARY_PORT": "0", "BPM_LOG_LEVEL": "WARNING"})
+    import bpm_FastAPI
+    return bpm_FastAPI
+
+
+@pytest.fixture
+def client(api):
+    """lifespan을 매번 새로 도는 TestClient (앱 상태는 세션 동안 이어지므로 테스트마다 다른 dog_id 사용)"""
+    from fastapi.testclient import TestClient
+    with TestClient(api.app) as c:
+        yield c
@@ -0,0 +1,54 @@
+"""bpm_binary 프레임 디코드 / seq 중복·유실 판단 테스트"""
+import pytest
+
+from bpm_binary import (NO_CONFIDENCE, BinaryIngestServer, Frame, FrameError, decode_frames,
+                        encode_bpm_frame, encode_emg_frame)
+
+
+def accept_all(seqs):
+    server = BinaryIngestServer(None)
+    accepted = [server._accept_seq(Frame(1, "h1", seq, 0, 0, 0, [], None)) for seq in seqs]
+    return accepted, server.duplicates, server.lost
+
+
+def test_duplicates_and_late_frames():
+    accepted, duplicates, lost = accept_all([0, 1, 3, 2, 2, 5, 4, 10])
+    assert accepted == [True, True, True, True, False, True, True, True]
+    assert duplicates == 1
+    assert lost == 4  # 6..9
+
+
+def test_seq_zero_is_restart():
+    # 재시작한 디바이스의 0, 1, 2를 최근 seq의 중복으로 버리지 않음
+    accepted, duplicates, lost = accept_all([5, 6, 7, 0, 1, 2])
+    assert accepted == [True] * 6
+    assert (duplicates, lost) == (0, 0)
+
+
+def test_seq_wraparound_is_not_restart():
+    accepted, duplicates, lost = accept_all([2**32 - 2, 2**32 - 1, 0, 1, 2**32 - 1])
+    assert accepted == [True, True, True, True, False]
+    assert (duplicates, lost) == (1, 0)
+
+
+@pytest.mark.parametrize("seqs", [[10, 3, 4], [1, 5, 0, 1, 2, 3, 4]])
+def test_lost_never_goes_negative(seqs):
+    # 유실로 세지 않은 seq(처음 본 seq 이전, 재시작 전 구간)가 늦게 와도 lost를 빼지 않음
+    accepted, _, lost = accept_all(seqs)
+    assert all(accepted)
+    assert lost == (3 if seqs[0] == 1 else 0)
+
+
+def test_zero_period_is_rejected():
+    frame = encode_emg_frame("h1", 0, [1, 2, 3])
+    frame = frame[:24] + (0).to_bytes(4, "little") + frame[28:]  # period_us
+    with pytest.raises(FrameError):
+        decode_frames(frame)
+
+
+def test_decode_round_trip():
+    frames, used = decode_frames(encode_bpm_frame("h1", 7, [80.5, 81], [90, None]) + b"HB")
+    assert used == 32 + 6 and len(frames) == 1
+    frame = frames[0]
+    assert (frame.device_id, frame.seq, frame.period_us) == ("h1", 7, 1_000_000)
+    assert list(frame.values) == [805, 810] and list(frame.confidence) == [90, NO_CONFIDENCE]
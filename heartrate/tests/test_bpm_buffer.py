@@ -0,0 +1,24 @@
+"""DogRingBuffer 테스트"""
+import numpy as np
+
+from bpm_buffer import DogRingBuffer
+
+
+def test_ring_buffer_wraps_and_keeps_latest():
+    buf = DogRingBuffer(4)
+    buf.append(1.0, 80, "normal")
+    buf.extend([2.0, 3.0, 4.0, 5.0], [81, 130, 40, 83], ["normal", "high", "low", "normal"])
+    assert len(buf) == 4
+    assert buf.last() == {"ts": 5.0, "bpm": 83, "status": "normal"}
+    ts, bpm, _ = buf.tail(10)
+    assert ts.tolist() == [2.0, 3.0, 4.0, 5.0] and bpm.tolist() == [81, 130, 40, 83]
+    buf.extend(np.arange(6.0, 16.0), list(range(90, 100)), ["normal"] * 10)  # 용량보다 긴 묶음
+    assert [d["bpm"] for d in buf.tail_dicts(4)] == [96, 97, 98, 99]
+
+
+def test_out_of_range_bpm_is_clipped_on_both_paths():
+    single, batch = DogRingBuffer(4), DogRingBuffer(4)
+    for ts, bpm in ((1.0, 40000), (2.0, -40000)):
+        single.append(ts, bpm, "high")
+    batch.extend([1.0, 2.0], [40000, -40000], ["high", "high"])
+    assert single.tail(2)[1].tolist() == batch.tail(2)[1].tolist() == [32767, -32768]
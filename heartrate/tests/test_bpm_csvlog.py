@@ -0,0 +1,78 @@
+"""CsvSegmentLog 기록 실패 / 재시도 한도 / 세그먼트 교체 테스트"""
+import asyncio
+import sqlite3
+import time
+from datetime import datetime
+
+from bpm_blocks import create_block_table
+from bpm_csvlog import CsvSegmentLog, segment_index
+from bpm_retention import RetentionPolicy, compact
+from bpm_rollup import create_rollup_tables
+from bpm_schema import init_schema
+
+
+def row(dog_id="rex"):
+    return (time.time(), dog_id, 80, "normal")
+
+
+def test_wait_reports_failure_and_retry_buffer_is_bounded(tmp_path):
+    path = str(tmp_path / "hr.csv")
+    csv_log = CsvSegmentLog(path, flush_interval=0.02, max_pending_rows=100)
+    failing = [True]
+    flush = csv_log._flush
+
+    def flaky_flush(rows):
+        if failing[0]:
+            raise OSError("disk full")
+        flush(rows)
+    csv_log._flush = flaky_flush
+
+    async def run():
+        csv_log.start()
+        try:
+            assert await csv_log.wait(csv_log.write([row()] * 30)) is False
+            for _ in range(5):
+                csv_log.write([row()] * 30)
+            await asyncio.sleep(0.3)
+            assert csv_log.dropped_rows == 80
+            failing[0] = False
+            assert await csv_log.wait(csv_log.write([row("toby")])) is True
+        finally:
+            csv_log.stop()
+    asyncio.run(run())
+
+    stats = csv_log.stats()
+    assert stats["pending_rows"] == 0 and stats["dropped_rows"] == 80
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1 + 101 and lines[-1].endswith(",toby,80,normal")
+
+
+def test_cli_compaction_uses_hourly_segments(tmp_path):
+    path = str(tmp_path / "hr.csv")
+    hour_ago = time.time() - 3600
+    csv_log = CsvSegmentLog(path, flush_interval=0.02)
+
+    async def run():
+        csv_log.start()
+        try:
+            assert await csv_log.wait(csv_log.write([(hour_ago, "rex", 80, "normal")]))
+        finally:
+            csv_log.stop()
+    asyncio.run(run())
+
+    conn = sqlite3.connect(":memory:")
+    init_schema(conn)
+    create_rollup_tables(conn)
+    create_block_table(conn)
+    totals = compact(conn, RetentionPolicy(raw_days=None), path)
+    assert totals["csv_rotated"] == 1 and totals["csv_gzipped"] == 1
+
+    key = datetime.fromtimestamp(hour_ago).strftime("%Y-%m-%dT%H")
+    [entry] = segment_index(path)
+    assert entry["file"] == f"hr.{key}.csv.gz" and entry["from"].startswith(key.replace("T", " "))
+    assert compact(conn, RetentionPolicy(raw_days=None), path)["csv_rotated"] == 0  # 빈 새 파일은 그대로
+
+    csv_log.start()  # 서버가 다시 떠도 색인이 그대로
+    csv_log.stop()
+    assert [e["file"] for e in segment_index(path)] == [entry["file"]]
@@ -0,0 +1,49 @@
+"""bpm_blocks.iter_rows / bpm_export 스트리밍 테스트 (블록 + 늦게 온 원본 행)"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+from bpm_blocks import BLOCK_MS, create_block_table, iter_rows, read_range, seal_all
+from bpm_export import iter_chunks
+from bpm_schema import init_schema
+
+H0 = 1_700_000_000_000 // BLOCK_MS * BLOCK_MS
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    init_schema(conn)
+    create_block_table(conn)
+    conn.execute("INSERT INTO dogs (dog_id, size) VALUES ('rex', 'medium')")
+    # 3시간 분량 (10초 간격) → 앞 2시간 봉인 → 봉인된 시간대에 늦은 행, 같은 ts 덮어쓰기
+    rows = [(1, H0 + i * 10_000, 60 + i % 50, 1) for i in range(3 * 360)]
+    conn.executemany("INSERT INTO bpm_data VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    seal_all(conn, before_ms=H0 + 2 * BLOCK_MS)
+    conn.executemany("INSERT INTO bpm_data VALUES (?, ?, ?, ?)",
+                     [(1, H0 + 5_000, 99, 2), (1, H0 + BLOCK_MS + 10_000, 120, 2)])
+    conn.commit()
+    return conn
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 10_000])
+@pytest.mark.parametrize("span", [(None, None), (H0 + 1234, H0 + 2 * BLOCK_MS + 55_555),
+                                  (H0 + BLOCK_MS, H0 + BLOCK_MS + 1)])
+def test_iter_rows_matches_read_range(conn, chunk_size, span):
+    lo, hi = span
+    parts = list(iter_rows(conn, 1, lo, hi, chunk_size))
+    got = [np.concatenate(col) for col in zip(*parts)] if parts else [[], [], []]
+    want = read_range(conn, 1, lo if lo is not None else 0, hi if hi is not None else 1 << 62)
+    for g, w in zip(got, want):
+        np.testing.assert_array_equal(g, w)
+    assert all(len(p[0]) <= max(chunk_size, 361) for p in parts)  # 원본 chunk 또는 블록 한 개 (+늦은 행)
+
+
+def test_export_chunks_are_bounded(conn):
+    chunks = list(iter_chunks(conn, "rex", chunk_size=50))
+    assert sum(len(c[1]) for c in chunks) == 3 * 360 + 1
+    assert max(len(c[1]) for c in chunks) == 50
+    ts = np.concatenate([c[1] for c in chunks])
+    assert (np.diff(ts) > 0).all()
@@ -0,0 +1,64 @@
+"""FilterPipeline 테스트"""
+import numpy as np
+
+from bpm_filters import FILTER_CONFIG, build_pipeline
+
+
+def run_stream(pipeline, values, key="rex"):
+    """한 샘플씩 넣고 저장된 값만 이력으로 이어 감 (서버의 heartbeat_raw와 같은 흐름)"""
+    history = []
+    for v in values:
+        bpm, keep = pipeline.run([v], history, key=key)
+        if keep[0]:
+            history.append(int(bpm[0]))
+    return history
+
+
+def test_rejected_first_sample_is_dropped_not_stored():
+    pipeline = build_pipeline(FILTER_CONFIG["medium"])
+    assert run_stream(pipeline, [10, 80, 85]) == [80, 85]
+    assert pipeline.stats()["dropped"] == 1 and pipeline.stats()["held"] == 0
+
+
+def test_rejected_sample_after_history_is_held():
+    pipeline = build_pipeline(FILTER_CONFIG["medium"])
+    bpm, keep = pipeline.run([82, 300, 84], history=[80, 81], key="rex")
+    assert keep.all()
+    assert bpm.tolist() == [82, 82, 84]
+    assert pipeline.rejected["range"] == 1 and pipeline.held == 1
+
+
+def test_batch_drops_only_leading_rejections():
+    pipeline = build_pipeline(FILTER_CONFIG["medium"])
+    bpm, keep = pipeline.run([5, 250, 90, 10, 95], key="rex")
+    assert keep.tolist() == [False, False, True, True, True]
+    assert bpm[keep].tolist() == [90, 90, 95]
+
+
+def test_rate_limiter_follows_real_change_and_hampel_rejects_spike():
+    pipeline = build_pipeline(FILTER_CONFIG["medium"])
+    history = [80] * 8
+    bpm, _ = pipeline.run([120] * 8, history=history, key="rex")
+    # 처음 몇 개는 Hampel이 거부하지만 창이 바뀌면 max_step=20씩 따라감 (고정되지 않음)
+    assert bpm.tolist()[-1] == 120
+    assert np.abs(np.diff([80] + bpm.tolist())).max() <= 20
+    bpm, _ = pipeline.run([80, 80, 80, 80, 80, 80, 80, 150, 80], history=history, key="toby")
+    assert bpm.tolist()[7] == 80  # 단발 스파이크는 Hampel이 거부
+
+
+def test_low_confidence_is_rejected():
+    pipeline = build_pipeline(FILTER_CONFIG["medium"])
+    bpm, keep = pipeline.run([90, 95], history=[80], confidence=[10, None], key="rex")
+    assert keep.all() and bpm.tolist() == [80, 95]
+    assert pipeline.rejected["quality"] == 1
+    assert isinstance(bpm, np.ndarray)
+
+
+def test_heartbeat_raw_does_not_store_rejected_first_sample(client):
+    client.post("/register_device", json={"device_id": "harness-f1", "dog_id": "filter-dog"})
+    r = client.post("/heartbeat_raw", json={"device_id": "harness-f1", "bpm": 10}).json()
+    assert r["ok"] is False
+    stored = [client.post("/heartbeat_raw", json={"device_id": "harness-f1", "bpm": b}).json()["stored"]["bpm"]
+              for b in (80, 85)]
+    assert stored == [80, 85]
+    assert client.get("/latest", params={"dog_id": "filter-dog"}).json()["bpm"] == 85
@@ -0,0 +1,74 @@
+"""기간 조회 다운샘플링 (LTTB / 롤업) 테스트"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+from bpm_blocks import create_block_table
+from bpm_buffer import STATUS_CODES
+from bpm_history import choose_source, lttb, query_history
+from bpm_rollup import apply_rollups, create_rollup_tables
+from bpm_schema import DogKeys, init_schema, set_setting
+
+T = 1_700_000_000.0
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    init_schema(conn)
+    create_rollup_tables(conn)
+    create_block_table(conn)
+    return conn
+
+
+def add(conn, ts, bpm):
+    rows = [("rex", int(b), "normal", float(t)) for t, b in zip(ts, bpm)]
+    with conn:
+        key = DogKeys().key(conn, "rex")
+        conn.executemany("INSERT INTO bpm_data VALUES (?, ?, ?, ?)",
+                         [(key, int(t * 1000), b, STATUS_CODES[s]) for _, b, s, t in rows])
+        apply_rollups(conn, rows)
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50) * 10 + 80
+    y[437] = 200
+    idx = lttb(x, y, 50)
+    assert len(idx) == 50 and idx[0] == 0 and idx[-1] == 999
+    assert np.all(np.diff(idx) > 0) and 437 in idx
+    assert lttb(x, y, 2000).tolist() == list(range(1000))
+
+
+def test_source_gets_coarser_with_span():
+    assert [choose_source(span, 1000) for span in (3600, 86400, 30 * 86400, 5 * 365 * 86400)] == \
+        ["raw", "minute", "hour", "day"]
+
+
+def test_raw_range_is_downsampled_to_max_points(conn):
+    ts = T + np.arange(3000)
+    add(conn, ts, 80 + (np.arange(3000) % 40))
+    result = query_history(conn, "rex", T, T + 3000, max_points=200)
+    assert (result["source"], result["method"], result["count"]) == ("raw", "lttb", 200)
+    assert result["points"][0] == [T, 80] and result["points"][-1][0] == T + 2999
+    assert query_history(conn, "nobody", T, T + 3000)["points"] == []
+
+
+def test_long_range_reads_rollups_and_keeps_extremes(conn):
+    ts = T + np.arange(0, 10 * 86400, 300.0)
+    bpm = np.full(len(ts), 80)
+    bpm[1234], bpm[2345] = 190, 35
+    add(conn, ts, bpm)
+    result = query_history(conn, "rex", T, T + 10 * 86400, max_points=100)
+    assert result["source"] == "hour" and result["method"] == "minmax" and result["count"] <= 100
+    _, _, lo, hi = zip(*result["points"])
+    assert (min(lo), max(hi)) == (35, 190)
+
+
+def test_range_before_raw_retention_reads_minute_rollup(conn):
+    add(conn, T + np.arange(600.0), np.full(600, 80))
+    set_setting(conn, "raw_before_ms", int((T + 300) * 1000))
+    result = query_history(conn, "rex", T, T + 600, max_points=1000)
+    assert result["source"] == "minute" and result["columns"] == ["ts", "avg", "min", "max"]
+    assert result["count"] in (10, 11)  # 분 경계에 따라
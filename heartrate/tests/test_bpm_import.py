@@ -0,0 +1,72 @@
+"""bpm_import 파싱 / 적재 중복 판단 테스트 (CSV 시각은 초 단위)"""
+import csv
+import gzip
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from bpm_blocks import create_block_table
+from bpm_buffer import STATUS_CODES
+from bpm_import import load_parsed, parse_chunk, split_file
+from bpm_rollup import create_rollup_tables, query_daily
+from bpm_schema import DogKeys, init_schema
+
+STAMP = "2026-03-01 12:00:00"
+SEC = int(datetime.strptime(STAMP, "%Y-%m-%d %H:%M:%S").timestamp())
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "bpm.db"))
+    init_schema(conn)
+    create_rollup_tables(conn)
+    create_block_table(conn)
+    return conn
+
+
+def load_lines(conn, tmp_path, lines):
+    path = str(tmp_path / "hr.csv")
+    with open(path, "w") as f:
+        f.write("timestamp,dog_id,bpm,status\n" + "".join(line + "\n" for line in lines))
+    parsed, _ = parse_chunk((path, 0, os.path.getsize(path)))
+    return load_parsed(conn, DogKeys(), parsed)
+
+
+def test_samples_sharing_a_second_are_kept(conn, tmp_path):
+    lines = [f"{STAMP},rex,80,normal", f"{STAMP},rex,82,normal", f"{STAMP},rex,80,normal",
+             f"{STAMP},rex,130,high"]
+    assert load_lines(conn, tmp_path, lines) == (3, 1)
+    assert load_lines(conn, tmp_path, lines) == (0, 4)  # 다시 넣어도 그대로
+    rows = conn.execute("SELECT ts, bpm FROM bpm_data ORDER BY ts").fetchall()
+    assert [bpm for _, bpm in rows] == [80, 82, 130]
+    assert all(SEC * 1000 <= ts < (SEC + 1) * 1000 for ts, _ in rows)
+    day = query_daily(conn, 0, "rex")[0]
+    assert (day["normal_count"], day["high_count"]) == (2, 1)
+
+
+def test_live_rows_are_matched_by_second_and_value(conn, tmp_path):
+    # 서버가 ms 단위로 저장한 샘플과 같은 초·값인 CSV 줄은 중복, ms 자리도 피함
+    with conn:
+        key = DogKeys().key(conn, "rex")
+        conn.executemany("INSERT INTO bpm_data VALUES (?, ?, ?, ?)",
+                         [(key, SEC * 1000, 80, STATUS_CODES["normal"]),
+                          (key, SEC * 1000 + 437, 81, STATUS_CODES["normal"])])
+    lines = [f"{STAMP},rex,80,normal", f"{STAMP},rex,81,normal", f"{STAMP},rex,83,normal"]
+    assert load_lines(conn, tmp_path, lines) == (1, 2)
+    assert conn.execute("SELECT ts FROM bpm_data WHERE bpm = 83").fetchone() == (SEC * 1000 + 1,)
+
+
+def test_quoted_fields_and_gzip_segments_are_parsed(conn, tmp_path):
+    path = str(tmp_path / "hr.2026-03-01T12.csv.gz")
+    with gzip.open(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "dog_id", "bpm", "status"])
+        writer.writerows([[STAMP, "rex, jr", 80, "normal"], [STAMP, 'say "hi"', 81, "normal"],
+                          [STAMP, "rex", "oops", "normal"]])
+    [task] = split_file(path, 1024)
+    parsed, skipped = parse_chunk(task)
+    assert sorted(parsed) == ['rex, jr', 'say "hi"'] and skipped == 1
+    assert load_parsed(conn, DogKeys(), parsed) == (2, 0)
+    assert conn.execute("SELECT dog_id FROM dogs ORDER BY dog_id").fetchall() == [("rex, jr",), ('say "hi"',)]
@@ -0,0 +1,54 @@
+"""LatestIndex 변경분 조회 / epoch / max_age 와 /latest_all ETag 테스트"""
+from bpm_latest import COLUMNS, LatestIndex
+
+T = 1_700_000_000.0
+
+
+def test_since_returns_only_dogs_changed_after_version():
+    index = LatestIndex()
+    index.update("rex", T, 80, "normal")
+    index.update("toby", T + 1, 90, "normal")
+    index.update("rex", T + 2, 130, "high")  # rex가 끝으로 이동
+    full = index.snapshot()
+    assert full["full"] and full["version"] == 3 and full["columns"] == COLUMNS
+    assert full["dogs"] == [["toby", T + 1, 90, "normal", 2], ["rex", T + 2, 130, "high", 3]]
+    delta = index.snapshot(since=2, epoch=index.epoch)
+    assert not delta["full"] and delta["dogs"] == [["rex", T + 2, 130, "high", 3]]
+    assert index.snapshot(since=3)["dogs"] == [] and len(index) == 2
+
+
+def test_foreign_epoch_or_future_version_gets_full_snapshot():
+    index = LatestIndex()
+    index.update("rex", T, 80, "normal")
+    assert index.snapshot(since=1, epoch="deadbeef")["full"]  # 재시작 / 다른 워커
+    assert index.snapshot(since=5, epoch=index.epoch)["full"]
+    assert LatestIndex().epoch != index.epoch
+
+
+def test_max_age_skips_stale_dogs_and_changes_etag():
+    index = LatestIndex()
+    index.update("rex", T, 80, "normal")
+    index.update("toby", T + 100, 90, "normal")
+    snap = index.snapshot(max_age=30, now=T + 110)
+    assert [row[0] for row in snap["dogs"]] == ["toby"] and snap["count"] == 1
+    assert index.etag(None, 1) != index.etag(None, 2) != index.etag(1)
+
+
+def test_latest_all_endpoint_delta_and_not_modified(client):
+    for n, dog in enumerate(("latest-a", "latest-b")):
+        client.post("/register_device", json={"device_id": f"harness-l{n}", "dog_id": dog})
+        client.post("/heartbeat_raw", json={"device_id": f"harness-l{n}", "bpm": 80 + n})
+    r = client.get("/latest_all")
+    body = r.json()
+    rows = {row[0]: row for row in body["dogs"]}
+    assert body["full"] and rows["latest-a"][2] == 80 and rows["latest-b"][2] == 81
+    assert client.get("/latest_all", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+
+    client.post("/heartbeat_raw", json={"device_id": "harness-l0", "bpm": 84})
+    assert client.get("/latest_all", headers={"If-None-Match": r.headers["ETag"]}).status_code == 200
+    delta = client.get("/latest_all", params={"since": body["version"], "epoch": body["epoch"]}).json()
+    assert not delta["full"] and [(row[0], row[2]) for row in delta["dogs"]] == [("latest-a", 84)]
+
+    fresh = client.get("/latest_all", params={"max_age": 3600}).json()
+    assert {"latest-a", "latest-b"} <= {row[0] for row in fresh["dogs"]}
+    assert client.get("/latest_all", params={"max_age": -3600}).json()["dogs"] == []
@@ -0,0 +1,84 @@
+"""LiveStats 창 통계 / 만료 / 늦은 샘플 / 지수 가중 평균 테스트"""
+import math
+
+import numpy as np
+import pytest
+
+from bpm_buffer import STATUS_CODES
+from bpm_live_stats import DogLiveStats, LiveStats, RollingWindow
+
+T = 1_700_000_000.0
+
+
+def test_window_matches_numpy_over_unexpired_samples():
+    rng = np.random.default_rng(7)
+    bpm = rng.integers(40, 200, 300)
+    codes = rng.choice([STATUS_CODES["high"], STATUS_CODES["low"], STATUS_CODES["normal"]], 300)
+    w = RollingWindow(60, 1)
+    for i, (b, c) in enumerate(zip(bpm.tolist(), codes.tolist())):
+        w.add(T + i, b, c)
+        # 1초 구간이면 창에 남는 건 최근 61초 (구간 폭만큼의 경계 오차)
+        keep = slice(max(0, i - 60), i + 1)
+        s = w.summary()
+        window = bpm[keep]
+        assert s["count"] == len(window)
+        assert s["mean"] == pytest.approx(window.mean(), abs=0.01)
+        if len(window) > 1:
+            assert s["std"] == pytest.approx(window.std(ddof=1), abs=0.01)
+        assert (s["min"], s["max"]) == (window.min(), window.max())
+        assert s["high"] == int((codes[keep] == STATUS_CODES["high"]).sum())
+        assert s["high"] + s["low"] + s["normal"] == len(window)
+
+
+def test_summary_expires_buckets_without_new_samples():
+    w = RollingWindow(60, 1)
+    for i in range(10):
+        w.add(T + i, 80 + i, STATUS_CODES["normal"])
+    assert w.summary(T + 65)["count"] == 5  # T+5 ~ T+9만 남음
+    assert w.summary(T + 65)["min"] == 85
+    s = w.summary(T + 200)
+    assert (s["count"], s["mean"], s["min"], s["max"]) == (0, None, None, None)
+    w.add(T + 200, 90, STATUS_CODES["normal"])
+    assert (w.summary()["count"], w.summary()["mean"]) == (1, 90)
+
+
+def test_late_samples_inside_window_count_and_outside_are_dropped():
+    w = RollingWindow(60, 1)
+    w.add(T + 100, 80, STATUS_CODES["normal"])
+    w.add(T + 90, 150, STATUS_CODES["high"])  # 늦었지만 창 안: 현재 구간에 합산
+    w.add(T + 10, 30, STATUS_CODES["low"])  # 창 밖: 버림
+    s = w.summary()
+    assert (s["count"], s["max"], s["min"], s["high"], s["low"]) == (2, 150, 80, 1, 0)
+
+
+def test_ewma_follows_step_with_time_constant():
+    st = DogLiveStats()
+    st.add(T, 80, STATUS_CODES["normal"])
+    st.add(T + 10, 120, STATUS_CODES["normal"])  # 간격 = 10초 시간 상수
+    ewma = st.summary()["ewma"]
+    assert ewma["10s"] == pytest.approx(80 + 40 * (1 - math.exp(-1)), abs=0.01)
+    assert 80 < ewma["10m"] < ewma["1m"] < ewma["10s"]
+    st.add(T + 5, 200, STATUS_CODES["high"])  # 늦은 샘플은 마지막 값을 바꾸지 않음
+    s = st.summary()
+    assert (s["last_ts"], s["last_bpm"], s["lifetime"]["count"]) == (T + 10, 120, 3)
+
+
+def test_extend_matches_add_and_unknown_dog_has_no_summary():
+    a, b = LiveStats(), LiveStats()
+    ts = [T + i for i in range(20)]
+    bpm = [80 + i % 7 for i in range(20)]
+    for t, v in zip(ts, bpm):
+        a.add("rex", t, v, "normal")
+    b.extend("rex", ts, bpm, [STATUS_CODES["normal"]] * 20)
+    assert a.summary("rex", T + 30) == b.summary("rex", T + 30)
+    assert a.summary("toby") is None and a.dog_ids() == ["rex"]
+
+
+def test_stats_endpoint_reports_recent_samples(client):
+    assert client.get("/stats/stats-dog").json()["ok"] is False
+    client.post("/register_device", json={"device_id": "harness-s1", "dog_id": "stats-dog"})
+    for b in (80, 82, 84):
+        client.post("/heartbeat_raw", json={"device_id": "harness-s1", "bpm": b})
+    r = client.get("/stats/stats-dog").json()
+    assert r["ok"] and r["dog_id"] == "stats-dog" and r["last_bpm"] == 84
+    assert r["windows"]["1m"]["count"] == r["lifetime"]["count"] == 3
@@ -0,0 +1,40 @@
+"""Prometheus 텍스트 출력 테스트"""
+import re
+
+from bpm_metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    h = registry.histogram("stage_seconds", "Stage time", ["stage"], buckets=(0.001, 0.01))
+    for v in (0.0005, 0.005, 0.005, 1.0):
+        h.observe(v, "filter")
+    text = registry.render()
+    assert 'stage_seconds_bucket{stage="filter",le="0.001"} 1' in text
+    assert 'stage_seconds_bucket{stage="filter",le="0.01"} 3' in text
+    assert 'stage_seconds_bucket{stage="filter",le="+Inf"} 4' in text
+    assert 'stage_seconds_count{stage="filter"} 4' in text
+    assert "# TYPE stage_seconds histogram" in text
+
+
+def test_counter_and_collector_render_labels():
+    registry = MetricsRegistry()
+    c = registry.counter("samples_total", "Samples", ["dog_id"])
+    c.inc(2, 'say "hi"')
+    c.inc(1, 'say "hi"')
+    registry.collector(lambda: [("queue_depth", {}, 5), ("extra", {"a": "b"}, 1.5)],
+                       {"queue_depth": ("gauge", "Queue depth")})
+    text = registry.render()
+    assert 'samples_total{dog_id="say \\"hi\\""} 3' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 5" in text
+    assert 'extra{a="b"} 1.5' in text
+
+
+def test_app_metrics_are_all_declared(client):
+    client.post("/register_device", json={"device_id": "metrics-1", "dog_id": "metrics-dog"})
+    client.post("/heartbeat_raw", json={"device_id": "metrics-1", "bpm": 80})
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    # collect_metrics가 내보내는 이름이 타입 표에 빠지면 설명 없는 gauge로 나감
+    assert re.findall(r"^# HELP (\S+) ?$", r.text, re.M) == []
+    assert re.search(r'^bpm_samples_total\{dog_id="metrics-dog"\} 1$', r.text, re.M)
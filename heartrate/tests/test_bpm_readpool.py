@@ -0,0 +1,27 @@
+"""ReadPool 수명 주기 테스트"""
+import asyncio
+import sqlite3
+
+from bpm_readpool import ReadPool
+
+
+def test_read_pool_can_restart(tmp_path):
+    db_file = str(tmp_path / "bpm.db")
+    sqlite3.connect(db_file).execute("CREATE TABLE t (x)").connection.close()
+    pool = ReadPool(db_file, size=2)
+
+    def count(conn):
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+    for _ in range(2):  # 앱 lifespan이 다시 돌 때
+        pool.start()
+        assert asyncio.run(pool.run(count)) == 0
+        pool.close()
+    assert pool.stats()["completed"] == 2 and pool.stats()["connections"] == 0
+
+
+def test_reports_work_after_app_restart(api):
+    from fastapi.testclient import TestClient
+    for _ in range(2):
+        with TestClient(api.app) as client:
+            assert client.get("/report/weekly").status_code == 200
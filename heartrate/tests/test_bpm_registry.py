@@ -0,0 +1,42 @@
+"""강아지 상태 / 디바이스 라우팅 테스트"""
+import sqlite3
+
+import pytest
+
+from bpm_registry import DeviceRegistry, DogStateTable
+
+LIMITS = {"small": {"min": 70, "max": 120}, "medium": {"min": 60, "max": 100}, "large": {"min": 50, "max": 90}}
+
+
+def test_unknown_size_is_rejected_without_creating_state():
+    table = DogStateTable(LIMITS)
+    with pytest.raises(ValueError):
+        table.set_size("rex", "huge")
+    assert table.get("rex") is None
+    assert table.set_size("rex", "large").limits == LIMITS["large"]
+
+
+def test_device_mapping_survives_reload(tmp_path):
+    db_file = str(tmp_path / "dogs.db")
+    sqlite3.connect(db_file).execute("CREATE TABLE devices (device_id TEXT PRIMARY KEY, dog_id TEXT)").connection.close()
+    DeviceRegistry(db_file).register("harness-1", "rex")
+    registry = DeviceRegistry(db_file)
+    registry.load()
+    assert registry.resolve("harness-1") == "rex" and registry.resolve("harness-2") is None
+
+
+def test_register_dog_rejects_unknown_size(client):
+    assert client.post("/register_dog", json={"dog_id": "reg-dog", "size": "huge"}).status_code == 422
+    assert client.post("/activate_dog", json={"dog_id": "reg-dog", "size": "huge"}).status_code == 422
+    assert client.post("/register_dog", json={"dog_id": "reg-dog", "size": "small"}).json()["ok"] is True
+
+
+def test_heartbeats_are_routed_by_device(client):
+    client.post("/activate_dog", json={"dog_id": "route-active", "size": "medium"})
+    client.post("/register_device", json={"device_id": "route-a", "dog_id": "route-a-dog"})
+    client.post("/register_device", json={"device_id": "route-b", "dog_id": "route-b-dog"})
+    for device_id, bpm in (("route-a", 70), ("route-b", 90), ("unknown", 85)):
+        assert client.post("/heartbeat_raw", json={"device_id": device_id, "bpm": bpm}).json()["ok"]
+    latest = {d: client.get("/latest", params={"dog_id": d}).json()["bpm"]
+              for d in ("route-a-dog", "route-b-dog", "route-active")}
+    assert latest == {"route-a-dog": 70, "route-b-dog": 90, "route-active": 85}  # 미등록은 활성 강아지로
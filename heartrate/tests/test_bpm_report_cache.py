@@ -0,0 +1,70 @@
+"""ReportCache 무효화 / 공유 모드 테스트"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import bpm_report_cache
+from bpm_report_cache import ReportCache, day_start
+from bpm_rollup import apply_rollups, create_rollup_tables
+
+YESTERDAY = (day_start(datetime.now()) - timedelta(hours=12)).timestamp()
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    create_rollup_tables(conn)
+    apply_rollups(conn, [("rex", 80, "normal", YESTERDAY)])
+    return conn
+
+
+def yesterday_count(report):
+    return sum(row["normal_count"] for row in report)
+
+
+def test_late_row_invalidates_closed_day(conn):
+    cache = ReportCache()
+    assert yesterday_count(cache.daily(conn, 7, "rex")) == 1
+    apply_rollups(conn, [("rex", 82, "normal", YESTERDAY + 1)])
+    assert yesterday_count(cache.daily(conn, 7, "rex")) == 1  # 캐시
+    cache.invalidate_rows([("rex", YESTERDAY + 1, 82, "normal")])
+    assert yesterday_count(cache.daily(conn, 7, "rex")) == 2
+
+
+def test_invalidation_during_miss_is_not_cached(conn, monkeypatch):
+    cache = ReportCache()
+    query_daily = bpm_report_cache.query_daily
+
+    def racing_query(*args, **kwargs):
+        rows = query_daily(*args, **kwargs)  # 이 값을 읽은 직후 늦은 행이 커밋됨
+        if kwargs.get("until_ts") is not None:
+            apply_rollups(conn, [("rex", 82, "normal", YESTERDAY + 1)])
+            cache.invalidate_rows([("rex", YESTERDAY + 1, 82, "normal")])
+        return rows
+    monkeypatch.setattr(bpm_report_cache, "query_daily", racing_query)
+    assert yesterday_count(cache.daily(conn, 7, "rex")) == 1
+    monkeypatch.setattr(bpm_report_cache, "query_daily", query_daily)
+    assert yesterday_count(cache.daily(conn, 7, "rex")) == 2
+
+
+def test_shared_mode_does_not_cache_closed_days(conn):
+    cache = ReportCache(shared=True)
+    cache.daily(conn, 7, "rex")
+    apply_rollups(conn, [("rex", 82, "normal", YESTERDAY + 1)])  # 다른 워커의 커밋 (통지 없음)
+    assert yesterday_count(cache.daily(conn, 7, "rex")) == 2
+    assert cache.stats()["entries"] == 0
+    assert cache.last_modified("rex") >= time.time() - 1
+
+
+def test_report_covers_exactly_the_requested_days(conn):
+    today = day_start(datetime.now())
+    apply_rollups(conn, [("rex", 80, "normal", (today - timedelta(days=i) + timedelta(hours=12)).timestamp())
+                         for i in range(1, 40)])
+    apply_rollups(conn, [("rex", 80, "normal", time.time())])
+    for days in (7, 30):
+        report = ReportCache().daily(conn, days, "rex")
+        assert len(report) == days
+        assert report[-1]["date"] == today.strftime("%Y-%m-%d")
+        assert report[0]["date"] == (today - timedelta(days=days - 1)).strftime("%Y-%m-%d")
@@ -0,0 +1,54 @@
+"""보존 기간 정리 테스트"""
+import sqlite3
+import time
+
+import pytest
+
+from bpm_blocks import create_block_table
+from bpm_buffer import STATUS_CODES
+from bpm_retention import RetentionPolicy, compact, dry_run
+from bpm_rollup import apply_rollups, create_rollup_tables
+from bpm_schema import DogKeys, get_setting, init_schema
+
+NOW = time.time()
+DAY = 86400
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    init_schema(conn)
+    create_rollup_tables(conn)
+    create_block_table(conn)
+    return conn
+
+
+def add(conn, dog_id, days_ago, rollup=True):
+    ts = NOW - days_ago * DAY
+    with conn:
+        conn.execute("INSERT INTO bpm_data VALUES (?, ?, 80, ?)",
+                     (DogKeys().key(conn, dog_id), int(ts * 1000), STATUS_CODES["normal"]))
+        if rollup:
+            apply_rollups(conn, [(dog_id, 80, "normal", ts)])
+
+
+def raw_days(conn, dog_id):
+    rows = conn.execute("SELECT ts FROM bpm_data JOIN dogs ON dogs.id = dog_key WHERE dog_id = ? ORDER BY ts",
+                        (dog_id,)).fetchall()
+    return [round((NOW - ts / 1000) / DAY) for ts, in rows]
+
+
+def test_raw_rows_are_deleted_only_where_rollups_cover_them(conn):
+    for days in (30, 20, 1):
+        add(conn, "rex", days)
+    add(conn, "toby", 30, rollup=False)  # 롤업이 전혀 없음
+    add(conn, "kong", 30)
+    add(conn, "kong", 20, rollup=False)  # 롤업이 25일 전 구간에서 멈춤
+
+    policy = RetentionPolicy(raw_days=14, csv_days=None)
+    assert dry_run(conn, policy, now=NOW)["tables"]["bpm_data"]["delete_rows"] == 3
+    assert compact(conn, policy, now=NOW)["bpm_data"] == 3
+    assert raw_days(conn, "rex") == [1]
+    assert raw_days(conn, "toby") == [30]
+    assert raw_days(conn, "kong") == [20]
+    assert get_setting(conn, "raw_before_ms") is None  # toby 원본이 남아 있어 기준을 옮기지 않음
@@ -0,0 +1,67 @@
+"""분/시/일 롤업 테스트"""
+import sqlite3
+
+import numpy as np
+
+from bpm_buffer import STATUS_CODES, STATUS_NAMES
+from bpm_rollup import (ROLLUP_LEVELS, aggregate, aggregate_arrays, apply_rollups, create_rollup_tables,
+                        query_daily, rebuild, table_name)
+from bpm_schema import DogKeys, init_schema, to_ms
+
+T = 1_700_000_000.0
+
+
+def samples(n=500, seed=1):
+    rng = np.random.default_rng(seed)
+    ts = T + np.sort(rng.uniform(0, 3 * 86400, n))
+    bpm = rng.integers(40, 140, n)
+    status = rng.integers(1, 4, n)
+    return ts, bpm, status
+
+
+def table(conn, level):
+    return conn.execute(f"SELECT * FROM {table_name(level)} ORDER BY dog_id, bucket_ts").fetchall()
+
+
+def test_array_aggregation_matches_row_aggregation():
+    ts, bpm, status = samples()
+    rows = [("rex", b, STATUS_NAMES[s], t) for t, b, s in zip(ts.tolist(), bpm.tolist(), status.tolist())]
+    by_rows = aggregate(rows)
+    by_arrays = aggregate_arrays("rex", ts, bpm, status)
+    for level in ROLLUP_LEVELS:
+        assert sorted(by_arrays[level]) == sorted((d, b, *agg) for (d, b), agg in by_rows[level].items())
+
+
+def test_incremental_rollups_match_rebuild(tmp_path):
+    db_file = str(tmp_path / "bpm.db")
+    conn = sqlite3.connect(db_file)
+    init_schema(conn)
+    create_rollup_tables(conn)
+    ts, bpm, status = samples()
+    keys = DogKeys()
+    with conn:
+        # 수집처럼 여러 번에 나눠 (늦게 온 행 포함) 합산
+        for part in np.array_split(np.random.default_rng(2).permutation(len(ts)), 7):
+            rows = [("rex", int(bpm[i]), STATUS_NAMES[status[i]], float(ts[i])) for i in part]
+            conn.executemany("INSERT INTO bpm_data VALUES (?, ?, ?, ?)",
+                             [(keys.key(conn, d), to_ms(t), b, STATUS_CODES[s]) for d, b, s, t in rows])
+            apply_rollups(conn, rows)
+    incremental = {level: table(conn, level) for level in ROLLUP_LEVELS}
+    conn.close()
+
+    assert rebuild(db_file) == len(ts)
+    conn = sqlite3.connect(db_file)
+    for level in ROLLUP_LEVELS:
+        assert table(conn, level) == incremental[level]
+    days = query_daily(conn, 0, "rex")
+    assert sum(d["high_count"] + d["low_count"] + d["normal_count"] for d in days) == len(ts)
+    assert max(d["max_bpm"] for d in days) == bpm.max()
+
+
+def test_daily_query_sums_all_dogs():
+    conn = sqlite3.connect(":memory:")
+    create_rollup_tables(conn)
+    apply_rollups(conn, [("rex", 80, "normal", T), ("toby", 120, "high", T + 60)])
+    [day] = query_daily(conn, 0)
+    assert (day["avg_bpm"], day["max_bpm"], day["min_bpm"], day["high_count"]) == (100, 120, 80, 1)
+    assert query_daily(conn, 0, "toby")[0]["avg_bpm"] == 120
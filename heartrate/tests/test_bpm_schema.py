@@ -0,0 +1,34 @@
+"""v1 DB 마이그레이션 테스트"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from bpm_report_cache import ReportCache, day_start
+from bpm_schema import SCHEMA_VERSION, get_version
+
+
+def make_v1_db(path, days):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE dogs (id INTEGER PRIMARY KEY, dog_id TEXT UNIQUE, size TEXT)")
+    conn.execute("CREATE TABLE bpm_data (id INTEGER PRIMARY KEY, dog_id TEXT, bpm INTEGER, "
+                 "status TEXT, timestamp DATETIME)")
+    conn.execute("INSERT INTO dogs (dog_id, size) VALUES ('v1dog', 'small')")
+    noon = day_start(datetime.now()) + timedelta(hours=12)
+    conn.executemany("INSERT INTO bpm_data (dog_id, bpm, status, timestamp) VALUES ('v1dog', ?, 'normal', ?)",
+                     [(80 + i, (noon - timedelta(days=i)).isoformat(" ")) for i in days])
+    conn.commit()
+    conn.close()
+
+
+def test_v1_db_gets_rollups_for_reports(api, tmp_path, monkeypatch):
+    db_file = str(tmp_path / "v1.db")
+    make_v1_db(db_file, days=[1, 2, 4])
+    monkeypatch.setattr(api, "DB_FILE", db_file)
+    api.init_db()
+
+    conn = sqlite3.connect(db_file)
+    assert get_version(conn) == SCHEMA_VERSION
+    report = ReportCache().daily(conn, 7, "v1dog")
+    assert [row["avg_bpm"] for row in report] == [84, 82, 81]
+
+    api.init_db()  # 롤업이 있으면 다시 만들지 않음 (두 번 세지 않음)
+    assert [row["normal_count"] for row in ReportCache().daily(conn, 7, "v1dog")] == [1, 1, 1]
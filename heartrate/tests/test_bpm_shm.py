@@ -0,0 +1,64 @@
+"""워커 간 공유 상태 (mmap) 테스트"""
+import multiprocessing
+
+import numpy as np
+
+from bpm_registry import DeviceRegistry, DogStateTable
+from bpm_shm import SharedState
+
+LIMITS = {"small": {"min": 70, "max": 120}, "medium": {"min": 60, "max": 100}, "large": {"min": 50, "max": 90}}
+
+
+def _worker(path, dog_id, n):
+    shared = SharedState(path, slots=8, capacity=16, dev_slots=8)
+    table = DogStateTable(LIMITS, shared=shared)
+    st = table.set_size(dog_id, "large")
+    for i in range(n):
+        st.buffer.append(1000.0 + i, 60 + i, "normal")
+    shared.set_device("harness-" + dog_id, dog_id)
+    shared.close()
+
+
+def test_state_written_by_another_process_is_visible(tmp_path):
+    path = str(tmp_path / "bpm_state")
+    shared = SharedState(path, slots=8, capacity=16, dev_slots=8)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_worker, args=(path, dog_id, 20)) for dog_id in ("rex", "toby")]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(10)
+        assert p.exitcode == 0
+
+    table = DogStateTable(LIMITS, shared=shared)
+    rex = table.get("rex")  # 이 워커는 본 적 없는 강아지
+    assert rex is not None and rex.size == "large" and rex.limits == LIMITS["large"]
+    assert len(rex.buffer) == 16  # capacity까지만
+    assert rex.buffer.last() == {"ts": 1019.0, "bpm": 79, "status": "normal"}
+    assert DeviceRegistry(str(tmp_path / "unused.db"), shared=shared).resolve("harness-toby") == "toby"
+    shared.close()
+
+
+def test_changes_returns_only_new_samples(tmp_path):
+    shared = SharedState(str(tmp_path / "bpm_state"), slots=8, capacity=16, dev_slots=8)
+    slot = shared.slot("rex")
+    shared.append(slot, [1.0, 2.0], [80, 81], [2, 2])
+    seen = {}
+    assert shared.changes(seen) == []  # 처음 보는 slot은 지금 위치부터
+    shared.append(slot, [3.0], [82], [3])
+    [(dog_id, ts, bpm, status)] = shared.changes(seen)
+    assert dog_id == "rex" and ts.tolist() == [3.0] and bpm.tolist() == [82] and status.tolist() == [3]
+    assert shared.changes(seen) == []
+    assert [len(c[1]) for c in shared.changes({}, baseline=False)] == [3]
+
+
+def test_active_dog_and_reopen(tmp_path):
+    path = str(tmp_path / "bpm_state")
+    a = SharedState(path, slots=8, capacity=16, dev_slots=8)
+    a.set_active_dog("rex")
+    a.append(a.slot("rex"), np.arange(3.0), [80, 81, 82], [2, 2, 2])
+    b = SharedState(path, slots=8, capacity=16, dev_slots=8)  # 다른 워커가 같은 파일을 엶
+    assert b.active_dog() == "rex" and b.find("rex") == a.find("rex")
+    assert b.tail(b.find("rex"), 2)[1].tolist() == [81, 82]
+    a.close()
+    b.close()
@@ -0,0 +1,40 @@
+"""Broadcaster (실시간 스트림) 테스트"""
+import asyncio
+import json
+
+from bpm_stream import Broadcaster
+
+
+def test_samples_reach_dog_and_all_dogs_subscribers():
+    b = Broadcaster()
+    rex, everyone = b.subscribe("rex"), b.subscribe(None)
+    b.publish("rex", {"bpm": 80})
+    b.publish("toby", {"bpm": 90})
+    assert [json.loads(m)["bpm"] for m in rex.queue] == [80]
+    assert [json.loads(m)["bpm"] for m in everyone.queue] == [80, 90]
+    b.unsubscribe(rex)
+    b.unsubscribe(everyone)
+    assert not b.has_subscribers()
+
+
+def test_slow_subscriber_drops_oldest():
+    b = Broadcaster(max_queue=3)
+    sub = b.subscribe("rex")
+    for i in range(5):
+        b.publish("rex", {"bpm": 80 + i})
+    assert [json.loads(m)["bpm"] for m in sub.queue] == [82, 83, 84] and sub.dropped == 2
+
+
+def test_sse_yields_events_and_unsubscribes_on_close():
+    b = Broadcaster(keepalive=0.05)
+
+    async def run():
+        sub = b.subscribe("rex")
+        gen = b.sse(sub)
+        assert (await gen.__anext__()).startswith("retry:")
+        assert await gen.__anext__() == ": keepalive\n\n"  # 조용할 때
+        b.publish("rex", {"bpm": 81})
+        assert await gen.__anext__() == 'event: heartbeat\ndata: {"bpm":81}\n\n'
+        await gen.aclose()  # 클라이언트 연결 끊김
+    asyncio.run(run())
+    assert not b.has_subscribers()
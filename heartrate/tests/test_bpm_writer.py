@@ -0,0 +1,187 @@
+"""StorageWriter 중복 샘플 처리 / 커밋 실패 / 스키마 v3 마이그레이션 테스트"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from bpm_blocks import read_range, seal_all
+from bpm_rollup import create_rollup_tables, query_daily, storage_rollup_hook
+from bpm_schema import SCHEMA_VERSION, _create_bpm_data, _create_dogs, get_version, init_schema, migrate
+from bpm_writer import StorageWriter
+
+T = 1_700_000_000.0
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / "bpm.db")
+    conn = sqlite3.connect(path)
+    init_schema(conn)
+    create_rollup_tables(conn)
+    conn.close()
+    return path
+
+
+def write(db_file, batches):
+    seen = []
+    writer = StorageWriter(db_file, hooks=[storage_rollup_hook], after_commit=[seen.append])
+
+    async def run():
+        await writer.start()
+        for rows in batches:
+            await writer._flush(rows)  # 배치 경계를 정해서 커밋
+        await writer.stop()
+    asyncio.run(run())
+    return writer, seen
+
+
+def test_duplicate_rows_are_ignored(db_file):
+    rows = [("rex", T, 80, "normal"), ("rex", T + 1, 81, "normal")]
+    writer, seen = write(db_file, [rows, rows[1:] + [("rex", T + 1, 99, "high"), ("rex", T + 2, 82, "normal")]])
+    assert (writer.committed_rows, writer.duplicate_rows) == (3, 2)
+    assert seen == [rows, [("rex", T + 2, 82, "normal")]]
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT ts, bpm FROM bpm_data ORDER BY ts").fetchall() == \
+        [(T * 1000, 80), ((T + 1) * 1000, 81), ((T + 2) * 1000, 82)]
+    day = query_daily(conn, 0, "rex")[0]
+    assert day["normal_count"] == 3 and day["high_count"] == 0  # 롤업도 한 번씩만
+
+
+def test_rows_already_in_sealed_block_are_ignored(db_file):
+    rows = [("rex", T + i, 80 + i, "normal") for i in range(3)]
+    write(db_file, [rows])
+    conn = sqlite3.connect(db_file)
+    assert seal_all(conn, before_ms=int(T * 1000) + 3600 * 1000)["rows"] == 3
+    conn.close()
+
+    # 봉인된 시간대의 재전송 1개 + 새 샘플 1개
+    writer, seen = write(db_file, [[("rex", T + 1, 120, "high"), ("rex", T + 5, 85, "normal")]])
+    assert (writer.committed_rows, writer.duplicate_rows) == (1, 1)
+    assert seen == [[("rex", T + 5, 85, "normal")]]
+
+    conn = sqlite3.connect(db_file)
+    ts, bpm, _ = read_range(conn, 1, 0, 2**62)
+    assert bpm.tolist() == [80, 81, 82, 85]
+    day = query_daily(conn, 0, "rex")[0]
+    assert day["normal_count"] == 4 and day["high_count"] == 0
+
+
+def test_migrate_v2_removes_duplicates(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "v2.db"))
+    _create_dogs(conn)
+    _create_bpm_data(conn)
+    conn.execute("CREATE INDEX idx_bpm_data_dog_ts ON bpm_data (dog_key, ts)")
+    conn.execute("INSERT INTO dogs (dog_id, size) VALUES ('rex', 'medium')")
+    conn.executemany("INSERT INTO bpm_data VALUES (1, ?, ?, 0)", [(1000, 80), (1000, 90), (2000, 81)])
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+
+    assert migrate(conn) == SCHEMA_VERSION == get_version(conn)
+    assert conn.execute("SELECT ts, bpm FROM bpm_data ORDER BY ts").fetchall() == [(1000, 80), (2000, 81)]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO bpm_data VALUES (1, 2000, 70, 0)")
+
+
+def test_hook_errors_do_not_stop_the_writer(db_file):
+    calls = []
+
+    def bad_hook(conn, rows):
+        if not calls:
+            calls.append(rows)
+            raise ValueError("boom")
+
+    def bad_callback(rows):
+        raise RuntimeError("boom")
+
+    writer = StorageWriter(db_file, hooks=[bad_hook], after_commit=[bad_callback], retry_delay=0.01)
+
+    async def run():
+        await writer.start()
+        await writer.put_many([("rex", T, 80, "normal")])
+        await asyncio.sleep(0.5)  # 첫 시도: 훅 오류로 롤백, 재시도에서 커밋
+        await writer.put_many([("rex", T + 1, 81, "normal")])
+        await writer.stop()  # 루프가 살아 있어야 두 번째 배치가 커밋됨
+    asyncio.run(run())
+
+    assert (writer.failed_commits, writer.commits, writer.callback_errors) == (1, 2, 2)
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT bpm FROM bpm_data ORDER BY ts").fetchall() == [(80,), (81,)]
+
+
+def test_writer_can_restart(db_file):
+    writer = StorageWriter(db_file)
+
+    async def run(rows):
+        await writer.start()
+        await writer.put_many(rows)
+        await writer.stop()
+    asyncio.run(run([("rex", T, 80, "normal")]))
+    asyncio.run(run([("rex", T + 1, 81, "normal")]))  # 앱 lifespan이 다시 돌 때
+    assert writer.committed_rows == 2
+
+
+def test_put_many_is_committed_as_one_unit(db_file):
+    seen = []
+    writer = StorageWriter(db_file, batch_size=4, after_commit=[seen.append])
+
+    async def run():
+        await writer.start()
+        await writer.put(("rex", T, 80, "normal"))
+        await writer.put_many([("rex", T + 1 + i, 80, "normal") for i in range(6)])
+        await writer.stop()
+    asyncio.run(run())
+    assert [len(rows) for rows in seen] == [7]  # batch_size를 넘어도 묶음을 나누지 않음
+    assert writer.stats()["queue_depth"] == 0
+
+
+def flaky_commit(writer, failures):
+    commit = writer._commit
+
+    def fail_then_commit(rows):
+        if failures[0]:
+            failures[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return commit(rows)
+    writer._commit = fail_then_commit
+
+
+def test_failed_commit_is_retried(db_file):
+    writer = StorageWriter(db_file, retry_delay=0.01)
+    flaky_commit(writer, [2])
+
+    async def run():
+        await writer.start()
+        await writer.put_many([("rex", T, 80, "normal"), ("rex", T + 1, 81, "normal")])
+        await writer.put_many([("rex", T + 2, 82, "normal")])
+        await writer.stop()
+    asyncio.run(run())
+
+    stats = writer.stats()
+    assert (stats["failed_commits"], stats["retried_commits"], stats["dropped_rows"]) == (2, 2, 0)
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT bpm FROM bpm_data ORDER BY ts").fetchall() == [(80,), (81,), (82,)]
+
+
+def test_rows_are_dropped_and_counted_after_retries(db_file):
+    writer = StorageWriter(db_file, flush_interval=0.01, max_retries=2, retry_delay=0.01)
+    flaky_commit(writer, [3])
+
+    async def run():
+        await writer.start()
+        await writer.put_many([("rex", T, 80, "normal"), ("rex", T + 1, 81, "normal")])
+        await asyncio.sleep(0.2)
+        await writer.put_many([("rex", T + 2, 82, "normal")])
+        await writer.stop()
+    asyncio.run(run())
+
+    assert (writer.failed_commits, writer.dropped_rows, writer.committed_rows) == (3, 2, 1)
+
+
+def test_duplicates_inside_one_batch_keep_the_first_row(db_file):
+    rows = [("rex", T, 80, "normal"), ("rex", T, 120, "high"), ("toby", T, 90, "normal")]
+    writer, seen = write(db_file, [rows])
+    assert (writer.committed_rows, writer.duplicate_rows) == (2, 1)
+    assert seen == [[rows[0], rows[2]]]
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT bpm FROM bpm_data ORDER BY dog_key").fetchall() == [(80,), (90,)]
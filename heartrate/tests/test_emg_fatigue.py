@@ -0,0 +1,206 @@
+"""FatigueEngine 골든 테스트 (shieldf_py/esp32f.py loop()와 같은 값이 나오는지)
+
+esp32f_trace는 펌웨어의 pushSample/popExpired/currentRMS와 loop()의 1초 계산부를
+스칼라 그대로 옮긴 것이다 (millis()는 샘플 시각). 아래 GOLDEN_* 값은 이 트레이스에서 기록했다.
+
+실행: cd heartrate && python -m pytest tests
+"""
+import math
+
+import numpy as np
+import pytest
+
+from emg_fatigue import CALIB_REST, RUN, FatigueEngine, replay
+
+WINDOW_MS = 1000
+REST_MS = 10000
+EPS_DENOM = 1e-9
+CAP = 2000
+ALPHA, K_INTENSITY, GAMMA_ACTIVE, GAMMA_REST, BASELINE_S = 0.6, 4.5, 0.010, 0.035, 26.0
+
+# 펌웨어의 sumSq는 더하고 빼기를 계속해 반올림 오차가 쌓임 (엔진은 창마다 새로 더함)
+RTOL, ATOL = 1e-6, 1e-7
+
+
+# ===== 펌웨어 로직 (esp32f.py) =====
+def esp32f_trace(t0, ts, values):
+    """샘플마다 loop() 한 번, 반환: (tick ms, RMS_t, S_t, F_t, phase) 목록"""
+    val_buf, t_buf = [0.0] * CAP, [0] * CAP
+    head = tail = count = 0
+    sum_sq = 0.0
+    phase, rest_count = CALIB_REST, 0
+    t_start = t_last = t0
+    rms_rest, rms_max, s_prev, f_prev = 0.0, 1.0, 0.0, 0.0
+    out = []
+    for now, v in zip(ts, values):
+        # pushSample
+        while count > 0 and not t_buf[head] + WINDOW_MS > now:
+            sum_sq -= val_buf[head] * val_buf[head]
+            head, count = (head + 1) % CAP, count - 1
+        if count == CAP:
+            sum_sq -= val_buf[head] * val_buf[head]
+            head, count = (head + 1) % CAP, count - 1
+        val_buf[tail], t_buf[tail] = v, now
+        tail, count = (tail + 1) % CAP, count + 1
+        sum_sq += v * v
+
+        if now - t_last < 1000:
+            continue
+        t_last = now
+        m2 = sum_sq / count if count > 0 else 0.0
+        rms_t = math.sqrt(m2) if m2 > 0 else 0.0
+        if phase == CALIB_REST:
+            rest_count += 1
+            rms_rest = rms_t if rest_count == 1 else 0.85 * rms_rest + 0.15 * rms_t
+            if now - t_start >= REST_MS:
+                if rms_rest < EPS_DENOM:
+                    rms_rest = EPS_DENOM
+                rms_max = max(rms_rest * 1.3, rms_rest + 0.005)
+                phase = RUN
+            out.append((now, rms_t, s_prev, 0.0, CALIB_REST if phase == CALIB_REST else RUN))
+        else:
+            rms_max = max(0.990 * rms_max, rms_t)
+            denom = rms_max - rms_rest
+            floor_den = max(0.05 * rms_rest, EPS_DENOM)
+            if denom < floor_den:
+                denom = floor_den
+            r_t = min(max((rms_t - rms_rest) / denom, 0.0), 1.0)
+            s_raw = 100.0 * math.sqrt(r_t)
+            if r_t > 0.03:
+                s_raw = min(100.0, s_raw + 5.0)
+            s_t = ALPHA * s_raw + (1.0 - ALPHA) * s_prev
+            gamma = GAMMA_REST if s_t < 20.0 else GAMMA_ACTIVE
+            f_t = min(max(f_prev + (s_t - BASELINE_S) / K_INTENSITY - gamma, 0.0), 100.0)
+            s_prev, f_prev = s_t, f_t
+            out.append((now, rms_t, s_t, f_t, RUN))
+    return out
+
+
+# ===== 입력 신호 (고정 시드) =====
+T0 = 1_700_000_000_000
+
+
+def rest_then_work():
+    """200 Hz, 12초 휴식(작은 잡음) 후 20초 수축"""
+    rng = np.random.default_rng(9)
+    ts = T0 + np.arange(1, 200 * 32 + 1) * 5
+    amp = np.where(ts - T0 <= 12_000, 0.02, 0.4)
+    return T0, ts, (amp * rng.standard_normal(len(ts))).round(6)
+
+
+def dense_burst():
+    """1 ms에 3샘플 (초당 3000개 > CAP) - RMS는 마지막 CAP개만"""
+    ts = T0 + np.repeat(np.arange(1, 14_001), 3)
+    k = np.arange(len(ts))
+    return T0, ts, (0.05 + 0.5 * (k % 7 == 0) + 0.001 * (k % 1000)).round(6)
+
+
+def fatigue_then_rest():
+    """100 Hz, 10초 휴식 → 90초 최대 수축 → 240초 휴식 (F가 100에서, 다시 0에서 멈춤)"""
+    ts = T0 + np.arange(1, 100 * 340 + 1) * 10
+    t = ts - T0
+    amp = np.where((t > 10_000) & (t <= 100_000), 1.0, 0.01)
+    return T0, ts, (amp * np.sin(t * 0.7)).round(6)
+
+
+def engine_trace(t0, ts, values, chunk=None):
+    engine = FatigueEngine()
+    engine.start("dog", t0)
+    out = []
+    step = chunk or len(ts)
+    for i in range(0, len(ts), step):
+        engine.ingest("dog", ts[i:i + step], values[i:i + step])
+        out.extend(tick[2:] for tick in engine.step())
+    return out
+
+
+def assert_same(trace, expected):
+    assert len(trace) == len(expected)
+    got, want = np.array(trace, dtype=float), np.array(expected, dtype=float)
+    np.testing.assert_array_equal(got[:, 0], want[:, 0])  # 계산 시각
+    np.testing.assert_array_equal(got[:, 4], want[:, 4])  # phase
+    np.testing.assert_allclose(got[:, 1:4], want[:, 1:4], rtol=RTOL, atol=ATOL)
+
+
+# ===== 골든 값 (esp32f_trace 기록) =====
+# index: (계산 시각 ms, RMS_t, S_t, F_t, phase)
+GOLDEN_CALIB = {
+    8: (1700000009000, 0.02104108088525872, 0.0, 0.0, CALIB_REST),
+    9: (1700000010000, 0.0204398425802402, 0.0, 0.0, RUN),  # REST_MS 경과 → RUN
+    16: (1700000017000, 0.4036033042169622, 98.976, 67.50911111111111, RUN),
+    31: (1700000032000, 0.39992965483386533, 99.91182549495, 100.0, RUN),
+}
+GOLDEN_CAP = {
+    0: (1700000001000, 0.706731207744501, 0.0, 0.0, CALIB_REST),
+    8: (1700000009000, 0.7065751906202202, 0.0, 0.0, CALIB_REST),
+    13: (1700000014000, 0.7071350648921325, 3.746068490163318, 0.0, RUN),
+}
+GOLDEN_CLAMP = {
+    10: (1700000011000, 0.7081537271890476, 60.0, 7.545555555555556, RUN),
+    11: (1700000012000, 0.7100236695978382, 84.0, 20.424444444444443, RUN),
+    16: (1700000017000, 0.7095415076644991, 99.83616, 100.0, RUN),  # 상한
+    118: (1700000119000, 0.007045448515195884, 0.06050788751642832, 2.185848396035005, RUN),
+    119: (1700000120000, 0.007073595975193656, 0.08999976705294606, 0.0, RUN),  # 하한
+    339: (1700000340000, 0.007099287028306146, 1.7215558629720122, 0.0, RUN),
+}
+
+
+# ===== 테스트 =====
+@pytest.mark.parametrize("signal", [rest_then_work, dense_burst, fatigue_then_rest])
+@pytest.mark.parametrize("chunk", [None, 173])
+def test_engine_matches_firmware(signal, chunk):
+    t0, ts, values = signal()
+    assert_same(engine_trace(t0, ts, values, chunk), esp32f_trace(t0, ts, values))
+
+
+@pytest.mark.parametrize("signal, golden", [
+    (rest_then_work, GOLDEN_CALIB), (dense_burst, GOLDEN_CAP), (fatigue_then_rest, GOLDEN_CLAMP),
+])
+def test_golden_ticks(signal, golden):
+    t0, ts, values = signal()
+    trace = engine_trace(t0, ts, values)
+    for i, want in golden.items():
+        assert trace[i][0] == want[0] and trace[i][4] == want[4], i
+        np.testing.assert_allclose(trace[i][1:4], want[1:4], rtol=RTOL, atol=ATOL)
+
+
+def test_calibration_switches_to_run_after_rest_ms():
+    t0, ts, values = rest_then_work()
+    trace = engine_trace(t0, ts, values)
+    phases = [tick[4] for tick in trace]
+    first_run = phases.index(RUN)
+    assert all(p == CALIB_REST for p in phases[:first_run])
+    assert trace[first_run][0] - t0 >= REST_MS > trace[first_run - 1][0] - t0
+    assert all(tick[3] == 0.0 for tick in trace[:first_run + 1])  # 캘리브 동안 F = 0
+    assert all(b[0] - a[0] >= 1000 for a, b in zip(trace, trace[1:]))
+
+
+def test_rms_window_is_cap_limited():
+    t0, ts, values = dense_burst()
+    trace = engine_trace(t0, ts, values)
+    for tick_ts, rms, *_ in trace:
+        end = np.searchsorted(ts, tick_ts, side="left")  # 계산 시점 샘플 (같은 ms의 첫 샘플)
+        window = values[max(0, end + 1 - CAP):end + 1]
+        window = window[ts[max(0, end + 1 - CAP):end + 1] > tick_ts - WINDOW_MS]
+        assert len(window) == CAP
+        assert rms == pytest.approx(math.sqrt(np.mean(window * window)), rel=1e-9)
+
+
+def test_fatigue_clamps_at_bounds():
+    t0, ts, values = fatigue_then_rest()
+    fatigue = [tick[3] for tick in engine_trace(t0, ts, values)]
+    top = fatigue.index(100.0)
+    assert max(fatigue) == 100.0 and min(fatigue) == 0.0
+    assert fatigue[top + 1] == 100.0  # 상한에서 멈춤
+    assert fatigue[-1] == 0.0 and fatigue[-2] == 0.0  # 회복 후 하한에서 멈춤
+
+
+def test_replay_matches_live_engine():
+    t0, ts, values = fatigue_then_rest()
+    chunks = [(ts[i:i + 5000], values[i:i + 5000]) for i in range(0, len(ts), 5000)]
+    assert_same(replay(chunks, t0_ms=t0), engine_trace(t0, ts, values))
+
+
+def test_unknown_param_is_rejected():
+    with pytest.raises(ValueError):
+        FatigueEngine(params={"beta": 1.0})
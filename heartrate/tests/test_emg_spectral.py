@@ -0,0 +1,21 @@
+"""emg_spectral.welch_psd가 scipy.signal.welch와 같은지 (scipy는 테스트에서만 사용)"""
+import numpy as np
+import pytest
+
+from emg_spectral import welch_psd
+
+signal = pytest.importorskip("scipy.signal")
+
+
+@pytest.mark.parametrize("nperseg", [64, 50])
+def test_welch_matches_scipy_with_drifting_baseline(nperseg):
+    fs = 1000.0
+    t = np.arange(1000) / fs
+    rng = np.random.default_rng(3)
+    # 창마다 기준선이 달라 세그먼트별로 평균을 빼야 저주파 bin이 맞음
+    x = np.stack([np.sin(2 * np.pi * 80 * t) + 3 * t + rng.standard_normal(len(t)) * 0.1,
+                  np.where(t < 0.5, 0.0, 2.0) + np.sin(2 * np.pi * 150 * t)])
+    freqs, psd = welch_psd(x, fs, nperseg)
+    want_f, want = signal.welch(x, fs, nperseg=nperseg, axis=-1)
+    np.testing.assert_allclose(freqs, want_f)
+    np.testing.assert_allclose(psd, want, rtol=1e-9, atol=1e-12)
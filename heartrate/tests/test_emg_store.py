@@ -0,0 +1,102 @@
+"""EmgStore 세션 파일 쓰기 / memmap 구간 조회 / 잘린 파일 복구 / 줄이기 테스트"""
+import os
+
+import numpy as np
+
+from emg_store import INDEX, INDEX_STRIDE, RECORD, EmgStore, decimate
+
+T0 = 1_700_000_000_000
+
+
+def fill(store, dog_id="rex", n=5000, batch=700):
+    ts = T0 + np.arange(n) * 5.0  # 200 Hz
+    values = np.sin(np.arange(n) / 10.0).astype(np.float32)
+    for a in range(0, n, batch):  # 묶음 경계가 INDEX_STRIDE와 어긋나게
+        store.append(dog_id, 0, ts[a:a + batch], values[a:a + batch], 200.0)
+    return ts, values
+
+
+def test_slice_matches_numpy_across_index_strides(tmp_path):
+    store = EmgStore(str(tmp_path))
+    ts, values = fill(store)
+    reader = store.reader("rex", T0)
+    assert len(reader) == len(ts) and len(reader.index) == -(-len(ts) // INDEX_STRIDE)
+    for lo, hi in [(None, None), (T0 + 5 * 1023, T0 + 5 * 2049), (T0 + 2.5, T0 + 7.5), (T0 - 100, T0 + 5 * 3)]:
+        got_ts, got_v = reader.slice(lo, hi)
+        mask = np.ones(len(ts), bool)
+        if lo is not None:
+            mask &= ts >= lo
+        if hi is not None:
+            mask &= ts < hi
+        np.testing.assert_array_equal(got_ts, ts[mask])
+        np.testing.assert_array_equal(got_v, values[mask])
+    chunks = list(reader.iter_chunks(T0, T0 + 5 * 1000, chunk=300))
+    assert [len(c[0]) for c in chunks] == [300, 300, 300, 100]
+
+
+def test_out_of_order_samples_are_dropped_and_counted(tmp_path):
+    store = EmgStore(str(tmp_path))
+    assert store.append("rex", 0, [T0 + 10, T0, T0 + 5], [3, 1, 2], 200.0) == 3  # 묶음 안은 정렬
+    assert store.append("rex", 0, [T0 + 5, T0 + 15], [9, 4], 200.0) == 1  # 마지막 시각 이전은 버림
+    assert store.stats() == {"open_sessions": 1, "samples": 4, "dropped": 1}
+    ts, values = store.reader("rex", T0).slice()
+    assert ts.tolist() == [T0, T0 + 5, T0 + 10, T0 + 15] and values.tolist() == [1, 2, 3, 4]
+
+
+def test_reopen_truncates_partial_record_and_rebuilds_index(tmp_path):
+    store = EmgStore(str(tmp_path))
+    ts, _ = fill(store, n=3000)
+    store.close()
+    base = os.path.join(str(tmp_path), "rex", str(T0), "ch0")
+    with open(base + ".dat", "ab") as f:
+        f.write(b"\x00" * (RECORD.itemsize // 2))  # 비정상 종료로 잘린 레코드
+    os.remove(base + ".idx")
+
+    store = EmgStore(str(tmp_path))
+    store.start("rex", T0)  # 같은 세션을 다시 열어 이어 붙임
+    assert store.append("rex", 0, [ts[-1] + 5], [0.5], 200.0) == 1
+    assert os.path.getsize(base + ".dat") == 3001 * RECORD.itemsize
+    assert os.path.getsize(base + ".idx") == 3 * INDEX.itemsize
+    reader = store.reader("rex", T0)
+    assert len(reader) == 3001 and reader.last_ts == ts[-1] + 5
+    assert reader.slice(ts[2048], ts[2050])[0].tolist() == [ts[2048], ts[2049]]
+
+
+def test_sessions_listing_and_delete(tmp_path):
+    store = EmgStore(str(tmp_path))
+    store.append("rex/jr", 0, [T0, T0 + 5], [1, 2], 200.0)
+    store.append("rex/jr", 1, [T0], [1], 100.0)
+    store.start("rex/jr", T0 + 60_000)
+    [closed, current] = store.sessions("rex/jr")
+    assert (closed["session_ts"], closed["open"], current["open"]) == (T0, False, True)
+    assert closed["channels"][0] == {"samples": 2, "first_ts": T0, "last_ts": T0 + 5, "rate_hz": 200.0}
+    assert closed["channels"][1]["rate_hz"] == 100.0
+    assert store.dog_ids() == ["rex/jr"]
+    assert store.delete("rex/jr", T0 + 60_000) and store.current("rex/jr") is None
+    assert [s["session_ts"] for s in store.sessions("rex/jr")] == [T0]
+    assert store.delete("rex/jr", 1) is False
+
+
+def test_decimate_modes_keep_envelope_and_mean():
+    ts = np.arange(1000, dtype=np.float64)
+    values = np.sin(ts / 7.0)
+    out = decimate(ts, values, 100, "minmax")
+    points = np.array(out["points"])
+    assert out["columns"] == ["ts", "min", "max"] and len(points) == 50
+    assert points[:, 1].min() == values.min() and points[:, 2].max() == values.max()
+    out = decimate(ts, values, 100, "mean")
+    np.testing.assert_allclose(np.array(out["points"])[:, 1], values.reshape(100, 10).mean(axis=1))
+    assert len(decimate(ts, values, 10, "stride")["points"]) == 10
+    assert decimate(ts[:5], values[:5], 100)["method"] == "none"
+
+
+def test_session_endpoints_return_stored_waveform(client):
+    client.post("/emg/emg-store-dog/samples", json={"values": [0.1 * i for i in range(400)], "rate_hz": 200.0,
+                                                    "start_ms": T0, "channel": 1})
+    [session] = client.get("/emg/emg-store-dog/sessions").json()["sessions"]
+    assert session["session_ts"] == T0 and session["channels"]["1"]["samples"] == 400
+    r = client.get(f"/emg/emg-store-dog/sessions/{T0}",
+                   params={"channel": 1, "from": T0 + 500, "to": T0 + 1000, "max_points": 10}).json()
+    assert (r["samples"], r["method"], len(r["points"])) == (100, "minmax", 5)
+    assert r["points"][0][1] == np.float32(0.1 * 100)
+    assert client.get(f"/emg/emg-store-dog/sessions/{T0 + 1}").json()["ok"] is False